@@ -8,6 +8,7 @@ from appkit_commons.database.entities import Base
 
 from alembic import context
 from app import configuration
+from app.backend.migrations import advisory_lock, run_with_retries, set_timeouts
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -98,11 +99,16 @@ def run_migrations_online() -> None:
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
+    With ``app.migration.online`` on Postgres, the migrations of several
+    containers are serialized by an advisory lock, and every migration runs in
+    its own transaction with lock and statement timeouts and is retried when
+    it timed out waiting for a lock, see ``app.backend.migrations``.
     """
     config = {
         "sqlalchemy.url": get_database_url(),
         "sqlalchemy.pool_pre_ping": True,
     }
+    migration = configuration.app.migration
 
     connectable = engine_from_config(
         config,
@@ -111,6 +117,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        online = migration.online and connection.dialect.name == "postgresql"
+        if online:
+            set_timeouts(
+                connection, migration.lock_timeout, migration.statement_timeout
+            )
+
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
@@ -118,10 +130,16 @@ def run_migrations_online() -> None:
             compare_type=True,
             compare_server_default=True,
             render_as_batch=True,
+            transaction_per_migration=online,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        if not online:
+            with context.begin_transaction():
+                context.run_migrations()
+            return
+
+        with advisory_lock(connection, migration):
+            run_with_retries(connection, migration)
 
 
 if context.is_offline_mode():
@@ -0,0 +1,38 @@
+"""reflex states
+
+Revision ID: reflex_states
+Revises: user_roles_gin_index
+Create Date: 2026-10-18 16:02:41.318260
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "reflex_states"
+down_revision: str | None = "user_roles_gin_index"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # client states of app.backend.state_manager, unlogged: lost on a crash
+    op.create_table(
+        "reflex_states",
+        sa.Column("ident", sa.Text(), nullable=False),
+        sa.Column("name", sa.Text(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("ident", "name"),
+        prefixes=["UNLOGGED"] if op.get_context().dialect.name == "postgresql" else [],
+    )
+    op.create_index("ix_reflex_states_expires_at", "reflex_states", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reflex_states_expires_at", table_name="reflex_states")
+    op.drop_table("reflex_states")
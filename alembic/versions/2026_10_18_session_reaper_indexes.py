@@ -0,0 +1,31 @@
+"""session reaper indexes
+
+Revision ID: session_reaper_indexes
+Revises: user_listing_indexes
+Create Date: 2026-10-18 10:02:37.540119
+
+"""
+
+from collections.abc import Sequence
+
+from app.backend.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "session_reaper_indexes"
+down_revision: str | None = "user_listing_indexes"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        "ix_auth_sessions_expires_at", "auth_sessions", ["expires_at"], unique=False
+    )
+    create_index_concurrently(
+        "ix_auth_sessions_user_id", "auth_sessions", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_auth_sessions_user_id", "auth_sessions")
+    drop_index_concurrently("ix_auth_sessions_expires_at", "auth_sessions")
@@ -0,0 +1,59 @@
+"""user listing indexes
+
+Revision ID: user_listing_indexes
+Revises: appkit_user
+Create Date: 2026-10-18 09:12:04.118532
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from app.backend.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "user_listing_indexes"
+down_revision: str | None = "appkit_user"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # keyset pagination: (<sort column>, id) for every sortable column
+    create_index_concurrently(
+        "ix_auth_users_email_id", "auth_users", ["email", "id"], unique=False
+    )
+    create_index_concurrently(
+        "ix_auth_users_name_id",
+        "auth_users",
+        [sa.text("coalesce(name, '')"), "id"],
+        unique=False,
+    )
+    create_index_concurrently(
+        "ix_auth_users_created_id", "auth_users", ["created", "id"], unique=False
+    )
+    # case-insensitive prefix search on email and name
+    create_index_concurrently(
+        "ix_auth_users_email_lower_pattern",
+        "auth_users",
+        [sa.text("lower(email) text_pattern_ops")],
+        unique=False,
+    )
+    create_index_concurrently(
+        "ix_auth_users_name_lower_pattern",
+        "auth_users",
+        [sa.text("lower(name) text_pattern_ops")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    for index_name in (
+        "ix_auth_users_name_lower_pattern",
+        "ix_auth_users_email_lower_pattern",
+        "ix_auth_users_created_id",
+        "ix_auth_users_name_id",
+        "ix_auth_users_email_id",
+    ):
+        drop_index_concurrently(index_name, "auth_users")
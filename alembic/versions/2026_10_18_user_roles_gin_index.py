@@ -0,0 +1,32 @@
+"""user roles gin index
+
+Revision ID: user_roles_gin_index
+Revises: session_reaper_indexes
+Create Date: 2026-10-18 14:21:09.604718
+
+"""
+
+from collections.abc import Sequence
+
+from app.backend.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "user_roles_gin_index"
+down_revision: str | None = "session_reaper_indexes"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # role filters and counts: roles @> ARRAY[<role>]
+    create_index_concurrently(
+        "ix_auth_users_roles",
+        "auth_users",
+        ["roles"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_auth_users_roles", "auth_users")
@@ -2,10 +2,14 @@ import logging
 from typing import Final
 from dotenv import load_dotenv
 
+from app.startup import profiler
 from app.configuration import configure
 
 logger = logging.getLogger(__name__)
 logger.info("Configuring application...")
 
-load_dotenv()
-configuration = configure()
+with profiler.phase("load_dotenv"):
+    load_dotenv()
+
+with profiler.phase("configure"):
+    configuration = configure()
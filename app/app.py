@@ -1,25 +1,57 @@
-import logging
-
 import reflex as rx
 from starlette.types import ASGIApp
 
-from appkit_commons.middleware import ForceHTTPSMiddleware
-from appkit_user.authentication.pages import (  # noqa: F401
-    azure_oauth_callback_page,
-    github_oauth_callback_page,
-)
 from appkit_user.authentication.templates import navbar_layout
 from appkit_user.user_management.pages import (  # noqa: F401
     create_login_page,
     create_profile_page,
 )
 
+from app import configuration
+from app.assets import font_stylesheets
+from app.backend.database import install_database_pool
+from app.backend.invalidation import (
+    PostgresInvalidationBus,
+    invalidation_bus,
+    invalidation_bus_task,
+)
+from app.backend.last_seen import install_last_seen, last_seen_task
+from app.backend.monitoring import (
+    install_metrics,
+    metrics_endpoint,
+    metrics_snapshot_task,
+    register_gauge,
+)
+from app.backend.oauth_tokens import install_oauth_tokens, oauth_token_rotation_task
+from app.backend.password_hashing import install_password_hashing
+from app.backend.session_cache import install_session_cache
+from app.backend.session_reaper import session_reaper_task
+from app.backend.state_manager import (
+    install_state_manager,
+    postgres_state_manager,
+    state_manager_task,
+)
+from app.backend.tracing import install_tracing
 from app.components.navbar import app_navbar
+from app.middleware import edge_middleware
+from app.pages.oauth import register_oauth_callback_pages
 from app.pages.users import users_page  # noqa: F401
+from app.startup import profiler
+
+with profiler.phase("install_backend"):
+    install_tracing(configuration.app.tracing)
+    # before the metrics, which count the logins of the installed functions
+    install_password_hashing()
+    install_metrics(configuration.app.metrics)
+    install_database_pool()
+    install_session_cache()
+    install_oauth_tokens()
+    install_last_seen()
 
-logging.basicConfig(level=logging.DEBUG)
-create_login_page(header="ProjectKit")
-create_profile_page(app_navbar())
+with profiler.phase("register_pages"):
+    create_login_page(header="ProjectKit")
+    create_profile_page(app_navbar())
+    register_oauth_callback_pages(configuration.app.authentication)
 
 
 @navbar_layout(
@@ -41,8 +73,7 @@ def index() -> rx.Component:
 
 
 base_stylesheets = [
-    "https://fonts.googleapis.com/css2?family=Roboto+Flex:wght@400;500;600;700;800&display=swap",
-    "https://fonts.googleapis.com/css2?family=Audiowide&family=Honk:SHLN@5&family=Major+Mono+Display&display=swap",
+    *font_stylesheets(),
     "css/appkit.css",
     #    "css/styles.css",
     "css/react-zoom.css",
@@ -56,14 +87,43 @@ base_style = {
 }
 
 
-# Middleware transformer for HTTPS redirect
-def add_https_middleware(asgi_app: ASGIApp) -> ASGIApp:
-    """Wrap the ASGI app with HTTPS redirect middleware."""
-    return ForceHTTPSMiddleware(asgi_app)
+def add_metrics_endpoint(asgi_app: ASGIApp) -> ASGIApp:
+    """Serve the Prometheus metrics, inside the edge middleware."""
+    return metrics_endpoint(asgi_app, configuration.app.metrics)
 
 
-app = rx.App(
-    stylesheets=base_stylesheets,
-    style=base_style,
-    api_transformer=[add_https_middleware],
-)
+def add_edge_middleware(asgi_app: ASGIApp) -> ASGIApp:
+    """Wrap the ASGI app with HTTPS, caching and compression middleware."""
+    return edge_middleware(asgi_app, configuration.app.middleware)
+
+
+with profiler.phase("create_app"):
+    app = rx.App(
+        stylesheets=base_stylesheets,
+        style=base_style,
+        api_transformer=[add_metrics_endpoint, add_edge_middleware],
+    )
+    install_state_manager(app)
+
+    if configuration.app.session_reaper.enabled:
+        app.register_lifespan_task(session_reaper_task)
+    if configuration.app.last_seen.enabled:
+        app.register_lifespan_task(last_seen_task)
+    if (
+        configuration.app.oauth_tokens.rotate
+        and configuration.app.oauth_tokens.previous_keys
+    ):
+        app.register_lifespan_task(oauth_token_rotation_task)
+    if isinstance(invalidation_bus(), PostgresInvalidationBus):
+        app.register_lifespan_task(invalidation_bus_task)
+    if postgres_state_manager() is not None:
+        app.register_lifespan_task(state_manager_task)
+    if configuration.app.metrics.enabled:
+        app.register_lifespan_task(metrics_snapshot_task)
+        register_gauge(
+            "websocket_connections",
+            "Open websocket connections of the worker.",
+            lambda: len(app.event_namespace.sid_to_token) if app.event_namespace else 0,
+        )
+
+profiler.finish()
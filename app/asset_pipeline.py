@@ -0,0 +1,241 @@
+"""Build stage for the static assets, run with ``python main.py build-assets``.
+
+- ``--fonts`` vendors the fonts of ``base_style`` from Google Fonts, restricted to
+  the weights in use and to the latin unicode ranges, into ``assets/fonts`` and
+  writes ``assets/css/fonts.css``. Needs network access, the Docker build runs it.
+- SVGs in ``assets/icons`` and ``assets/img`` are optimized in place with SVGO
+  when it is available, otherwise with a conservative built-in minifier that
+  keeps text content and attribute values other than path data as they are.
+- Images and scripts are copied to ``assets/dist`` with content-hashed names,
+  ``.gz`` (and ``.br`` when the ``brotli`` package is installed) siblings and a
+  manifest used by :func:`app.assets.asset_url`.
+
+The stylesheets are not hashed here, Vite bundles, minifies and hashes them in
+the frontend build.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import re
+import shutil
+import subprocess
+import urllib.request
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Final
+
+from app.assets import (
+    ASSETS_PATH,
+    DIST_DIR,
+    FONTS_DIR,
+    FONTS_STYLESHEET,
+    MANIFEST_FILE,
+)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+FONT_FAMILY: Final = "Roboto Flex"
+FONT_WEIGHTS: Final = (400, 800)
+# unicode ranges of the google fonts css to keep, german texts need latin-ext
+FONT_SUBSETS: Final = ("latin", "latin-ext")
+GOOGLE_FONTS_CSS: Final = "https://fonts.googleapis.com/css2"
+# google serves woff2 only to browsers it recognizes
+FONTS_USER_AGENT: Final = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+)
+
+SVG_DIRS: Final = ("icons", "img")
+HASHED_DIRS: Final = ("icons", "img", "js")
+COMPRESSIBLE_SUFFIXES: Final = frozenset({".svg", ".js", ".css", ".json"})
+MIN_COMPRESS_SIZE: Final = 256
+HASH_LENGTH: Final = 10
+
+_FONT_FACE: Final = re.compile(r"/\*\s*([\w-]+)\s*\*/\s*(@font-face\s*{[^}]*})")
+_FONT_URL: Final = re.compile(r"url\((https://[^)]+\.woff2)\)")
+
+
+@dataclass
+class BuildReport:
+    fonts: list[str] = field(default_factory=list)
+    svg_bytes_before: int = 0
+    svg_bytes_after: int = 0
+    hashed: dict[str, str] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        saved = self.svg_bytes_before - self.svg_bytes_after
+        return (
+            f"{len(self.fonts)} font files, "
+            f"svg {self.svg_bytes_before} -> {self.svg_bytes_after} bytes "
+            f"({saved} saved), {len(self.hashed)} hashed assets"
+        )
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _fetch(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": FONTS_USER_AGENT})  # noqa: S310
+    with urllib.request.urlopen(request, timeout=30) as response:  # noqa: S310
+        return response.read()
+
+
+def vendor_fonts(assets_path: Path = ASSETS_PATH) -> list[str]:
+    """Download the used font subsets and write the font stylesheet."""
+    low, high = FONT_WEIGHTS
+    family = FONT_FAMILY.replace(" ", "+")
+    css = _fetch(f"{GOOGLE_FONTS_CSS}?family={family}:wght@{low}..{high}&display=swap")
+
+    fonts_path = assets_path / FONTS_DIR
+    fonts_path.mkdir(parents=True, exist_ok=True)
+    slug = FONT_FAMILY.lower().replace(" ", "-")
+
+    files = []
+    faces = []
+    for subset, face in _FONT_FACE.findall(css.decode()):
+        if subset not in FONT_SUBSETS:
+            continue
+        match = _FONT_URL.search(face)
+        if match is None:
+            continue
+
+        data = _fetch(match.group(1))
+        name = f"{slug}-{subset}.{content_hash(data)}.woff2"
+        (fonts_path / name).write_bytes(data)
+        files.append(name)
+        faces.append(face.replace(match.group(1), f"/{FONTS_DIR}/{name}"))
+
+    for stale in fonts_path.glob(f"{slug}-*.woff2"):
+        if stale.name not in files:
+            stale.unlink()
+
+    stylesheet = assets_path / FONTS_STYLESHEET
+    stylesheet.write_text(
+        f"/* {FONT_FAMILY} {low}-{high}, generated by build-assets --fonts */\n"
+        + "\n".join(faces)
+        + "\n",
+        encoding="utf-8",
+    )
+    logger.info("Vendored %d font files to %s", len(files), fonts_path)
+    return files
+
+
+def _svgo_command() -> list[str] | None:
+    if svgo := shutil.which("svgo"):
+        return [svgo]
+    if bunx := shutil.which("bunx"):
+        return [bunx, "svgo"]
+    return None
+
+
+_XML_PROLOG: Final = re.compile(r"<\?xml[^>]*\?>|<!DOCTYPE[^>]*>", re.IGNORECASE)
+_COMMENT: Final = re.compile(r"<!--.*?-->", re.DOTALL)
+_METADATA: Final = re.compile(r"<metadata\b.*?</metadata>", re.DOTALL)
+# whitespace is content in text elements, e.g. between two tspans
+_BETWEEN_TAGS: Final = re.compile(r"(<text\b.*?</text>)|(?<=>)\s+(?=<)", re.DOTALL)
+_PATH_DATA: Final = re.compile(r"(\sd=)([\"'])(.*?)\2", re.DOTALL)
+_WHITESPACE: Final = re.compile(r"\s+")
+
+
+def _collapse_path_data(match: re.Match[str]) -> str:
+    attribute, quote, data = match.groups()
+    return f"{attribute}{quote}{_WHITESPACE.sub(' ', data).strip()}{quote}"
+
+
+def minify_svg(text: str) -> str:
+    """Drop prolog, comments, metadata, whitespace between tags and in path data.
+
+    Text content and other attribute values are kept as they are.
+    """
+    text = _XML_PROLOG.sub("", text)
+    text = _COMMENT.sub("", text)
+    text = _METADATA.sub("", text)
+    text = _BETWEEN_TAGS.sub(lambda match: match.group(1) or "", text)
+    return _PATH_DATA.sub(_collapse_path_data, text).strip() + "\n"
+
+
+def optimize_svgs(paths: Iterable[Path], report: BuildReport) -> None:
+    paths = sorted(paths)
+    before = {path: path.stat().st_size for path in paths}
+
+    command = _svgo_command()
+    if command is not None and paths:
+        subprocess.run(  # noqa: S603
+            [*command, "--multipass", "--quiet", *map(str, paths)], check=True
+        )
+    else:
+        logger.info("SVGO is not available, using the built-in SVG minifier")
+        for path in paths:
+            text = path.read_text(encoding="utf-8")
+            minified = minify_svg(text)
+            if len(minified) < len(text):
+                path.write_text(minified, encoding="utf-8")
+
+    report.svg_bytes_before += sum(before.values())
+    report.svg_bytes_after += sum(path.stat().st_size for path in paths)
+
+
+def _write_compressed(path: Path, data: bytes) -> None:
+    if path.suffix not in COMPRESSIBLE_SUFFIXES or len(data) < MIN_COMPRESS_SIZE:
+        return
+    path.with_name(path.name + ".gz").write_bytes(
+        gzip.compress(data, compresslevel=9, mtime=0)
+    )
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data))
+
+
+def hash_assets(assets_path: Path, report: BuildReport) -> dict[str, str]:
+    """Copy assets to ``dist`` with content-hashed names and write the manifest."""
+    dist_path = assets_path / DIST_DIR
+    if dist_path.exists():
+        shutil.rmtree(dist_path)
+
+    manifest = {}
+    for directory in HASHED_DIRS:
+        for source in sorted((assets_path / directory).rglob("*")):
+            if not source.is_file():
+                continue
+            data = source.read_bytes()
+            relative = source.relative_to(assets_path)
+            hashed = relative.with_name(
+                f"{source.stem}.{content_hash(data)}{source.suffix}"
+            )
+            target = dist_path / hashed
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+            _write_compressed(target, data)
+            manifest[relative.as_posix()] = f"{DIST_DIR}/{hashed.as_posix()}"
+
+    (dist_path / MANIFEST_FILE).write_text(
+        json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8"
+    )
+    report.hashed = manifest
+    return manifest
+
+
+def build_assets(assets_path: Path = ASSETS_PATH, fonts: bool = False) -> BuildReport:
+    report = BuildReport()
+    if fonts:
+        report.fonts = vendor_fonts(assets_path)
+
+    optimize_svgs(
+        (
+            path
+            for directory in SVG_DIRS
+            for path in (assets_path / directory).glob("*.svg")
+        ),
+        report,
+    )
+    hash_assets(assets_path, report)
+    logger.info("Assets built: %s", report.summary())
+    return report
@@ -0,0 +1,48 @@
+"""Runtime side of the static asset pipeline (see ``app.asset_pipeline``).
+
+``python main.py build-assets`` writes optimized, content-hashed copies of the
+assets to ``assets/dist`` together with a manifest. Pages reference assets
+through :func:`asset_url`, which returns the hashed URL when the manifest exists
+and the plain URL otherwise, so a checkout without built assets keeps working.
+"""
+
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Final
+
+logger = logging.getLogger(__name__)
+
+ASSETS_PATH: Final = Path("assets")
+DIST_DIR: Final = "dist"
+FONTS_DIR: Final = "fonts"
+MANIFEST_FILE: Final = "manifest.json"
+FONTS_STYLESHEET: Final = "css/fonts.css"
+
+# used until the fonts are vendored with ``build-assets --fonts``
+FONTS_FALLBACK_URL: Final = (
+    "https://fonts.googleapis.com/css2?family=Roboto+Flex:wght@400..800&display=swap"
+)
+
+
+@lru_cache(maxsize=1)
+def manifest() -> dict[str, str]:
+    path = ASSETS_PATH / DIST_DIR / MANIFEST_FILE
+    if not path.is_file():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def asset_url(path: str) -> str:
+    """URL of the asset ``path`` (relative to ``assets``), hashed if built."""
+    path = path.lstrip("/")
+    return "/" + manifest().get(path, path)
+
+
+def font_stylesheets() -> list[str]:
+    """The vendored font stylesheet, or the Google Fonts URL as fallback."""
+    if (ASSETS_PATH / FONTS_STYLESHEET).is_file():
+        return [FONTS_STYLESHEET]
+    logger.debug("Fonts are not vendored, loading them from Google Fonts")
+    return [FONTS_FALLBACK_URL]
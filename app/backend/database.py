@@ -0,0 +1,161 @@
+"""Tunable and instrumented async database engine.
+
+``appkit_commons.database.session`` creates its engine without any pool settings
+(``pool_size``/``max_overflow`` of the database config are only applied for the
+type ``postgres``, while the config uses ``postgresql``). This module builds the
+async engine from ``DatabaseConfig`` and the ``database_pool`` section and
+installs it as the session manager behind ``get_asyncdb_session`` and as the
+engine of ``rx.asession``, so Reflex does not open a second pool with its
+default settings (``async_db_url`` in ``rxconfig.py`` is the same database).
+"""
+
+import logging
+import time
+from functools import lru_cache, wraps
+from typing import Any
+
+from reflex import model as rx_model
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from appkit_commons.database import session as db_session
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.database.sessionmanager import AsyncSessionManager
+from appkit_commons.registry import service_registry
+
+from app.backend.metrics import Histogram
+from app.configuration import DatabasePoolConfig
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool recording checkout wait times and overflow events."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_ms = Histogram()
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.invalidations = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        overflow = self._overflow
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+        self.checkouts += 1
+        # a new connection beyond pool_size was opened
+        if self._overflow > overflow and self._overflow > 0:
+            self.overflow_events += 1
+        return entry
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+            "invalidations": self.invalidations,
+            "wait_ms": self.wait_ms.summary(),
+        }
+
+
+def engine_kwargs(
+    db_config: DatabaseConfig, pool_config: DatabasePoolConfig
+) -> dict[str, Any]:
+    """Build the ``create_async_engine`` keyword arguments."""
+    connect_args: dict[str, Any] = {
+        "prepare_threshold": pool_config.prepare_threshold,
+    }
+    if pool_config.statement_timeout:
+        connect_args["options"] = (
+            f"-c statement_timeout={pool_config.statement_timeout}"
+        )
+
+    return {
+        "poolclass": InstrumentedAsyncPool,
+        "pool_size": pool_config.pool_size or db_config.pool_size,
+        "max_overflow": (
+            pool_config.max_overflow
+            if pool_config.max_overflow is not None
+            else db_config.max_overflow
+        ),
+        "pool_timeout": pool_config.pool_timeout,
+        "pool_recycle": pool_config.pool_recycle,
+        "pool_pre_ping": pool_config.pool_pre_ping,
+        "pool_use_lifo": pool_config.pool_use_lifo,
+        "echo": db_config.echo,
+        "connect_args": connect_args,
+    }
+
+
+@lru_cache(maxsize=1)
+def get_async_session_manager() -> AsyncSessionManager:
+    db_config = service_registry().get(DatabaseConfig)
+    pool_config = service_registry().get(DatabasePoolConfig)
+    kwargs = engine_kwargs(db_config, pool_config)
+    logger.info(
+        "Creating async database pool: size=%d, max_overflow=%d, pre_ping=%s",
+        kwargs["pool_size"],
+        kwargs["max_overflow"],
+        kwargs["pool_pre_ping"],
+    )
+
+    manager = AsyncSessionManager(db_config.url, kwargs)
+    sync_engine = manager._engine.sync_engine  # noqa: SLF001
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection: Any, _record: Any) -> None:
+        # size of the per-connection prepared statement cache of psycopg
+        dbapi_connection.driver_connection.prepared_max = (
+            pool_config.prepared_statement_cache_size
+        )
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(_dbapi_connection: Any, _record: Any, _exc: Any) -> None:
+        _pool().invalidations += 1
+
+    return manager
+
+
+def _pool() -> InstrumentedAsyncPool:
+    return get_async_session_manager()._engine.pool  # noqa: SLF001
+
+
+def pool_stats() -> dict[str, Any]:
+    """Live statistics of the async connection pool of this worker."""
+    return _pool().stats()
+
+
+def install_database_pool() -> None:
+    """Use the configured, instrumented engine for all async sessions."""
+    db_config = service_registry().get(DatabaseConfig)
+    if db_config.type != "postgresql":
+        return
+
+    db_session.get_async_session_manager = get_async_session_manager
+
+    get_async_engine = rx_model.get_async_engine
+    if getattr(get_async_engine, "__wrapped__", None) is not None:
+        return
+
+    @wraps(get_async_engine)
+    def shared_async_engine(url: str | None) -> AsyncEngine:
+        if url is None or url == db_config.url:
+            return get_async_session_manager()._engine  # noqa: SLF001
+        return get_async_engine(url)
+
+    rx_model.get_async_engine = shared_async_engine
@@ -0,0 +1,217 @@
+"""Cross-worker cache invalidation over Postgres ``LISTEN``/``NOTIFY``.
+
+Every gunicorn worker keeps its own in-process caches (sessions, users, roles).
+Changes are published on the invalidation bus: handlers of the publishing worker
+are called immediately, and the event is sent with ``pg_notify`` to all other
+workers, which apply it when it arrives on their ``LISTEN`` connection.
+
+With a single worker the :class:`InvalidationBus` base class is used, which only
+dispatches locally and never opens a database connection.
+
+The bus is created when the app module is imported, which gunicorn's
+``--preload`` does once in the master before forking the workers. The origin
+that identifies the events of a worker is therefore created per process, on
+first use after a fork.
+"""
+
+import asyncio
+import contextlib
+import inspect
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from functools import lru_cache
+
+import psycopg
+from psycopg import sql
+
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.registry import service_registry
+
+from app.backend.workers import backend_workers
+from app.configuration import InvalidationConfig
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_MAX = 30.0  # seconds
+
+
+class InvalidationKind(StrEnum):
+    USER = "user"
+    ROLE = "role"
+    SESSION = "session"
+    # events may have been missed, e.g. after the listen connection was
+    # re-established, subscribers should drop everything they cached
+    FLUSH = "flush"
+
+
+@dataclass(frozen=True, slots=True)
+class InvalidationEvent:
+    kind: InvalidationKind
+    key: str
+    origin: str
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "InvalidationEvent":
+        data = json.loads(payload)
+        return cls(
+            kind=InvalidationKind(data["kind"]),
+            key=str(data["key"]),
+            origin=data["origin"],
+        )
+
+
+InvalidationHandler = Callable[[InvalidationEvent], None | Awaitable[None]]
+
+
+class InvalidationBus:
+    """Process-local invalidation bus, used when only one worker runs."""
+
+    def __init__(self) -> None:
+        self._origin = uuid.uuid4().hex
+        self._origin_pid = os.getpid()
+        self._handlers: dict[InvalidationKind, list[InvalidationHandler]] = defaultdict(
+            list
+        )
+
+    @property
+    def origin(self) -> str:
+        """Id of this bus in this process, a forked worker gets a new one."""
+        if self._origin_pid != os.getpid():
+            self._origin = uuid.uuid4().hex
+            self._origin_pid = os.getpid()
+        return self._origin
+
+    def subscribe(self, kind: InvalidationKind, handler: InvalidationHandler) -> None:
+        self._handlers[kind].append(handler)
+
+    async def _dispatch(self, event: InvalidationEvent) -> None:
+        for handler in self._handlers[event.kind]:
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Invalidation handler failed for %s", event)
+
+    async def publish(self, kind: InvalidationKind, key: str | int) -> None:
+        await self._dispatch(InvalidationEvent(kind, str(key), self.origin))
+
+    async def run(self) -> None:
+        """Listen for events of other workers, nothing to do locally."""
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresInvalidationBus(InvalidationBus):
+    """Invalidation bus broadcasting events to all workers via ``NOTIFY``."""
+
+    def __init__(self, conninfo: str, channel: str) -> None:
+        super().__init__()
+        self.conninfo = conninfo
+        self.channel = channel
+        self._publish_conn: psycopg.AsyncConnection | None = None
+        self._publish_lock = asyncio.Lock()
+
+    async def _notify(self, payload: str) -> None:
+        async with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.closed:
+                self._publish_conn = await psycopg.AsyncConnection.connect(
+                    self.conninfo, autocommit=True
+                )
+            await self._publish_conn.execute(
+                "SELECT pg_notify(%s, %s)", (self.channel, payload)
+            )
+
+    async def publish(self, kind: InvalidationKind, key: str | int) -> None:
+        event = InvalidationEvent(kind, str(key), self.origin)
+        await self._dispatch(event)
+        try:
+            await self._notify(event.to_json())
+        except (psycopg.Error, OSError):
+            logger.exception("Failed to publish invalidation event %s", event)
+            await self.close()
+
+    async def _receive(self, payload: str) -> None:
+        try:
+            event = InvalidationEvent.from_json(payload)
+        except (ValueError, KeyError):
+            logger.warning("Ignoring invalid event: %s", payload)
+            return
+        if event.origin != self.origin:
+            await self._dispatch(event)
+
+    async def _listen(self) -> None:
+        async with await psycopg.AsyncConnection.connect(
+            self.conninfo, autocommit=True
+        ) as conn:
+            await conn.execute(
+                sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+            )
+            logger.info("Listening for invalidation events on '%s'", self.channel)
+            # events sent while we were not listening are lost
+            await self._dispatch(
+                InvalidationEvent(InvalidationKind.FLUSH, "", self.origin)
+            )
+
+            async for notify in conn.notifies():
+                await self._receive(notify.payload)
+
+    async def run(self) -> None:
+        """Listen for events of other workers, reconnecting on errors."""
+        delay = 1.0
+        while True:
+            try:
+                await self._listen()
+                delay = 1.0
+            except (psycopg.Error, OSError):
+                logger.exception(
+                    "Invalidation listener failed, reconnecting in %.0fs", delay
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def close(self) -> None:
+        if self._publish_conn is not None:
+            conn, self._publish_conn = self._publish_conn, None
+            with contextlib.suppress(psycopg.Error, OSError):
+                await conn.close()
+
+
+def _conninfo(db_config: DatabaseConfig) -> str:
+    """Convert the SQLAlchemy URL of the database config to a libpq URL."""
+    return db_config.url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+@lru_cache(maxsize=1)
+def invalidation_bus() -> InvalidationBus:
+    config = service_registry().get(InvalidationConfig)
+    db_config = service_registry().get(DatabaseConfig)
+
+    if not config.enabled or db_config.type != "postgresql":
+        logger.info("Cross-worker invalidation is disabled")
+        return InvalidationBus()
+
+    if backend_workers() <= 1 and not config.force:
+        logger.debug("Single worker, using process-local invalidation bus")
+        return InvalidationBus()
+
+    return PostgresInvalidationBus(_conninfo(db_config), config.channel)
+
+
+async def invalidation_bus_task() -> None:
+    """Lifespan task running the listener of the invalidation bus."""
+    bus = invalidation_bus()
+    try:
+        await bus.run()
+    finally:
+        await bus.close()
@@ -0,0 +1,220 @@
+"""Write-behind buffer for ``auth_users.last_login``.
+
+appkit_user sets ``last_login`` on every OAuth login (and on every update of a
+user by an administrator). Because the column changes every time, each login
+rewrites the whole user row including ``updated`` (``onupdate=func.now()``):
+a dead tuple per login and a row lock that concurrent logins of the same
+account, e.g. a shared admin account, queue behind.
+
+:func:`install_last_seen` takes such assignments out of the ORM flush with a
+``before_flush`` listener: the new timestamp is recorded in the process-local
+:class:`LastSeenBuffer` and the attribute is marked as unchanged, a login that
+changes nothing else no longer updates the row. Successful password logins,
+which appkit_user does not record, are added to the buffer as well.
+
+:func:`last_seen_task` writes the buffer with one ``UPDATE ... FROM (VALUES
+...)`` per ``batch_size`` users once the oldest timestamp is ``max_staleness``
+seconds old or ``max_pending`` users are waiting, and once more when the
+worker shuts down. A timestamp never moves backwards, so several workers can
+write the same user in any order. ``updated`` is not touched by these writes.
+Reads of ``last_login`` lag behind by up to ``max_staleness``.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from functools import lru_cache, wraps
+from typing import Any
+
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    column,
+    event,
+    inspect,
+    or_,
+    table,
+    update,
+    values,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from appkit_commons.database.session import get_asyncdb_session
+from appkit_commons.registry import service_registry
+from appkit_user.authentication.backend import user_repository
+from appkit_user.authentication.backend.entities import UserEntity
+
+from app.backend.metrics import Histogram
+from app.configuration import LastSeenConfig
+
+logger = logging.getLogger(__name__)
+
+_users = table("auth_users", column("id"), column("last_login"))
+
+
+@dataclass
+class LastSeenStats:
+    recorded: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    rows_written: int = 0
+    flush_ms: Histogram = field(default_factory=Histogram)
+
+
+class LastSeenBuffer:
+    """Latest ``last_login`` per user id, waiting to be written."""
+
+    def __init__(self, config: LastSeenConfig) -> None:
+        self.config = config
+        self.stats = LastSeenStats()
+        self._pending: dict[int, datetime] = {}
+        self._oldest: float | None = None
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, user_id: int, seen_at: datetime) -> None:
+        current = self._pending.get(user_id)
+        if current is None or seen_at > current:
+            self._pending[user_id] = seen_at
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self.stats.recorded += 1
+        if len(self._pending) >= self.config.max_pending:
+            self._full.set()
+
+    def due(self) -> bool:
+        return self._oldest is not None and (
+            time.monotonic() - self._oldest >= self.config.max_staleness
+            or len(self._pending) >= self.config.max_pending
+        )
+
+    async def wait(self) -> None:
+        """Wait ``flush_interval`` seconds or until the buffer is full."""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._full.wait(), self.config.flush_interval)
+
+    async def flush(self) -> int:
+        """Write all pending timestamps, return the number of updated rows."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending = sorted(self._pending.items())
+            self._pending = {}
+            self._oldest = None
+            self._full.clear()
+
+            started = time.perf_counter()
+            written = 0
+            try:
+                async with get_asyncdb_session() as db:
+                    for start in range(0, len(pending), self.config.batch_size):
+                        result = await db.execute(
+                            _update_statement(
+                                pending[start : start + self.config.batch_size]
+                            )
+                        )
+                        written += result.rowcount
+                    await db.commit()
+            except BaseException:
+                self.stats.failed_flushes += 1
+                # keep them for the next flush, unless newer ones were recorded
+                for user_id, seen_at in pending:
+                    current = self._pending.get(user_id)
+                    if current is None or current < seen_at:
+                        self._pending[user_id] = seen_at
+                self._oldest = self._oldest or time.monotonic()
+                raise
+
+            self.stats.flushes += 1
+            self.stats.rows_written += written
+            self.stats.flush_ms.observe((time.perf_counter() - started) * 1000)
+            return written
+
+
+def _update_statement(rows: list[tuple[int, datetime]]) -> Any:
+    seen = values(
+        column("id", Integer), column("seen_at", DateTime(timezone=True)), name="seen"
+    ).data(rows)
+    return (
+        update(_users)
+        .where(_users.c.id == seen.c.id)
+        .where(or_(_users.c.last_login.is_(None), _users.c.last_login < seen.c.seen_at))
+        .values(last_login=seen.c.seen_at)
+    )
+
+
+@lru_cache(maxsize=1)
+def last_seen_buffer() -> LastSeenBuffer:
+    return LastSeenBuffer(service_registry().get(LastSeenConfig))
+
+
+def _buffer_last_login(session: Session, _context: Any, _instances: Any) -> None:
+    for instance in session.dirty:
+        if not isinstance(instance, UserEntity):
+            continue
+        state = inspect(instance)
+        if not state.persistent:
+            continue
+        added = state.attrs.last_login.history.added
+        if not added or added[0] is None:
+            continue
+        set_committed_value(instance, "last_login", added[0])
+        last_seen_buffer().record(instance.id, added[0])
+
+
+def install_last_seen() -> None:
+    """Buffer the ``last_login`` writes of appkit_user, if enabled."""
+    if not service_registry().get(LastSeenConfig).enabled:
+        logger.info("Last login buffer is disabled")
+        return
+    if event.contains(Session, "before_flush", _buffer_last_login):
+        return
+
+    get_user_status = user_repository.get_user_status_by_email_and_password
+
+    @wraps(get_user_status)
+    async def recording_get_user_status(*args: Any, **kwargs: Any) -> Any:
+        user, status = await get_user_status(*args, **kwargs)
+        if status == "success" and user is not None:
+            last_seen_buffer().record(user.id, datetime.now(UTC))
+        return user, status
+
+    event.listen(Session, "before_flush", _buffer_last_login)
+    user_repository.get_user_status_by_email_and_password = recording_get_user_status
+    logger.info("Last login timestamps buffered")
+
+
+async def last_seen_task() -> None:
+    """Lifespan task writing the buffered timestamps, and the rest on shutdown."""
+    config = service_registry().get(LastSeenConfig)
+    if not config.enabled:
+        return
+
+    buffer = last_seen_buffer()
+    try:
+        while True:
+            await buffer.wait()
+            if not buffer.due():
+                continue
+            try:
+                written = await buffer.flush()
+            except Exception:
+                logger.exception("Writing the last login timestamps failed")
+            else:
+                logger.debug("Wrote the last login of %d users", written)
+    finally:
+        if len(buffer):
+            try:
+                # shield the final write from the cancellation of the lifespan
+                await asyncio.shield(buffer.flush())
+            except Exception:
+                logger.exception("Writing the last login timestamps failed")
+            else:
+                logger.info("Wrote the last login timestamps on shutdown")
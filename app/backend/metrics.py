@@ -0,0 +1,75 @@
+"""Low-overhead in-process metric primitives."""
+
+import bisect
+from collections.abc import Sequence
+from typing import Final
+
+# milliseconds
+DEFAULT_LATENCY_BUCKETS: Final = (
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    25.0,
+    50.0,
+    100.0,
+    250.0,
+    500.0,
+    1000.0,
+    2500.0,
+    5000.0,
+    10000.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram, ``observe`` is a bisect and two additions."""
+
+    __slots__ = ("buckets", "count", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # the last slot counts observations above the largest bucket
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile as the upper bound of its bucket."""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return (
+                    self.buckets[index] if index < len(self.buckets) else float("inf")
+                )
+        return float("inf")
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """Return ``(upper bound, cumulative count)`` pairs including ``+Inf``."""
+        result = []
+        cumulative = 0
+        for bound, count in zip(
+            (*self.buckets, float("inf")), self.counts, strict=True
+        ):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
@@ -0,0 +1,199 @@
+"""Helpers to migrate the production tables while the workers serve traffic.
+
+``alembic/env.py`` runs the migrations of several containers starting at once
+one after the other: the first takes a session-level advisory lock, the others
+wait for it and then find the database at head. Every migration runs in a
+transaction of its own with ``lock_timeout`` and ``statement_timeout`` set, so
+an ``ALTER TABLE`` waiting behind a long-running query gives up quickly instead
+of queueing every query of the workers behind its own lock. A migration that
+failed to get a lock is retried with a growing delay.
+
+Migrations build indexes with :func:`create_index_concurrently` and fill new
+columns with :func:`backfill`, both outside of the migration's transaction.
+"""
+
+import logging
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
+
+from alembic import context, op
+from app.configuration import MigrationConfig
+
+logger = logging.getLogger(__name__)
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def is_lock_timeout(error: DBAPIError) -> bool:
+    # psycopg 3 and psycopg2
+    code = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return code == LOCK_NOT_AVAILABLE
+
+
+def set_timeouts(
+    connection: Connection, lock_timeout: int, statement_timeout: int
+) -> None:
+    """Set the timeouts of the session, in milliseconds, 0 disables them."""
+    connection.execute(text(f"SET lock_timeout = {int(lock_timeout)}"))
+    connection.execute(text(f"SET statement_timeout = {int(statement_timeout)}"))
+    connection.commit()
+
+
+@contextmanager
+def advisory_lock(connection: Connection, config: MigrationConfig) -> Iterator[None]:
+    """Hold the migration lock of the database, wait up to ``lock_wait`` for it."""
+    deadline = time.monotonic() + config.lock_wait
+    params = {"lock_id": config.advisory_lock_id}
+    while not connection.execute(
+        text("SELECT pg_try_advisory_lock(:lock_id)"), params
+    ).scalar():
+        if time.monotonic() > deadline:
+            msg = f"Another migration held the lock for more than {config.lock_wait}s"
+            raise TimeoutError(msg)
+        logger.info("Waiting for another migration to finish")
+        time.sleep(1)
+    connection.commit()
+
+    try:
+        yield
+    finally:
+        connection.rollback()
+        connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), params)
+        connection.commit()
+
+
+def run_with_retries(connection: Connection, config: MigrationConfig) -> None:
+    """Run the pending migrations, retry the one that timed out on a lock."""
+    delay = config.retry_delay
+    for attempt in range(config.retries + 1):
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        except DBAPIError as e:
+            if not is_lock_timeout(e) or attempt == config.retries:
+                raise
+            # the failed migration is rolled back, the ones before are committed
+            connection.rollback()
+            logger.warning(
+                "Migration timed out waiting for a lock, retry %d of %d in %.1fs",
+                attempt + 1,
+                config.retries,
+                delay,
+            )
+            time.sleep(delay)
+            delay *= 2
+        else:
+            return
+
+
+def _config() -> MigrationConfig:
+    from app import configuration  # noqa: PLC0415
+
+    return configuration.app.migration
+
+
+@contextmanager
+def _outside_transaction(statement_timeout: int) -> Iterator[None]:
+    config = _config()
+    with op.get_context().autocommit_block():
+        op.execute(f"SET statement_timeout = {int(statement_timeout)}")
+        try:
+            yield
+        finally:
+            op.execute(f"SET statement_timeout = {int(config.statement_timeout)}")
+
+
+def create_index_concurrently(
+    index_name: str, table_name: str, columns: Sequence[Any], **kwargs: Any
+) -> None:
+    """``op.create_index`` without blocking writes to the table.
+
+    A concurrent build that failed leaves an invalid index behind, which is
+    dropped and built again.
+    """
+    if op.get_context().dialect.name != "postgresql":
+        op.create_index(index_name, table_name, columns, **kwargs)
+        return
+
+    config = _config()
+    with _outside_transaction(config.index_statement_timeout):
+        if not context.is_offline_mode():
+            invalid = op.get_bind().execute(
+                text(
+                    "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :name AND NOT i.indisvalid"
+                ),
+                {"name": index_name},
+            )
+            if invalid.first():
+                logger.warning("Rebuilding the invalid index %s", index_name)
+                op.drop_index(
+                    index_name, table_name=table_name, postgresql_concurrently=True
+                )
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kwargs,
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """``op.drop_index`` without blocking the table."""
+    if op.get_context().dialect.name != "postgresql":
+        op.drop_index(index_name, table_name=table_name)
+        return
+
+    with _outside_transaction(_config().statement_timeout):
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def backfill(
+    table_name: str,
+    assignments: str,
+    pending: str,
+    batch_size: int | None = None,
+    key: str = "id",
+) -> int:
+    """Update the ``pending`` rows of a table in batches, one transaction each.
+
+    ``pending`` must be false for a row once ``assignments`` were applied, e.g.
+    ``assignments="full_name = name", pending="full_name IS NULL"``: a backfill
+    that was interrupted continues with the remaining rows when the migration
+    runs again. Returns the number of updated rows.
+    """
+    config = _config()
+    batch_size = batch_size or config.backfill_batch_size
+    statement = text(
+        f"UPDATE {table_name} SET {assignments} WHERE {key} IN ("  # noqa: S608
+        f"SELECT {key} FROM {table_name} WHERE {pending} "
+        f"LIMIT :batch_size FOR UPDATE SKIP LOCKED)"
+    )
+    if context.is_offline_mode():
+        op.execute(statement.bindparams(batch_size=batch_size))
+        return 0
+
+    updated = 0
+    with _outside_transaction(config.statement_timeout):
+        bind = op.get_bind()
+        while True:
+            # autocommit, every batch is committed on its own
+            rows = bind.execute(statement, {"batch_size": batch_size}).rowcount
+            updated += rows
+            logger.info("Backfilled %d rows of %s", updated, table_name)
+            # rows locked by the workers are skipped, and picked up again later
+            if not rows:
+                return updated
+            time.sleep(config.backfill_pause)
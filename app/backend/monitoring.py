@@ -0,0 +1,708 @@
+"""Prometheus metrics of the backend, served by :class:`MetricsEndpoint`.
+
+Every worker keeps its metrics in process: the statistics the connection pool,
+the session cache and the session reaper already collect, plus the event
+handler latencies, serialized state sizes and login/logout counts recorded by
+the hooks of :func:`install_metrics`. Nothing is computed per event beyond a
+histogram ``observe``.
+
+To aggregate across gunicorn workers, each worker writes a snapshot of its
+metrics to the shared ``multiprocess_dir`` every ``flush_interval`` seconds
+(:func:`metrics_snapshot_task`). The worker answering ``/metrics`` merges the
+snapshots of all workers with its own live metrics: counters and histograms are
+summed, including those of exited workers, gauges are reported per live worker
+with a ``pid`` label.
+
+``/metrics`` answers only clients from ``allowed_networks`` (loopback by
+default) and clients sending ``bearer_token``, everybody else gets a 403.
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+from typing import Any, Final, Literal
+
+from reflex.state import BaseState
+from reflex_base.event.processor.base_state_processor import BaseStateEventProcessor
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from appkit_commons.registry import service_registry
+from appkit_user.authentication.backend import user_repository
+from appkit_user.authentication.states import LoginState
+
+from app.backend import (
+    database,
+    last_seen,
+    oauth_tokens,
+    password_hashing,
+    session_cache,
+    state_manager,
+)
+from app.backend.metrics import Histogram
+from app.backend.session_reaper import reaper_stats
+from app.configuration import MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE: Final = "text/plain; version=0.0.4; charset=utf-8"
+# bytes
+STATE_SIZE_BUCKETS: Final = (
+    1024.0,
+    4096.0,
+    16384.0,
+    65536.0,
+    262144.0,
+    1048576.0,
+    4194304.0,
+)
+
+MetricType = Literal["counter", "gauge", "histogram"]
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass(slots=True)
+class MetricFamily:
+    name: str
+    type: MetricType
+    help: str
+    # labels -> value, or the histogram state for histograms
+    samples: dict[Labels, Any] = field(default_factory=dict)
+
+    def add(self, value: Any, **labels: str) -> None:
+        self.samples[tuple(sorted(labels.items()))] = value
+
+
+def _histogram_state(histogram: Histogram) -> dict[str, Any]:
+    return {
+        "buckets": list(histogram.buckets),
+        "counts": list(histogram.counts),
+        "sum": histogram.sum,
+        "count": histogram.count,
+    }
+
+
+class ProcessMetrics:
+    """Metrics recorded by the hooks in this worker."""
+
+    def __init__(self) -> None:
+        self.event_ms: dict[str, Histogram] = {}
+        self.event_errors: dict[str, int] = {}
+        self.state_bytes: dict[str, Histogram] = {}
+        # (method, result) -> count
+        self.logins: dict[tuple[str, str], int] = {}
+        self.logouts = 0
+        self.gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+    def observe_event(self, handler: str, duration_ms: float) -> None:
+        histogram = self.event_ms.get(handler)
+        if histogram is None:
+            histogram = self.event_ms[handler] = Histogram()
+        histogram.observe(duration_ms)
+
+    def observe_state(self, state: str, size: int) -> None:
+        histogram = self.state_bytes.get(state)
+        if histogram is None:
+            histogram = self.state_bytes[state] = Histogram(STATE_SIZE_BUCKETS)
+        histogram.observe(size)
+
+    def count_login(self, method: str, result: str) -> None:
+        key = (method, result)
+        self.logins[key] = self.logins.get(key, 0) + 1
+
+
+process_metrics = ProcessMetrics()
+
+
+def register_gauge(name: str, help_text: str, read: Callable[[], float]) -> None:
+    """Export the value returned by ``read`` as per-worker gauge ``name``."""
+    process_metrics.gauges[name] = (help_text, read)
+
+
+def _pool_families() -> Iterable[MetricFamily]:
+    # do not create the engine just to report an empty pool
+    if not database.get_async_session_manager.cache_info().currsize:
+        return
+    stats = database.pool_stats()
+
+    for key, help_text in (
+        ("size", "Configured size of the connection pool."),
+        ("checked_out", "Connections currently in use."),
+        ("overflow", "Connections open beyond the pool size."),
+    ):
+        family = MetricFamily(f"db_pool_{key}", "gauge", help_text)
+        family.add(stats[key])
+        yield family
+
+    for key, help_text in (
+        ("checkouts", "Connections checked out of the pool."),
+        ("overflow_events", "Connections opened beyond the pool size."),
+        ("timeouts", "Checkouts that timed out waiting for a connection."),
+        ("invalidations", "Connections invalidated after an error."),
+    ):
+        family = MetricFamily(f"db_pool_{key}", "counter", help_text)
+        family.add(stats[key])
+        yield family
+
+    wait = MetricFamily(
+        "db_pool_wait_milliseconds",
+        "histogram",
+        "Time waited for a connection of the pool.",
+    )
+    wait.add(_histogram_state(database._pool().wait_ms))  # noqa: SLF001
+    yield wait
+
+
+def _session_cache_families() -> Iterable[MetricFamily]:
+    if not session_cache.session_cache.cache_info().currsize:
+        return
+    stats = session_cache.session_cache().stats()
+
+    for key, help_text in (
+        ("hits", "Sessions served from the session cache."),
+        ("misses", "Session lookups that went to the database."),
+        ("evictions", "Sessions evicted from the full session cache."),
+        ("invalidations", "Sessions removed by invalidation events."),
+    ):
+        family = MetricFamily(f"session_cache_{key}", "counter", help_text)
+        family.add(stats[key])
+        yield family
+
+    size = MetricFamily("session_cache_size", "gauge", "Cached sessions.")
+    size.add(stats["size"])
+    yield size
+    ratio = MetricFamily(
+        "session_cache_hit_ratio", "gauge", "Hit ratio of the session cache."
+    )
+    ratio.add(stats["hit_ratio"])
+    yield ratio
+
+
+def _password_hashing_families() -> Iterable[MetricFamily]:
+    if not password_hashing.password_hasher.cache_info().currsize:
+        return
+    hasher = password_hashing.password_hasher()
+
+    for key, help_text in (
+        ("hashed", "Passwords hashed in the process pool."),
+        ("verified", "Passwords verified in the process pool."),
+        ("rehashed", "Password hashes replaced on login."),
+        ("rejected", "Password operations rejected, the pool was saturated."),
+    ):
+        family = MetricFamily(f"password_hashing_{key}", "counter", help_text)
+        family.add(getattr(hasher.stats, key))
+        yield family
+
+    pending = MetricFamily(
+        "password_hashing_pending", "gauge", "Password operations running or queued."
+    )
+    pending.add(hasher.pending)
+    yield pending
+    duration = MetricFamily(
+        "password_hashing_duration_milliseconds",
+        "histogram",
+        "Duration of the password operations, including the wait for the pool.",
+    )
+    duration.add(_histogram_state(hasher.stats.duration_ms))
+    yield duration
+
+
+def _oauth_token_families() -> Iterable[MetricFamily]:
+    if oauth_tokens.token_cache.cache_info().currsize:
+        cache = oauth_tokens.token_cache()
+        for key, help_text in (
+            ("hits", "OAuth tokens served from the decrypted token cache."),
+            ("misses", "OAuth tokens decrypted."),
+            ("evictions", "Tokens evicted from the full decrypted token cache."),
+        ):
+            family = MetricFamily(f"oauth_token_cache_{key}", "counter", help_text)
+            family.add(getattr(cache, key))
+            yield family
+
+    stats = oauth_tokens.rotation_stats
+    if not stats.runs and not stats.failed_runs:
+        return
+    for key, help_text in (
+        ("runs", "OAuth token rotation runs."),
+        ("failed_runs", "Failed oauth token rotation runs."),
+        ("rotated", "OAuth accounts whose tokens were re-encrypted."),
+        ("failed", "OAuth tokens no configured key could decrypt."),
+    ):
+        family = MetricFamily(f"oauth_token_rotation_{key}", "counter", help_text)
+        family.add(getattr(stats, key))
+        yield family
+
+
+def _last_seen_families() -> Iterable[MetricFamily]:
+    if not last_seen.last_seen_buffer.cache_info().currsize:
+        return
+    buffer = last_seen.last_seen_buffer()
+
+    for key, help_text in (
+        ("recorded", "Last login timestamps recorded in the buffer."),
+        ("flushes", "Writes of the last login buffer."),
+        ("failed_flushes", "Failed writes of the last login buffer."),
+        ("rows_written", "User rows updated by writes of the last login buffer."),
+    ):
+        family = MetricFamily(f"last_seen_{key}", "counter", help_text)
+        family.add(getattr(buffer.stats, key))
+        yield family
+
+    pending = MetricFamily(
+        "last_seen_pending", "gauge", "Users whose last login waits to be written."
+    )
+    pending.add(len(buffer))
+    yield pending
+    duration = MetricFamily(
+        "last_seen_flush_duration_milliseconds",
+        "histogram",
+        "Duration of the writes of the last login buffer.",
+    )
+    duration.add(_histogram_state(buffer.stats.flush_ms))
+    yield duration
+
+
+def _state_manager_families() -> Iterable[MetricFamily]:
+    if not state_manager.postgres_state_manager.cache_info().currsize:
+        return
+    manager = state_manager.postgres_state_manager()
+    if manager is None:
+        return
+    stats = manager.stats
+
+    for key, help_text in (
+        ("events", "Events that modified a client state."),
+        ("coalesced", "Events applied to a client state held in memory."),
+        ("flushes", "Client states written to Postgres."),
+        ("rows_written", "State rows written to Postgres."),
+        ("bytes_written", "Bytes of state rows written to Postgres."),
+        ("lock_timeouts", "Client states locked by another worker for too long."),
+        ("lost_locks", "Client states not written, their lock was lost."),
+        ("purged", "Expired client states deleted."),
+    ):
+        family = MetricFamily(f"state_manager_{key}", "counter", help_text)
+        family.add(getattr(stats, key))
+        yield family
+
+    wait = MetricFamily(
+        "state_manager_lock_wait_milliseconds",
+        "histogram",
+        "Wait for the advisory lock of a client state.",
+    )
+    wait.add(_histogram_state(stats.lock_wait_ms))
+    yield wait
+
+
+def _reaper_families() -> Iterable[MetricFamily]:
+    for key, help_text in (
+        ("runs", "Session reaper runs."),
+        ("failed_runs", "Failed session reaper runs."),
+        ("sessions_purged", "Expired sessions deleted by the reaper."),
+        ("oauth_states_purged", "Expired oauth states deleted by the reaper."),
+    ):
+        family = MetricFamily(f"session_reaper_{key}", "counter", help_text)
+        family.add(getattr(reaper_stats, key))
+        yield family
+
+
+def _process_families() -> Iterable[MetricFamily]:
+    events = MetricFamily(
+        "event_duration_milliseconds",
+        "histogram",
+        "Duration of the event handlers, including acquiring the state.",
+    )
+    for handler, histogram in process_metrics.event_ms.items():
+        events.add(_histogram_state(histogram), handler=handler)
+    yield events
+
+    errors = MetricFamily("event_errors", "counter", "Event handlers that raised.")
+    for handler, count in process_metrics.event_errors.items():
+        errors.add(count, handler=handler)
+    yield errors
+
+    state = MetricFamily(
+        "state_size_bytes",
+        "histogram",
+        "Size of the serialized states written to the state manager.",
+    )
+    for name, histogram in process_metrics.state_bytes.items():
+        state.add(_histogram_state(histogram), state=name)
+    yield state
+
+    logins = MetricFamily("logins", "counter", "Login attempts by method and result.")
+    for (method, result), count in process_metrics.logins.items():
+        logins.add(count, method=method, result=result)
+    yield logins
+
+    logouts = MetricFamily("logouts", "counter", "Logouts.")
+    logouts.add(process_metrics.logouts)
+    yield logouts
+
+    for name, (help_text, read) in process_metrics.gauges.items():
+        family = MetricFamily(name, "gauge", help_text)
+        try:
+            family.add(read())
+        except Exception:  # noqa: BLE001
+            logger.debug("Reading gauge %s failed", name, exc_info=True)
+            continue
+        yield family
+
+
+def collect() -> list[MetricFamily]:
+    """Current metrics of this worker."""
+    return [
+        *_process_families(),
+        *_pool_families(),
+        *_session_cache_families(),
+        *_password_hashing_families(),
+        *_oauth_token_families(),
+        *_state_manager_families(),
+        *_last_seen_families(),
+        *_reaper_families(),
+    ]
+
+
+def _dump(families: Iterable[MetricFamily]) -> dict[str, Any]:
+    return {
+        "pid": os.getpid(),
+        "families": [
+            {
+                "name": family.name,
+                "type": family.type,
+                "help": family.help,
+                "samples": [
+                    [dict(labels), value] for labels, value in family.samples.items()
+                ],
+            }
+            for family in families
+        ],
+    }
+
+
+def _load(data: dict[str, Any]) -> list[MetricFamily]:
+    families = []
+    for item in data["families"]:
+        family = MetricFamily(item["name"], item["type"], item["help"])
+        for labels, value in item["samples"]:
+            family.add(value, **labels)
+        families.append(family)
+    return families
+
+
+def multiprocess_dir(config: MetricsConfig) -> Path:
+    """Snapshot directory, by default one per server (the parent of the workers)."""
+    if config.multiprocess_dir:
+        return Path(config.multiprocess_dir)
+    return Path(tempfile.gettempdir()) / f"projectkit-metrics-{os.getppid()}"
+
+
+def write_snapshot(config: MetricsConfig) -> None:
+    directory = multiprocess_dir(config)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{os.getpid()}.json"
+    # atomic replace, the scraping worker never reads a partial file
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, prefix=f".{path.name}.", delete=False, encoding="utf-8"
+    ) as file:
+        json.dump(_dump(collect()), file)
+    Path(file.name).replace(path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(merged: dict[str, MetricFamily], family: MetricFamily, pid: int) -> None:
+    target = merged.get(family.name)
+    if target is None:
+        target = merged[family.name] = MetricFamily(
+            family.name, family.type, family.help
+        )
+
+    for labels, value in family.samples.items():
+        if family.type == "gauge":
+            target.samples[(*labels, ("pid", str(pid)))] = value
+            continue
+
+        current = target.samples.get(labels)
+        if current is None:
+            target.samples[labels] = value
+        elif family.type == "counter":
+            target.samples[labels] = current + value
+        else:
+            target.samples[labels] = {
+                "buckets": current["buckets"],
+                "counts": [
+                    a + b
+                    for a, b in zip(current["counts"], value["counts"], strict=True)
+                ],
+                "sum": current["sum"] + value["sum"],
+                "count": current["count"] + value["count"],
+            }
+
+
+def aggregate(config: MetricsConfig) -> list[MetricFamily]:
+    """Merge the live metrics of this worker with the snapshots of the others."""
+    own_pid = os.getpid()
+    merged: dict[str, MetricFamily] = {}
+    for family in collect():
+        _merge(merged, family, own_pid)
+
+    directory = multiprocess_dir(config)
+    for path in sorted(directory.glob("*.json")) if directory.is_dir() else ():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        pid = data["pid"]
+        if pid == own_pid:
+            continue
+        alive = _alive(pid)
+        for family in _load(data):
+            # gauges of exited workers are stale, their counters still count
+            if family.type != "gauge" or alive:
+                _merge(merged, family, pid)
+
+    return list(merged.values())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(labels: Iterable[tuple[str, str]]) -> str:
+    text = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels)
+    return f"{{{text}}}" if text else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(families: Iterable[MetricFamily], namespace: str) -> str:
+    """Prometheus text exposition format 0.0.4."""
+    lines = []
+    for family in families:
+        name = f"{namespace}_{family.name}"
+        if family.type == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {family.help}")
+        lines.append(f"# TYPE {name} {family.type}")
+        for labels, value in sorted(family.samples.items()):
+            if family.type != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            else:
+                cumulative = 0
+                bounds = (*value["buckets"], math.inf)
+                for bound, count in zip(bounds, value["counts"], strict=True):
+                    cumulative += count
+                    bucket_labels = (*labels, ("le", _number(bound)))
+                    lines.append(f"{name}_bucket{_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """Answer ``GET config.path`` with the metrics of all workers."""
+
+    def __init__(self, app: ASGIApp, config: MetricsConfig) -> None:
+        self.app = app
+        self.config = config
+        self.path = config.path
+        self.networks = [
+            ipaddress.ip_network(network) for network in config.allowed_networks
+        ]
+        self.authorization = (
+            f"Bearer {config.bearer_token.get_secret_value()}".encode()
+            if config.bearer_token is not None
+            else None
+        )
+
+    def _allowed(self, scope: Scope) -> bool:
+        if self.authorization is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization" and hmac.compare_digest(
+                    value, self.authorization
+                ):
+                    return True
+        client = scope.get("client")
+        if not client:
+            return False
+        try:
+            address = ipaddress.ip_address(client[0])
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        if not self._allowed(scope):
+            await send({"type": "http.response.start", "status": 403, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if scope["method"] not in {"GET", "HEAD"}:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 405,
+                    "headers": [(b"allow", b"GET, HEAD")],
+                }
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        # reads the snapshot files, keep it off the event loop
+        body = (
+            await asyncio.to_thread(
+                lambda: render(aggregate(self.config), self.config.namespace)
+            )
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", CONTENT_TYPE.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": body if scope["method"] == "GET" else b"",
+            }
+        )
+
+
+async def metrics_snapshot_task() -> None:
+    """Lifespan task writing the snapshot of this worker periodically."""
+    config = service_registry().get(MetricsConfig)
+    try:
+        while True:
+            await asyncio.sleep(config.flush_interval)
+            try:
+                await asyncio.to_thread(write_snapshot, config)
+            except OSError:
+                logger.exception("Writing the metrics snapshot failed")
+    finally:
+        # keep the counters of this worker after it exits
+        write_snapshot(config)
+
+
+def _instrument_events() -> None:
+    execute_event = BaseStateEventProcessor._execute_event  # noqa: SLF001
+    logout = LoginState.logout.fn
+
+    @wraps(execute_event)
+    async def measured_execute_event(
+        self: BaseStateEventProcessor, *, entry: Any, registered_handler: Any
+    ) -> None:
+        handler = registered_handler.handler
+        fn = handler.fn
+        started = time.perf_counter()
+        try:
+            await execute_event(
+                self, entry=entry, registered_handler=registered_handler
+            )
+        except Exception:
+            name = fn.__qualname__
+            process_metrics.event_errors[name] = (
+                process_metrics.event_errors.get(name, 0) + 1
+            )
+            raise
+        finally:
+            # background tasks run as long as they like, not an event latency
+            if not handler.is_background:
+                process_metrics.observe_event(
+                    fn.__qualname__, (time.perf_counter() - started) * 1000
+                )
+        if fn is logout:
+            process_metrics.logouts += 1
+
+    BaseStateEventProcessor._execute_event = measured_execute_event  # noqa: SLF001
+
+
+def _instrument_state() -> None:
+    serialize = BaseState._serialize  # noqa: SLF001
+
+    @wraps(serialize)
+    def measured_serialize(self: BaseState) -> bytes:
+        data = serialize(self)
+        process_metrics.observe_state(self.get_full_name(), len(data))
+        return data
+
+    BaseState._serialize = measured_serialize  # noqa: SLF001
+
+
+def _instrument_logins() -> None:
+    get_user_status = user_repository.get_user_status_by_email_and_password
+    get_or_create_user = user_repository.get_or_create_user
+
+    @wraps(get_user_status)
+    async def counted_get_user_status(*args: Any, **kwargs: Any) -> Any:
+        user, status = await get_user_status(*args, **kwargs)
+        process_metrics.count_login("password", status)
+        return user, status
+
+    @wraps(get_or_create_user)
+    async def counted_get_or_create_user(*args: Any, **kwargs: Any) -> Any:
+        try:
+            user = await get_or_create_user(*args, **kwargs)
+        except ValueError:
+            # inactive or not verified users
+            process_metrics.count_login("oauth", "rejected")
+            raise
+        process_metrics.count_login("oauth", "success")
+        return user
+
+    user_repository.get_user_status_by_email_and_password = counted_get_user_status
+    user_repository.get_or_create_user = counted_get_or_create_user
+
+
+_installed = False
+
+
+def install_metrics(config: MetricsConfig) -> None:
+    """Install the metric hooks, at most once."""
+    global _installed  # noqa: PLW0603
+    if not config.enabled or _installed:
+        return
+
+    _instrument_events()
+    _instrument_state()
+    _instrument_logins()
+    _installed = True
+    logger.info(
+        "Metrics enabled at %s, snapshots in %s", config.path, multiprocess_dir(config)
+    )
+
+
+def metrics_endpoint(asgi_app: ASGIApp, config: MetricsConfig) -> ASGIApp:
+    if not config.enabled:
+        return asgi_app
+    return MetricsEndpoint(asgi_app, config)
@@ -0,0 +1,373 @@
+"""Cached decryption, lazy loading and key rotation of the OAuth tokens.
+
+``auth_oauth_accounts.access_token`` and ``refresh_token`` are
+``StringEncryptedType(Unicode, key, FernetEngine)`` columns: the engine derives
+its Fernet key from ``database.encryption_key`` again on every row and decrypts
+both tokens of every account that is loaded, including accounts that are only
+listed or loaded as relationship of a user.
+
+:func:`install_oauth_tokens` replaces the engine of both columns with a
+:class:`RotatingFernetEngine`. It derives the keys once and keeps decrypted
+tokens in a short-lived per-process cache. The cache is keyed by the stored
+ciphertext: the column type cannot see the account id or ``updated``, but every
+write of a token produces a new Fernet token (random IV and timestamp), so the
+ciphertext identifies one version of one account's token just as well.
+
+With ``lazy_load`` the token columns are deferred for every ORM query of
+accounts and only loaded, as a column load of their own, when a token is read.
+
+Tokens are always encrypted with ``database.encryption_key``. Tokens encrypted
+with one of the ``previous_keys`` can still be decrypted (``MultiFernet``) and
+are re-encrypted with the current key in the background by
+:func:`oauth_token_rotation_task`, or once by ``python main.py
+rotate-oauth-tokens``. Rotation works in batches by id, one transaction per
+batch, locked with ``FOR UPDATE SKIP LOCKED`` so that logins updating the same
+accounts are not blocked.
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from functools import lru_cache, wraps
+from typing import Any
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import String, bindparam, column, event, select, table, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, defer
+from sqlalchemy_utils.types.encrypted.encrypted_type import (
+    EncryptionDecryptionBaseEngine,
+)
+
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.database.session import get_asyncdb_session
+from appkit_commons.registry import service_registry
+from appkit_user.authentication.backend import user_repository
+from appkit_user.authentication.backend.entities import OAuthAccountEntity
+
+from app.configuration import OAuthTokenConfig
+
+logger = logging.getLogger(__name__)
+
+TOKEN_COLUMNS = ("access_token", "refresh_token")
+# execution option of a query that needs the tokens of all loaded accounts
+LOAD_TOKENS_OPTION = "load_oauth_tokens"
+
+_accounts = table(
+    "auth_oauth_accounts",
+    column("id"),
+    column("access_token", String),
+    column("refresh_token", String),
+)
+
+
+def fernet_key(secret: str) -> bytes:
+    """The Fernet key sqlalchemy_utils' ``FernetEngine`` derives from ``secret``."""
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+
+
+class TokenCache:
+    """Bounded LRU cache of decrypted tokens keyed by their ciphertext."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, ciphertext: str) -> str | None:
+        entry = self._entries.get(ciphertext)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        plaintext, cached_at = entry
+        if time.monotonic() - cached_at >= self.ttl:
+            del self._entries[ciphertext]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(ciphertext)
+        self.hits += 1
+        return plaintext
+
+    def put(self, ciphertext: str, plaintext: str) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        self._entries[ciphertext] = (plaintext, time.monotonic())
+        self._entries.move_to_end(ciphertext)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class RotatingFernetEngine(EncryptionDecryptionBaseEngine):
+    """``FernetEngine`` with previous keys and a cache of decrypted tokens.
+
+    ``StringEncryptedType`` passes its key on every bind and result value, the
+    keys are only derived again when it changed.
+    """
+
+    def __init__(self, previous_keys: list[str], cache: TokenCache) -> None:
+        self.previous_keys = previous_keys
+        self.cache = cache
+        self._key: str | bytes | None = None
+        self.fernet: MultiFernet | None = None
+
+    def _update_key(self, key: str | bytes) -> None:
+        if key == self._key:
+            return
+        secret = key.decode() if isinstance(key, bytes) else key
+        self.fernet = MultiFernet(
+            [Fernet(fernet_key(secret))]
+            + [Fernet(fernet_key(previous)) for previous in self.previous_keys]
+        )
+        self._key = key
+        self.cache.clear()
+
+    def encrypt(self, value: Any) -> str:
+        if not isinstance(value, str):
+            value = repr(value)
+        # MultiFernet encrypts with the first, the current key
+        return self.fernet.encrypt(value.encode()).decode()
+
+    def decrypt(self, value: str) -> str:
+        plaintext = self.cache.get(value)
+        if plaintext is None:
+            plaintext = self.fernet.decrypt(value.encode()).decode()
+            self.cache.put(value, plaintext)
+        return plaintext
+
+
+@lru_cache(maxsize=1)
+def token_cache() -> TokenCache:
+    config = service_registry().get(OAuthTokenConfig)
+    return TokenCache(config.cache_max_entries, config.cache_ttl)
+
+
+def _defer_tokens(state: ORMExecuteState) -> None:
+    if (
+        not state.is_select
+        or state.is_column_load
+        or state.execution_options.get(LOAD_TOKENS_OPTION)
+    ):
+        return
+    # only whole accounts can defer columns, a select of single columns or an
+    # aggregate of them cannot take the loader options
+    if any(
+        description["entity"] is OAuthAccountEntity
+        and description["type"] is OAuthAccountEntity
+        for description in getattr(state.statement, "column_descriptions", ())
+    ):
+        state.statement = state.statement.options(
+            defer(OAuthAccountEntity.access_token),
+            defer(OAuthAccountEntity.refresh_token),
+        )
+
+
+def _install_lazy_loading() -> None:
+    update_existing_oauth_user = user_repository._update_existing_oauth_user  # noqa: SLF001
+
+    @wraps(update_existing_oauth_user)
+    async def loading_update_existing_oauth_user(
+        db: AsyncSession,
+        oauth_account: OAuthAccountEntity,
+        user_info: dict,
+        token: dict,
+    ) -> Any:
+        # appkit_user reads the current tokens, e.g. as default of
+        # token.get(), a lazy load would need a greenlet
+        await db.refresh(oauth_account, attribute_names=list(TOKEN_COLUMNS))
+        return await update_existing_oauth_user(db, oauth_account, user_info, token)
+
+    event.listen(Session, "do_orm_execute", _defer_tokens)
+    user_repository._update_existing_oauth_user = loading_update_existing_oauth_user  # noqa: SLF001
+
+
+def install_oauth_tokens() -> None:
+    """Use the caching, rotating engine for the token columns of OAuth accounts."""
+    config = service_registry().get(OAuthTokenConfig)
+    columns = [OAuthAccountEntity.__table__.c[name] for name in TOKEN_COLUMNS]
+    if isinstance(columns[0].type.engine, RotatingFernetEngine):
+        return
+
+    engine = RotatingFernetEngine(
+        [key.get_secret_value() for key in config.previous_keys], token_cache()
+    )
+    for token_column in columns:
+        token_column.type.engine = engine
+
+    if config.lazy_load:
+        _install_lazy_loading()
+    logger.info(
+        "OAuth tokens cached for %ds, %d previous keys, lazy loading %s",
+        config.cache_ttl,
+        len(config.previous_keys),
+        "on" if config.lazy_load else "off",
+    )
+
+
+@dataclass
+class RotationRun:
+    """Result of a single rotation run."""
+
+    scanned: int = 0
+    rotated: int = 0
+    failed: int = 0
+    duration_ms: float = 0.0
+
+
+@dataclass
+class RotationStats:
+    """Cumulative rotation metrics of this process."""
+
+    runs: int = 0
+    failed_runs: int = 0
+    rotated: int = 0
+    failed: int = 0
+    last_run: RotationRun | None = None
+    last_run_at: datetime | None = None
+
+    def record(self, run: RotationRun) -> None:
+        self.runs += 1
+        self.rotated += run.rotated
+        self.failed += run.failed
+        self.last_run = run
+        self.last_run_at = datetime.now(UTC)
+
+
+rotation_stats = RotationStats()
+
+
+def _rotated(
+    token: str | None, current: Fernet, fernet: MultiFernet, run: RotationRun
+) -> str | None:
+    """``token`` encrypted with the current key, None if it already is."""
+    if not token:
+        return None
+    try:
+        current.decrypt(token.encode())
+    except InvalidToken:
+        pass
+    else:
+        return None
+
+    try:
+        return fernet.rotate(token.encode()).decode()
+    except InvalidToken:
+        run.failed += 1
+        return None
+
+
+async def _rotate_batch(
+    db: AsyncSession,
+    after_id: int,
+    batch_size: int,
+    current: Fernet,
+    fernet: MultiFernet,
+    run: RotationRun,
+) -> int | None:
+    """Rotate the next batch of accounts, return the last id or None at the end."""
+    result = await db.execute(
+        select(_accounts.c.id, _accounts.c.access_token, _accounts.c.refresh_token)
+        .where(_accounts.c.id > after_id)
+        .order_by(_accounts.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+
+    changes = []
+    for account_id, access_token, refresh_token in rows:
+        new_access = _rotated(access_token, current, fernet, run)
+        new_refresh = _rotated(refresh_token, current, fernet, run)
+        if new_access or new_refresh:
+            changes.append(
+                {
+                    "account_id": account_id,
+                    "new_access": new_access or access_token,
+                    "new_refresh": new_refresh or refresh_token,
+                }
+            )
+
+    if changes:
+        connection = await db.connection()
+        await connection.execute(
+            update(_accounts)
+            .where(_accounts.c.id == bindparam("account_id"))
+            .values(
+                access_token=bindparam("new_access"),
+                refresh_token=bindparam("new_refresh"),
+            ),
+            changes,
+        )
+    run.scanned += len(rows)
+    run.rotated += len(changes)
+    return rows[-1].id
+
+
+async def rotate_oauth_tokens(config: OAuthTokenConfig | None = None) -> RotationRun:
+    """Re-encrypt all tokens of a previous key with ``database.encryption_key``."""
+    config = config or service_registry().get(OAuthTokenConfig)
+    secret = service_registry().get(DatabaseConfig).encryption_key.get_secret_value()
+    current = Fernet(fernet_key(secret))
+    fernet = MultiFernet(
+        [current]
+        + [Fernet(fernet_key(key.get_secret_value())) for key in config.previous_keys]
+    )
+
+    run = RotationRun()
+    started = time.perf_counter()
+    after_id: int | None = 0
+    while after_id is not None:
+        async with get_asyncdb_session() as db:
+            after_id = await _rotate_batch(
+                db, after_id, config.rotation_batch_size, current, fernet, run
+            )
+        if after_id is not None and config.rotation_pause:
+            await asyncio.sleep(config.rotation_pause)
+
+    run.duration_ms = (time.perf_counter() - started) * 1000
+    rotation_stats.record(run)
+    logger.info(
+        "Rotated the tokens of %d of %d oauth accounts in %.1f ms",
+        run.rotated,
+        run.scanned,
+        run.duration_ms,
+    )
+    if run.failed:
+        logger.warning(
+            "%d oauth tokens could not be decrypted with any configured key",
+            run.failed,
+        )
+    return run
+
+
+async def oauth_token_rotation_task() -> None:
+    """Lifespan task re-encrypting the tokens of previous keys periodically."""
+    config = service_registry().get(OAuthTokenConfig)
+    if not config.rotate or not config.previous_keys:
+        return
+
+    while True:
+        try:
+            await rotate_oauth_tokens(config)
+        except Exception:
+            rotation_stats.failed_runs += 1
+            logger.exception("OAuth token rotation failed")
+        await asyncio.sleep(config.rotation_interval)
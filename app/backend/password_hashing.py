@@ -0,0 +1,244 @@
+"""Password hashing and verification in a bounded process pool.
+
+appkit_user hashes and checks passwords inline: ``UserEntity.password`` hashes in
+its setter, ``UserEntity.check_password`` verifies. With ``scrypt:32768:8:1``
+each call costs 32 MB and tens of milliseconds of CPU, during which the event
+loop of the worker, and with it every websocket, is blocked.
+
+:func:`install_password_hashing` routes the login, the password change of the
+profile page and the user creation/update of the admin page through
+:class:`PasswordHasher` instead. Its process pool runs at most ``workers``
+hashes at a time; at most ``max_pending`` hashes are running or queued per
+worker. Callers beyond that wait up to ``queue_timeout`` for a slot and then
+fail with :class:`PasswordHashingBusyError`, so a burst of logins is slowed
+down instead of queueing without bound.
+
+Hashes are created with the configured ``method``. On a successful login a
+hash of another method (or other parameters) is replaced by a new one, which
+is committed together with the new login session.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appkit_commons.registry import service_registry
+from appkit_commons.security import check_password_hash, generate_password_hash
+from appkit_user.authentication.backend import user_repository
+from appkit_user.authentication.backend.entities import UserEntity
+from appkit_user.authentication.backend.models import UserCreate
+
+from app.backend.metrics import Histogram
+from app.configuration import PasswordHashingConfig
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHash(str):
+    """A password that is already hashed, stored as is by ``UserEntity``."""
+
+    __slots__ = ()
+
+
+class PasswordHashingBusyError(RuntimeError):
+    pass
+
+
+@dataclass
+class HashingStats:
+    hashed: int = 0
+    verified: int = 0
+    rehashed: int = 0
+    rejected: int = 0
+    duration_ms: Histogram = field(default_factory=Histogram)
+
+
+class PasswordHasher:
+    """Runs ``generate_password_hash``/``check_password_hash`` in processes."""
+
+    def __init__(self, config: PasswordHashingConfig) -> None:
+        self.config = config
+        self.stats = HashingStats()
+        self.pending = 0
+        self._slots = asyncio.Semaphore(config.max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # not forked, the children must not share the database connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return self._executor
+
+    async def _run(self, fn: Any, *args: Any) -> Any:
+        try:
+            async with asyncio.timeout(self.config.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.stats.rejected += 1
+            msg = "Too many password checks in progress, please try again"
+            raise PasswordHashingBusyError(msg) from None
+
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self._slots.release()
+            self.stats.duration_ms.observe((time.perf_counter() - started) * 1000)
+
+    async def hash(self, password: str) -> PasswordHash:
+        pwhash = await self._run(
+            generate_password_hash,
+            password,
+            self.config.method,
+            self.config.salt_length,
+        )
+        self.stats.hashed += 1
+        return PasswordHash(pwhash)
+
+    async def verify(self, pwhash: str | None, password: str) -> bool:
+        if not pwhash or not password:
+            return False
+        self.stats.verified += 1
+        return await self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != self.config.method
+
+
+@lru_cache(maxsize=1)
+def password_hasher() -> PasswordHasher:
+    return PasswordHasher(service_registry().get(PasswordHashingConfig))
+
+
+async def _check_login(user: UserEntity | None, password: str) -> bool:
+    hasher = password_hasher()
+    if user is None or not await hasher.verify(user._password, password):  # noqa: SLF001
+        return False
+
+    if (
+        hasher.config.rehash_on_login
+        and user.is_active
+        and hasher.needs_rehash(user._password)  # noqa: SLF001
+    ):
+        # flushed and committed by the caller with the login session
+        user.password = await hasher.hash(password)
+        hasher.stats.rehashed += 1
+        logger.info("Rehashed the password of user %s", user.id)
+    return True
+
+
+async def get_user_status_by_email_and_password(
+    db: AsyncSession, email: str, password: str
+) -> tuple[UserEntity | None, str]:
+    """``user_repository.get_user_status_by_email_and_password`` off the loop."""
+    result = await db.execute(select(UserEntity).where(UserEntity.email == email))
+    user = result.scalars().first()
+
+    if not await _check_login(user, password):
+        return None, "invalid_credentials"
+    if not user.is_active:
+        return None, "inactive"
+    if not user.is_verified:
+        return None, "not_verified"
+    return user, "success"
+
+
+async def get_by_email_and_password(
+    db: AsyncSession, email: str, password: str
+) -> UserEntity | None:
+    """``user_repository.get_by_email_and_password`` off the loop."""
+    result = await db.execute(
+        select(UserEntity).where(
+            UserEntity.email == email,
+            UserEntity.is_active.is_(True),
+            UserEntity.is_verified.is_(True),
+        )
+    )
+    user = result.scalars().first()
+    return user if await _check_login(user, password) else None
+
+
+async def update_password(
+    db: AsyncSession, user_id: int, new_password: str, old_password: str
+) -> UserEntity | None:
+    """``user_repository.update_password`` off the loop."""
+    hasher = password_hasher()
+    user = await user_repository.get_by_user_id(db, user_id)
+    if not user:
+        return None
+
+    if not await hasher.verify(user._password, old_password):  # noqa: SLF001
+        msg = "Old password is incorrect"
+        raise ValueError(msg)
+
+    user.password = await hasher.hash(new_password)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+def install_password_hashing() -> None:
+    """Route appkit_user's password hashing through the process pool."""
+    config = service_registry().get(PasswordHashingConfig)
+    if not config.enabled:
+        logger.info("Password hashing offload is disabled")
+        return
+
+    if user_repository.update_password is update_password:
+        return
+
+    password_property = UserEntity.password
+
+    def set_password(entity: UserEntity, password: str) -> None:
+        if not isinstance(password, PasswordHash):
+            # a caller that was not routed through the pool
+            password = generate_password_hash(
+                password, config.method, config.salt_length
+            )
+        entity._password = str(password)  # noqa: SLF001
+
+    create_user = user_repository.create_user
+    update_user = user_repository.update_user
+
+    @wraps(create_user)
+    async def hashing_create_user(db: AsyncSession, user: UserCreate) -> UserEntity:
+        hashed = await password_hasher().hash(user.password)
+        return await create_user(db, user.model_copy(update={"password": hashed}))
+
+    @wraps(update_user)
+    async def hashing_update_user(
+        db: AsyncSession, user: UserCreate
+    ) -> UserEntity | None:
+        if user.password:
+            hashed = await password_hasher().hash(user.password)
+            user = user.model_copy(update={"password": hashed})
+        return await update_user(db, user)
+
+    UserEntity.password = password_property.setter(set_password)
+    user_repository.get_user_status_by_email_and_password = (
+        get_user_status_by_email_and_password
+    )
+    user_repository.get_by_email_and_password = get_by_email_and_password
+    user_repository.update_password = update_password
+    user_repository.create_user = hashing_create_user
+    user_repository.update_user = hashing_update_user
+    logger.info(
+        "Password hashing offloaded to %d processes, method %s",
+        config.workers,
+        config.method,
+    )
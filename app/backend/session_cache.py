@@ -0,0 +1,226 @@
+"""In-process TTL/LRU cache for validated user sessions.
+
+``UserSession.authenticated_user`` from appkit_user looks up the session and its
+user in Postgres and extends the session expiry every time it is recomputed.
+With the cache installed, a validated session is served from memory until the
+cache TTL elapses. The TTL is capped by ``authentication.auth_token_refresh_delta``,
+which is well below ``session_timeout``, so the expiry in the database is still
+extended in time by the next cache miss.
+
+Entries are invalidated explicitly when a session is deleted (logout) and when a
+user is updated or deleted by an administrator. Invalidations are published on
+the invalidation bus so that the caches of all workers are kept in sync.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache, wraps
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appkit_commons.registry import service_registry
+from appkit_user.authentication.backend import (
+    user_repository,
+    user_session_repository,
+)
+from appkit_user.authentication.backend.entities import UserEntity, UserSessionEntity
+from appkit_user.authentication.backend.models import UserCreate
+from appkit_user.configuration import AuthenticationConfiguration
+
+from app.backend.invalidation import (
+    InvalidationEvent,
+    InvalidationKind,
+    invalidation_bus,
+)
+from app.configuration import SessionCacheConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CachedSession:
+    user_id: int
+    session_id: str
+    expires_at: datetime
+    user: dict[str, Any]
+    cached_at: float
+
+
+class SessionCache:
+    """Bounded LRU cache of validated sessions keyed by ``session_id``."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CachedSession] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, session_id: str) -> CachedSession | None:
+        entry = self._entries.get(session_id)
+        if entry is None or entry.user_id != user_id:
+            self.misses += 1
+            return None
+
+        if time.monotonic() - entry.cached_at >= self.ttl:
+            del self._entries[session_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return entry
+
+    def put(self, session: UserSessionEntity, expires_at: datetime) -> None:
+        self._entries[session.session_id] = CachedSession(
+            user_id=session.user_id,
+            session_id=session.session_id,
+            expires_at=expires_at,
+            user=session.user.to_dict(),
+            cached_at=time.monotonic(),
+        )
+        self._entries.move_to_end(session.session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, session_id: str) -> None:
+        if self._entries.pop(session_id, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        for session_id in [
+            key for key, entry in self._entries.items() if entry.user_id == user_id
+        ]:
+            self.invalidate(session_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache(maxsize=1)
+def session_cache() -> SessionCache:
+    config = service_registry().get(SessionCacheConfig)
+    auth_config = service_registry().get(AuthenticationConfiguration)
+    ttl = min(config.ttl, auth_config.auth_token_refresh_delta * 60)
+    logger.debug("Creating session cache with ttl=%ss", ttl)
+    return SessionCache(max_entries=config.max_entries, ttl=ttl)
+
+
+class _CachedUser:
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._data = data
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**self._data, "roles": list(self._data["roles"])}
+
+
+class _CachedUserSession:
+    """Stand-in for a ``UserSessionEntity`` served from the cache.
+
+    Provides the attributes ``UserSession.authenticated_user`` reads, setting
+    ``expires_at`` on it does not write to the database.
+    """
+
+    def __init__(self, entry: CachedSession) -> None:
+        self.user_id = entry.user_id
+        self.session_id = entry.session_id
+        self.expires_at = entry.expires_at
+        self.user = _CachedUser(entry.user)
+
+    def is_expired(self) -> bool:
+        return datetime.now(UTC) >= self.expires_at
+
+
+def install_session_cache() -> None:
+    """Route appkit_user's session and user repository calls through the cache."""
+    if not service_registry().get(SessionCacheConfig).enabled:
+        logger.info("Session cache is disabled")
+        return
+
+    if getattr(user_session_repository.get_user_session, "__cached__", False):
+        return
+
+    auth_config = service_registry().get(AuthenticationConfiguration)
+    session_timeout = timedelta(minutes=auth_config.session_timeout)
+
+    get_user_session = user_session_repository.get_user_session
+    delete_user_session = user_session_repository.delete_user_session
+    update_user = user_repository.update_user
+    delete_user = user_repository.delete_user
+
+    @wraps(get_user_session)
+    async def cached_get_user_session(
+        db: AsyncSession, user_id: int, session_id: str
+    ) -> UserSessionEntity | _CachedUserSession | None:
+        entry = session_cache().get(user_id, session_id)
+        if entry is not None:
+            return _CachedUserSession(entry)
+
+        session = await get_user_session(db, user_id, session_id)
+        if session is not None and not session.is_expired():
+            # the caller extends the session in the same transaction
+            session_cache().put(session, datetime.now(UTC) + session_timeout)
+        return session
+
+    @wraps(delete_user_session)
+    async def invalidating_delete_user_session(
+        db: AsyncSession, user_id: int, session_id: str
+    ) -> None:
+        await delete_user_session(db, user_id, session_id)
+        await invalidation_bus().publish(InvalidationKind.SESSION, session_id)
+
+    @wraps(update_user)
+    async def invalidating_update_user(
+        db: AsyncSession, user: UserCreate
+    ) -> UserEntity | None:
+        result = await update_user(db, user)
+        await invalidation_bus().publish(InvalidationKind.USER, user.user_id)
+        return result
+
+    @wraps(delete_user)
+    async def invalidating_delete_user(db: AsyncSession, user_id: int) -> bool:
+        result = await delete_user(db, user_id)
+        await invalidation_bus().publish(InvalidationKind.USER, user_id)
+        return result
+
+    def on_session_event(event: InvalidationEvent) -> None:
+        session_cache().invalidate(event.key)
+
+    def on_user_event(event: InvalidationEvent) -> None:
+        session_cache().invalidate_user(int(event.key))
+
+    def on_flush(_event: InvalidationEvent) -> None:
+        session_cache().clear()
+
+    bus = invalidation_bus()
+    bus.subscribe(InvalidationKind.SESSION, on_session_event)
+    bus.subscribe(InvalidationKind.USER, on_user_event)
+    bus.subscribe(InvalidationKind.FLUSH, on_flush)
+
+    cached_get_user_session.__cached__ = True
+    user_session_repository.get_user_session = cached_get_user_session
+    user_session_repository.delete_user_session = invalidating_delete_user_session
+    user_repository.update_user = invalidating_update_user
+    user_repository.delete_user = invalidating_delete_user
+    logger.info("Session cache installed")
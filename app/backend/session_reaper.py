@@ -0,0 +1,133 @@
+"""Purges expired rows from ``auth_sessions`` and ``auth_oauth_states``.
+
+Rows are deleted in bounded batches, one transaction per batch. The batch is
+selected with ``FOR UPDATE SKIP LOCKED`` so that several workers (or the CLI and a
+worker) can reap concurrently without blocking each other or a login that is
+refreshing one of the rows.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appkit_commons.database.session import get_asyncdb_session
+from appkit_commons.registry import service_registry
+from appkit_user.authentication.backend.entities import (
+    OAuthStateEntity,
+    UserSessionEntity,
+)
+
+from app.configuration import SessionReaperConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReaperRun:
+    """Result of a single reaper run."""
+
+    sessions_purged: int = 0
+    oauth_states_purged: int = 0
+    duration_ms: float = 0.0
+
+
+@dataclass
+class ReaperStats:
+    """Cumulative reaper metrics of this process."""
+
+    runs: int = 0
+    failed_runs: int = 0
+    sessions_purged: int = 0
+    oauth_states_purged: int = 0
+    last_run: ReaperRun | None = None
+    last_run_at: datetime | None = None
+
+    def record(self, run: ReaperRun) -> None:
+        self.runs += 1
+        self.sessions_purged += run.sessions_purged
+        self.oauth_states_purged += run.oauth_states_purged
+        self.last_run = run
+        self.last_run_at = datetime.now(UTC)
+
+
+reaper_stats = ReaperStats()
+
+
+async def _purge_batch(
+    db: AsyncSession,
+    entity: type[UserSessionEntity] | type[OAuthStateEntity],
+    now: datetime,
+    batch_size: int,
+) -> int:
+    expired = (
+        select(entity.id)
+        .where(entity.expires_at < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(delete(entity).where(entity.id.in_(expired)))
+    return result.rowcount or 0
+
+
+async def purge_expired(
+    entity: type[UserSessionEntity] | type[OAuthStateEntity],
+    batch_size: int,
+    max_batches: int,
+) -> int:
+    """Delete expired rows of ``entity`` in batches, return the number of rows."""
+    now = datetime.now(UTC)
+    purged = 0
+    for _ in range(max_batches):
+        async with get_asyncdb_session() as db:
+            deleted = await _purge_batch(db, entity, now, batch_size)
+        purged += deleted
+        if deleted < batch_size:
+            break
+    return purged
+
+
+async def reap(config: SessionReaperConfig | None = None) -> ReaperRun:
+    """Run the reaper once for sessions and OAuth states."""
+    config = config or service_registry().get(SessionReaperConfig)
+    started = time.perf_counter()
+
+    run = ReaperRun(
+        sessions_purged=await purge_expired(
+            UserSessionEntity, config.batch_size, config.max_batches
+        ),
+        oauth_states_purged=await purge_expired(
+            OAuthStateEntity, config.batch_size, config.max_batches
+        ),
+    )
+    run.duration_ms = (time.perf_counter() - started) * 1000
+    reaper_stats.record(run)
+
+    logger.info(
+        "Reaper purged %d expired sessions and %d expired oauth states in %.1f ms",
+        run.sessions_purged,
+        run.oauth_states_purged,
+        run.duration_ms,
+    )
+    return run
+
+
+async def session_reaper_task() -> None:
+    """Lifespan task running the reaper periodically inside the backend."""
+    config = service_registry().get(SessionReaperConfig)
+    if not config.enabled:
+        logger.info("Session reaper is disabled")
+        return
+
+    while True:
+        try:
+            await reap(config)
+        except Exception:
+            reaper_stats.failed_runs += 1
+            logger.exception("Session reaper run failed")
+        await asyncio.sleep(config.interval)
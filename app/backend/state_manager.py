@@ -0,0 +1,495 @@
+"""Reflex state manager keeping the client states in Postgres.
+
+With several workers Reflex needs a state manager shared by all of them, out of
+the box that is Redis. :class:`StateManagerPostgres` stores the states in the
+``UNLOGGED`` table ``reflex_states`` of the application database instead, one
+row per client and state class, pickled like Reflex does for Redis and
+compressed with zlib from ``compress_min_size`` on. States expire after
+``authentication.session_timeout``; :func:`state_manager_task` deletes the
+expired rows. An unlogged table is not crash safe, after a crash of the
+database the clients start with fresh states, like after a Redis restart.
+
+While an event of a client is processed, the worker holds the session-level
+advisory lock ``(LOCK_NAMESPACE, hashtext(client token))``. All locks of a
+worker are taken with ``pg_try_advisory_lock`` on one connection of their own,
+other workers retry for up to ``lock_timeout``. A connection of the pool is
+only used to load and to write a state, not while the lock is held. After the
+event the worker keeps the lock and the state in memory for
+``write_back_delay``: further events of the client in that time (typing, a
+hydrate followed by on_load events) are applied to the in-memory state and
+written together. A busy client is written at the latest after ``max_hold``.
+If the lock connection is lost, so are the locks: states held at that time are
+not written, the next event of the client loads the last written state.
+
+The state manager is only used with several backend workers, see
+:mod:`app.backend.workers` for how they are started.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import time
+import zlib
+from collections.abc import AsyncIterator
+from datetime import timedelta
+from functools import lru_cache
+from typing import Any, Final, Unpack
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+from reflex.istate.manager import StateManager, StateModificationContext
+from reflex.istate.manager.token import TOKEN_TYPE, BaseStateToken, StateToken
+from reflex.state import BaseState
+from reflex.utils.prerequisites import parse_redis_url
+from reflex_base.utils.exceptions import LockExpiredError, StateSchemaMismatchError
+
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.registry import service_registry
+from appkit_user.configuration import AuthenticationConfiguration
+
+from app.backend.invalidation import _conninfo
+from app.backend.metrics import Histogram
+from app.backend.workers import backend_workers
+from app.configuration import StateManagerConfig
+
+logger = logging.getLogger(__name__)
+
+TABLE: Final = "reflex_states"
+# first key of the two-key advisory locks of the client states
+LOCK_NAMESPACE: Final = 0x5246
+# seconds between two attempts to lock a state locked by another worker
+LOCK_RETRY_MIN: Final = 0.005
+LOCK_RETRY_MAX: Final = 0.1
+
+_RAW: Final = b"p"
+_ZLIB: Final = b"z"
+
+_TRY_LOCK = "SELECT pg_try_advisory_lock(%s, hashtext(%s))"
+_UNLOCK = "SELECT pg_advisory_unlock(%s, hashtext(%s))"
+_SELECT_TREE = f"""
+SELECT name, data FROM {TABLE} WHERE ident = %s AND expires_at > now()
+"""  # noqa: S608
+_SELECT_ONE = f"""
+SELECT data FROM {TABLE} WHERE ident = %s AND name = %s AND expires_at > now()
+"""  # noqa: S608
+_UPSERT = f"""
+INSERT INTO {TABLE} (ident, name, data, expires_at)
+VALUES (%s, %s, %s, now() + %s * interval '1 second')
+ON CONFLICT (ident, name)
+DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+"""  # noqa: S608
+# the untouched states of an active client, refreshed when half expired
+_EXTEND = f"""
+UPDATE {TABLE} SET expires_at = now() + %s * interval '1 second'
+WHERE ident = %s AND expires_at < now() + %s * interval '1 second'
+"""  # noqa: S608
+_PURGE = f"""
+DELETE FROM {TABLE} WHERE ctid IN (
+    SELECT ctid FROM {TABLE} WHERE expires_at < now()
+    LIMIT %s FOR UPDATE SKIP LOCKED
+)
+"""  # noqa: S608
+
+
+def encode(data: bytes, min_size: int, level: int) -> bytes:
+    if len(data) >= min_size:
+        return _ZLIB + zlib.compress(data, level)
+    return _RAW + data
+
+
+def decode(blob: bytes) -> bytes:
+    if blob[:1] == _ZLIB:
+        return zlib.decompress(blob[1:])
+    return blob[1:]
+
+
+def _lock_name(token: StateToken) -> str:
+    # the tree of a client is locked as a whole, other tokens each on their own
+    return token.ident if isinstance(token, BaseStateToken) else str(token)
+
+
+@dataclasses.dataclass
+class StateManagerStats:
+    events: int = 0
+    coalesced: int = 0  # events applied to a state still held in memory
+    flushes: int = 0
+    rows_written: int = 0
+    bytes_written: int = 0
+    lock_timeouts: int = 0
+    lost_locks: int = 0  # states not written, the lock connection was lost
+    purged: int = 0
+    lock_wait_ms: Histogram = dataclasses.field(default_factory=Histogram)
+
+
+@dataclasses.dataclass(eq=False)
+class _Lease:
+    """A client locked by this worker, with the state of its last events."""
+
+    token: StateToken
+    state: Any
+    # the connection holding the advisory lock
+    lock_connection: psycopg.AsyncConnection
+    acquired_at: float
+    flush: asyncio.TimerHandle | None = None
+
+
+@dataclasses.dataclass
+class StateManagerPostgres(StateManager):
+    """A state manager that stores states in an unlogged Postgres table."""
+
+    pool: AsyncConnectionPool
+    config: StateManagerConfig
+    # seconds until the state of an inactive client expires
+    token_expiration: int
+
+    stats: StateManagerStats = dataclasses.field(default_factory=StateManagerStats)
+    _locks: dict[str, asyncio.Lock] = dataclasses.field(default_factory=dict)
+    _leases: dict[str, _Lease] = dataclasses.field(default_factory=dict)
+    _flush_tasks: set[asyncio.Task] = dataclasses.field(default_factory=set)
+    _lock_connection: psycopg.AsyncConnection | None = None
+    _connect_lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock)
+    _opened: bool = False
+
+    async def _open(self) -> AsyncConnectionPool:
+        if not self._opened:
+            self._opened = True
+            await self.pool.open()
+        return self.pool
+
+    async def _locking_connection(self) -> psycopg.AsyncConnection:
+        """The connection holding the advisory locks of this worker."""
+        async with self._connect_lock:
+            if self._lock_connection is None or self._lock_connection.closed:
+                self._lock_connection = await psycopg.AsyncConnection.connect(
+                    self.pool.conninfo, autocommit=True
+                )
+            return self._lock_connection
+
+    async def _try_lock(
+        self, connection: psycopg.AsyncConnection, token: StateToken
+    ) -> bool:
+        try:
+            cursor = await connection.execute(
+                _TRY_LOCK, (LOCK_NAMESPACE, _lock_name(token))
+            )
+            return (await cursor.fetchone())[0]
+        except BaseException:
+            # the lock may have been granted before the query was interrupted
+            await asyncio.shield(self._unlock(connection, token))
+            raise
+
+    async def _lock(self, token: StateToken) -> psycopg.AsyncConnection:
+        """Take the advisory lock of ``token``, return the connection holding it."""
+        started = time.perf_counter()
+        deadline = started + self.config.lock_timeout / 1000
+        delay = LOCK_RETRY_MIN
+        while True:
+            connection = await self._locking_connection()
+            if await self._try_lock(connection, token):
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stats.lock_timeouts += 1
+                msg = (
+                    f"The state of {token} was locked by another worker for more "
+                    f"than {self.config.lock_timeout} ms"
+                )
+                raise LockExpiredError(msg)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, LOCK_RETRY_MAX)
+        self.stats.lock_wait_ms.observe((time.perf_counter() - started) * 1000)
+        return connection
+
+    async def _unlock(
+        self, connection: psycopg.AsyncConnection, token: StateToken
+    ) -> None:
+        if connection.closed:
+            # the locks of a session end with it
+            return
+        try:
+            await connection.execute(_UNLOCK, (LOCK_NAMESPACE, _lock_name(token)))
+        except (psycopg.Error, OSError):
+            logger.exception("Releasing the lock of %s failed", token)
+            # rather release all locks of this worker than keep this one forever
+            await connection.close()
+
+    def _restore(self, fresh: BaseState, stored: dict[str, bytes]) -> BaseState:
+        """``fresh`` or its stored version, with the restored substates."""
+        state = fresh
+        if (blob := stored.get(fresh.get_full_name())) is not None:
+            with contextlib.suppress(StateSchemaMismatchError):
+                state = BaseState._deserialize(data=decode(blob))  # noqa: SLF001
+
+        substates = fresh.substates
+        state.substates = {}
+        for name, fresh_substate in substates.items():
+            substate = self._restore(fresh_substate, stored)
+            substate.parent_state = state
+            state.substates[name] = substate
+        return state
+
+    async def _load(self, token: StateToken[TOKEN_TYPE]) -> TOKEN_TYPE:
+        pool = await self._open()
+        async with pool.connection() as connection:
+            if not isinstance(token, BaseStateToken):
+                cursor = await connection.execute(
+                    _SELECT_ONE, (token.ident, str(token))
+                )
+                row = await cursor.fetchone()
+                return token.deserialize(data=decode(row[0])) if row else token.cls()
+
+            cursor = await connection.execute(_SELECT_TREE, (token.ident,))
+            stored = dict(await cursor.fetchall())
+        root_cls = token.cls.get_root_state()
+        return self._restore(root_cls(_reflex_internal_init=True), stored)
+
+    def _writes(self, token: StateToken, state: Any) -> list[tuple[str, bytes]]:
+        """Names and encoded payloads of the states touched since the last write."""
+        if not isinstance(token, BaseStateToken):
+            payload = token.serialize(state)
+            return [(str(token), payload)] if payload else []
+
+        writes = []
+        stack = [state]
+        while stack:
+            substate = stack.pop()
+            if token.get_and_reset_touched_state(substate) and (
+                payload := substate._serialize()  # noqa: SLF001
+            ):
+                writes.append((substate.get_full_name(), payload))
+            stack.extend(substate.substates.values())
+        return writes
+
+    async def _write(self, token: StateToken, state: Any) -> None:
+        rows = [
+            (
+                token.ident,
+                name,
+                encode(
+                    payload,
+                    self.config.compress_min_size,
+                    self.config.compression_level,
+                ),
+                self.token_expiration,
+            )
+            for name, payload in self._writes(token, state)
+        ]
+        pool = await self._open()
+        async with pool.connection() as connection:
+            if rows:
+                async with connection.cursor() as cursor:
+                    await cursor.executemany(_UPSERT, rows)
+            await connection.execute(
+                _EXTEND,
+                (self.token_expiration, token.ident, self.token_expiration // 2),
+            )
+        self.stats.flushes += 1
+        self.stats.rows_written += len(rows)
+        self.stats.bytes_written += sum(len(row[2]) for row in rows)
+
+    async def _flush(self, lease: _Lease) -> None:
+        """Write the state of a lease and release its lock."""
+        if lease.flush is not None:
+            lease.flush.cancel()
+        self._leases.pop(_lock_name(lease.token), None)
+        try:
+            if lease.lock_connection.closed:
+                # another worker may have changed the state since
+                self.stats.lost_locks += 1
+                msg = f"The lock of {lease.token} was lost, its state is not written"
+                raise LockExpiredError(msg)
+            await self._write(lease.token, lease.state)
+        finally:
+            await self._unlock(lease.lock_connection, lease.token)
+
+    async def _flush_later(self, name: str) -> None:
+        async with self._locks[name]:
+            lease = self._leases.get(name)
+            if lease is None:
+                return
+            try:
+                await self._flush(lease)
+            except Exception:
+                logger.exception("Writing the state of %s failed", lease.token)
+
+    def _schedule_flush(self, name: str) -> None:
+        task = asyncio.create_task(self._flush_later(name))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def get_state(self, token: StateToken[TOKEN_TYPE] | str) -> TOKEN_TYPE:
+        """The state of a token, as held by this worker or as last written."""
+        token = self._coerce_token(token)
+        if (lease := self._leases.get(_lock_name(token))) is not None:
+            return lease.state
+        return await self._load(token)
+
+    async def set_state(
+        self,
+        token: StateToken[TOKEN_TYPE] | str,
+        state: TOKEN_TYPE,
+        **context: Unpack[StateModificationContext],  # noqa: ARG002
+    ) -> None:
+        """Replace the state of a token, written with the lease if there is one."""
+        token = self._coerce_token(token)
+        name = _lock_name(token)
+        lease = self._leases.get(name)
+        if lease is not None and lease.state is state:
+            return
+        if isinstance(state, BaseState):
+            # not loaded by this manager, persist the whole tree
+            stack = [state]
+            while stack:
+                substate = stack.pop()
+                substate._was_touched = True  # noqa: SLF001
+                stack.extend(substate.substates.values())
+
+        if lease is not None:
+            lease.state = state
+            return
+
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            if (lease := self._leases.get(name)) is not None:
+                lease.state = state
+                return
+            connection = await self._lock(token)
+            try:
+                await self._write(token, state)
+            finally:
+                await self._unlock(connection, token)
+
+    @contextlib.asynccontextmanager
+    async def modify_state(
+        self,
+        token: StateToken[TOKEN_TYPE] | str,
+        **context: Unpack[StateModificationContext],  # noqa: ARG002
+    ) -> AsyncIterator[TOKEN_TYPE]:
+        """Modify the state of a token while holding its lock."""
+        token = self._coerce_token(token)
+        name = _lock_name(token)
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            self.stats.events += 1
+            lease = self._leases.get(name)
+            if lease is not None:
+                self.stats.coalesced += 1
+                if lease.flush is not None:
+                    lease.flush.cancel()
+                    lease.flush = None
+            else:
+                connection = await self._lock(token)
+                try:
+                    state = await self._load(token)
+                except BaseException:
+                    await self._unlock(connection, token)
+                    raise
+                lease = _Lease(token, state, connection, time.monotonic())
+                self._leases[name] = lease
+
+            try:
+                yield lease.state
+            finally:
+                held = time.monotonic() - lease.acquired_at
+                if (
+                    self.config.write_back_delay <= 0
+                    or held >= self.config.max_hold
+                    or not isinstance(token, BaseStateToken)
+                ):
+                    await self._flush(lease)
+                else:
+                    lease.flush = asyncio.get_running_loop().call_later(
+                        min(self.config.write_back_delay, self.config.max_hold - held),
+                        self._schedule_flush,
+                        name,
+                    )
+
+    async def purge(self) -> int:
+        """Delete expired states, return the number of rows."""
+        purged = 0
+        pool = await self._open()
+        async with pool.connection() as connection:
+            while True:
+                cursor = await connection.execute(
+                    _PURGE, (self.config.purge_batch_size,)
+                )
+                await connection.commit()
+                purged += cursor.rowcount
+                if cursor.rowcount < self.config.purge_batch_size:
+                    break
+
+        for name, lock in list(self._locks.items()):
+            if not lock.locked() and name not in self._leases:
+                del self._locks[name]
+        self.stats.purged += purged
+        return purged
+
+    async def close(self) -> None:
+        """Write the states still held, release the locks and close the pool."""
+        for lease in list(self._leases.values()):
+            try:
+                await self._flush(lease)
+            except Exception:
+                logger.exception("Writing the state of %s failed", lease.token)
+        if self._lock_connection is not None:
+            await self._lock_connection.close()
+        if self._opened:
+            await self.pool.close()
+
+
+@lru_cache(maxsize=1)
+def postgres_state_manager() -> StateManagerPostgres | None:
+    """The Postgres state manager, if this deployment should use one."""
+    config = service_registry().get(StateManagerConfig)
+    db_config = service_registry().get(DatabaseConfig)
+
+    if not config.enabled or db_config.type != "postgresql":
+        return None
+    if parse_redis_url() is not None:
+        logger.info("Redis is configured, not storing the states in Postgres")
+        return None
+    if backend_workers() <= 1 and not config.force:
+        return None
+
+    auth_config = service_registry().get(AuthenticationConfiguration)
+    return StateManagerPostgres(
+        pool=AsyncConnectionPool(
+            _conninfo(db_config),
+            min_size=1,
+            max_size=config.pool_size,
+            open=False,
+            name="reflex-states",
+        ),
+        config=config,
+        token_expiration=int(
+            timedelta(minutes=auth_config.session_timeout).total_seconds()
+        ),
+    )
+
+
+def install_state_manager(app: Any) -> None:
+    """Let ``app`` keep its client states in Postgres, if configured."""
+    manager = postgres_state_manager()
+    if manager is None:
+        return
+    app._state_manager = manager  # noqa: SLF001
+    logger.info(
+        "Client states stored in Postgres, expiring after %ds",
+        manager.token_expiration,
+    )
+
+
+async def state_manager_task() -> None:
+    """Lifespan task purging the expired client states periodically."""
+    manager = postgres_state_manager()
+    if manager is None:
+        return
+
+    while True:
+        await asyncio.sleep(manager.config.purge_interval)
+        try:
+            purged = await manager.purge()
+        except Exception:
+            logger.exception("Purging the expired client states failed")
+        else:
+            logger.debug("Purged %d expired client states", purged)
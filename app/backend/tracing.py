@@ -0,0 +1,584 @@
+"""Tracing of websocket events, state (de)serialization, middleware and queries.
+
+Enabled by the ``app.tracing`` section. :func:`install_tracing` hooks into the
+reflex event processor, ``BaseState`` and the SQLAlchemy engines; the edge
+middleware layers are wrapped with :func:`trace_asgi`. Without tracing none of
+the hooks is installed and :func:`trace_asgi` returns the app unchanged.
+
+Finished spans are exported in a background thread, either as JSON lines to a
+file or as OTLP/HTTP JSON to a collector. ``python main.py trace-collector`` is
+a local stand-in for the collector. Events slower than ``slow_event_threshold``
+are logged to ``app.backend.tracing.slow`` with a breakdown of their queries,
+whether or not their trace is sampled for export.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Final, Protocol
+
+from reflex.state import BaseState
+from reflex_base.event.processor import base_state_processor
+from reflex_base.event.processor.base_state_processor import BaseStateEventProcessor
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.configuration import TracingConfig
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(f"{__name__}.slow")
+
+SLOW_EVENT_TOP_QUERIES: Final = 10
+_WHITESPACE: Final = re.compile(r"\s+")
+
+
+@dataclass(frozen=True, slots=True)
+class QueryTiming:
+    statement: str
+    duration_ms: float
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    start_ns: int  # unix time
+    started: int  # perf counter, for the duration
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    # queries run while handling an event, only collected on event spans
+    queries: list[QueryTiming] | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9, UTC).isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Span | None] = ContextVar("trace_span", default=None)
+_current_event: ContextVar[Span | None] = ContextVar("trace_event", default=None)
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: Sequence[Span]) -> None: ...
+
+
+class FileSpanExporter:
+    """Append spans as JSON lines, ``{pid}`` in the path is the process id."""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path.replace("{pid}", str(os.getpid())))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: Sequence[Span]) -> None:
+        lines = "".join(
+            json.dumps(span.to_dict(), default=str) + "\n" for span in spans
+        )
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+class OTLPSpanExporter:
+    """Post spans as OTLP/HTTP JSON (``/v1/traces``) to a collector."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0) -> None:
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.resource = {
+            "attributes": _otlp_attributes(
+                {"service.name": service_name, "process.pid": os.getpid()}
+            )
+        }
+
+    def payload(self, spans: Sequence[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": self.resource,
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": 1,  # internal
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns),
+                                    "attributes": _otlp_attributes(span.attributes),
+                                    "status": (
+                                        {"code": 2, "message": span.error}
+                                        if span.error
+                                        else {"code": 1}
+                                    ),
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, spans: Sequence[Span]) -> None:
+        request = urllib.request.Request(  # noqa: S310
+            self.endpoint,
+            data=json.dumps(self.payload(spans), default=str).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):  # noqa: S310
+            pass
+
+
+class BatchSpanProcessor:
+    """Export finished spans in batches from a background thread.
+
+    ``submit`` never blocks, spans beyond ``max_queue_size`` are dropped.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        batch_size: int,
+        flush_interval: float,
+        max_queue_size: int = 10_000,
+    ) -> None:
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: queue.Queue[Span | None] = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch: list[Span]) -> None:
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as error:  # noqa: BLE001
+            logger.warning("Exporting %d spans failed: %s", len(batch), error)
+
+    def _run(self) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                span = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                pass
+            else:
+                if span is None:
+                    stopping = True
+                else:
+                    batch.append(span)
+
+            if (
+                stopping
+                or len(batch) >= self.batch_size
+                or time.monotonic() >= deadline
+            ):
+                self._export(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def shutdown(self) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=self.flush_interval)
+        except queue.Full:
+            return
+        self._thread.join(timeout=self.flush_interval + 5)
+
+
+class Tracer:
+    def __init__(self, config: TracingConfig, processor: BatchSpanProcessor) -> None:
+        self.config = config
+        self.processor = processor
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = _current_span.get()
+        if parent is None:
+            trace_id = secrets.token_hex(16)
+            sampled = random.random() < self.config.sample_rate  # noqa: S311
+        else:
+            trace_id, sampled = parent.trace_id, parent.sampled
+
+        span = Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            sampled=sampled,
+            start_ns=time.time_ns(),
+            started=time.perf_counter_ns(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = type(error).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = span.start_ns + time.perf_counter_ns() - span.started
+            if span.sampled:
+                self.processor.submit(span)
+
+    def record_query(self, statement: str, started: int) -> None:
+        """Record a finished query as span of the current trace."""
+        parent = _current_span.get()
+        if parent is None:
+            return
+
+        elapsed = time.perf_counter_ns() - started
+        statement = _WHITESPACE.sub(" ", statement).strip()[
+            : self.config.max_statement_length
+        ]
+        if (event_span := _current_event.get()) is not None:
+            event_span.queries.append(QueryTiming(statement, elapsed / 1_000_000))
+        if parent.sampled:
+            end_ns = time.time_ns()
+            self.processor.submit(
+                Span(
+                    name="db.query",
+                    trace_id=parent.trace_id,
+                    span_id=secrets.token_hex(8),
+                    parent_id=parent.span_id,
+                    sampled=True,
+                    start_ns=end_ns - elapsed,
+                    started=started,
+                    end_ns=end_ns,
+                    attributes={"db.statement": statement},
+                )
+            )
+
+    def log_slow_event(self, span: Span) -> None:
+        threshold = self.config.slow_event_threshold
+        if not threshold or span.duration_ms < threshold:
+            return
+
+        queries = span.queries or []
+        breakdown: dict[str, list[float]] = {}
+        for query in queries:
+            breakdown.setdefault(query.statement, []).append(query.duration_ms)
+        top = sorted(breakdown.items(), key=lambda item: sum(item[1]), reverse=True)
+        lines = "".join(
+            f"\n  {len(durations)}x {sum(durations):.1f} ms  {statement}"
+            for statement, durations in top[:SLOW_EVENT_TOP_QUERIES]
+        )
+        slow_logger.warning(
+            "Slow event %s (%s): %.1f ms, %d queries in %.1f ms%s",
+            span.attributes.get("reflex.event.name"),
+            span.attributes.get("code.function.name"),
+            span.duration_ms,
+            len(queries),
+            sum(query.duration_ms for query in queries),
+            lines,
+            extra={"trace_id": span.trace_id},
+        )
+
+
+_tracer: Tracer | None = None
+
+
+def _instrument_events(tracer: Tracer) -> None:
+    execute_event = BaseStateEventProcessor._execute_event  # noqa: SLF001
+    process_event = base_state_processor.process_event
+
+    @wraps(execute_event)
+    async def traced_execute_event(
+        self: BaseStateEventProcessor, *, entry: Any, registered_handler: Any
+    ) -> None:
+        with tracer.span(
+            "reflex.event",
+            **{
+                "reflex.event.name": entry.event.name,
+                "code.function.name": registered_handler.handler.fn.__qualname__,
+            },
+        ) as span:
+            span.queries = []
+            token = _current_event.set(span)
+            try:
+                await execute_event(
+                    self, entry=entry, registered_handler=registered_handler
+                )
+            finally:
+                _current_event.reset(token)
+        tracer.log_slow_event(span)
+
+    @wraps(process_event)
+    async def traced_process_event(handler: Any, **kwargs: Any) -> None:
+        with tracer.span("reflex.handler", handler=handler.fn.__qualname__):
+            await process_event(handler=handler, **kwargs)
+
+    BaseStateEventProcessor._execute_event = traced_execute_event  # noqa: SLF001
+    base_state_processor.process_event = traced_process_event
+
+
+def _instrument_state(tracer: Tracer) -> None:
+    serialize = BaseState._serialize  # noqa: SLF001
+    deserialize = BaseState._deserialize.__func__  # noqa: SLF001
+    get_delta = BaseState.get_delta
+
+    @wraps(serialize)
+    def traced_serialize(self: BaseState) -> bytes:
+        with tracer.span("reflex.state.serialize", state=self.get_full_name()) as span:
+            data = serialize(self)
+            span.attributes["size"] = len(data)
+            return data
+
+    @wraps(deserialize)
+    def traced_deserialize(cls: type[BaseState], *args: Any, **kwargs: Any) -> Any:
+        with tracer.span("reflex.state.deserialize", state=cls.get_full_name()):
+            return deserialize(cls, *args, **kwargs)
+
+    @wraps(get_delta)
+    def traced_get_delta(self: BaseState) -> Any:
+        with tracer.span("reflex.state.delta", state=self.get_full_name()):
+            return get_delta(self)
+
+    BaseState._serialize = traced_serialize  # noqa: SLF001
+    BaseState._deserialize = classmethod(traced_deserialize)  # noqa: SLF001
+    BaseState.get_delta = traced_get_delta
+
+
+def _instrument_queries(tracer: Tracer) -> None:
+    def before_cursor_execute(conn: Any, *_args: Any) -> None:
+        conn.info.setdefault("trace_query_started", []).append(time.perf_counter_ns())
+
+    def after_cursor_execute(
+        conn: Any, _cursor: Any, statement: str, *_args: Any
+    ) -> None:
+        if started := conn.info.get("trace_query_started"):
+            tracer.record_query(statement, started.pop())
+
+    def handle_error(context: Any) -> None:
+        if context.connection is not None and (
+            started := context.connection.info.get("trace_query_started")
+        ):
+            started.pop()
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(Engine, "handle_error", handle_error)
+
+
+def _exporter(config: TracingConfig) -> SpanExporter:
+    if config.exporter == "otlp":
+        return OTLPSpanExporter(config.otlp_endpoint, config.service_name)
+    return FileSpanExporter(config.file)
+
+
+def install_tracing(config: TracingConfig) -> None:
+    """Install the tracing hooks enabled in ``config``, at most once."""
+    global _tracer  # noqa: PLW0603
+    if not config.enabled or _tracer is not None:
+        return
+
+    processor = BatchSpanProcessor(
+        _exporter(config),
+        batch_size=config.batch_size,
+        flush_interval=config.flush_interval,
+    )
+    _tracer = Tracer(config, processor)
+    if config.events:
+        _instrument_events(_tracer)
+    if config.state:
+        _instrument_state(_tracer)
+    if config.queries:
+        _instrument_queries(_tracer)
+    logger.info(
+        "Tracing enabled: exporter=%s, sample_rate=%s, slow_event_threshold=%s ms",
+        config.exporter,
+        config.sample_rate,
+        config.slow_event_threshold,
+    )
+
+
+class SpanMiddleware:
+    """Trace the ``http`` requests passing an ASGI app."""
+
+    def __init__(
+        self, app: ASGIApp, name: str, tracer: Tracer, request: bool = False
+    ) -> None:
+        self.app = app
+        self.name = name
+        self.tracer = tracer
+        self.request = request
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.request:
+            with self.tracer.span(self.name):
+                await self.app(scope, receive, send)
+            return
+
+        with self.tracer.span(
+            self.name,
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        ) as span:
+
+            async def send_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.attributes["http.status_code"] = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, send_status)
+
+
+def trace_asgi(app: ASGIApp, name: str, request: bool = False) -> ASGIApp:
+    """Wrap ``app`` in a span when middleware tracing is enabled.
+
+    With ``request`` the span gets the method, path and response status.
+    """
+    if _tracer is None or not _tracer.config.middleware:
+        return app
+    return SpanMiddleware(app, name, _tracer, request=request)
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Context manager tracing a block, a no-op when tracing is disabled."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.span(name, **attributes)
+
+
+def _flatten_otlp(payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    for resource_spans in payload.get("resourceSpans", []):
+        resource = {
+            attribute["key"]: next(iter(attribute["value"].values()))
+            for attribute in resource_spans.get("resource", {}).get("attributes", [])
+        }
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for otlp_span in scope_spans.get("spans", []):
+                start, end = (
+                    int(otlp_span["startTimeUnixNano"]),
+                    int(otlp_span["endTimeUnixNano"]),
+                )
+                yield {
+                    "resource": resource,
+                    "trace_id": otlp_span["traceId"],
+                    "span_id": otlp_span["spanId"],
+                    "parent_id": otlp_span.get("parentSpanId") or None,
+                    "name": otlp_span["name"],
+                    "duration_ms": round((end - start) / 1_000_000, 3),
+                    "attributes": {
+                        attribute["key"]: next(iter(attribute["value"].values()))
+                        for attribute in otlp_span.get("attributes", [])
+                    },
+                    "status": otlp_span.get("status", {}).get("code"),
+                }
+
+
+def collector_server(host: str, port: int, output: Path) -> ThreadingHTTPServer:
+    """HTTP server appending the spans of OTLP/HTTP JSON traces to ``output``."""
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_error(400, "OTLP JSON expected")
+                return
+
+            lines = "".join(
+                json.dumps(otlp_span) + "\n" for otlp_span in _flatten_otlp(payload)
+            )
+            with lock, output.open("a", encoding="utf-8") as file:
+                file.write(lines)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            logger.debug(format, *args)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    return ThreadingHTTPServer((host, port), CollectorHandler)
+
+
+def serve_collector(host: str, port: int, output: Path) -> None:
+    """Receive OTLP/HTTP JSON traces and append the spans to ``output``."""
+    server = collector_server(host, port, output)
+    logger.info("Trace collector listening on %s:%d, writing to %s", host, port, output)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
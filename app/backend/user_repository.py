@@ -0,0 +1,194 @@
+"""User queries for the admin user listing.
+
+The listing uses keyset pagination: each page is addressed by the sort value and
+id of the last row of the previous page instead of an OFFSET, so the cost of a
+page stays constant no matter how deep the admin pages into the table. Every
+sort order is backed by a composite ``(<sort column>, id)`` index from the
+``user_listing_indexes`` migration.
+
+Role filters and counts use the array containment operator ``roles @> ARRAY[..]``,
+which the GIN index of the ``user_roles_gin_index`` migration serves.
+"""
+
+import json
+from collections.abc import Sequence
+from datetime import datetime
+from enum import StrEnum
+from typing import Any, Final
+
+from sqlalchemy import (
+    Boolean,
+    ColumnElement,
+    Select,
+    String,
+    column,
+    func,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    values,
+)
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload
+
+from appkit_user.authentication.backend.entities import UserEntity
+
+DEFAULT_PAGE_SIZE: Final = 50
+MAX_PAGE_SIZE: Final = 200
+
+
+class UserSortField(StrEnum):
+    """Columns the user listing can be sorted by."""
+
+    EMAIL = "email"
+    NAME = "name"
+    CREATED = "created"
+
+
+def _sort_expression(sort: UserSortField) -> ColumnElement[Any]:
+    """Return the SQL expression matching the index for ``sort``."""
+    if sort == UserSortField.NAME:
+        # literal instead of a bind parameter, otherwise the expression index
+        # on coalesce(name, '') is not used
+        return func.coalesce(UserEntity.name, literal_column("''"))
+    if sort == UserSortField.CREATED:
+        return UserEntity.created
+    return UserEntity.email
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def has_role(role: str | ColumnElement[str]) -> ColumnElement[bool]:
+    """``roles @> ARRAY[role]``, the form the GIN index on ``roles`` can serve."""
+    # the entity uses the generic ARRAY type, which has no contains()
+    return UserEntity.roles.op("@>", return_type=Boolean)(array([role]))
+
+
+def encode_cursor(user: UserEntity, sort: UserSortField) -> str:
+    """Encode the keyset position of ``user`` as an opaque cursor string."""
+    if sort == UserSortField.NAME:
+        value: str = user.name or ""
+    elif sort == UserSortField.CREATED:
+        value = user.created.isoformat()
+    else:
+        value = user.email
+    return json.dumps([value, user.id])
+
+
+def decode_cursor(cursor: str, sort: UserSortField) -> tuple[Any, int]:
+    """Decode a cursor created by :func:`encode_cursor`."""
+    value, user_id = json.loads(cursor)
+    if sort == UserSortField.CREATED:
+        value = datetime.fromisoformat(value)
+    return value, int(user_id)
+
+
+def filtered_users(
+    search: str = "",
+    active_only: bool = False,
+    role: str | None = None,
+) -> Select[tuple[UserEntity]]:
+    """Build the base user query with the listing filters applied.
+
+    ``search`` is matched as a case-insensitive prefix of the email or the name,
+    which the ``text_pattern_ops`` indexes on ``lower(email)``/``lower(name)``
+    can serve.
+    """
+    stmt = select(UserEntity).options(noload(UserEntity.sessions))
+
+    search = search.strip().lower()
+    if search:
+        pattern = f"{_escape_like(search)}%"
+        stmt = stmt.where(
+            or_(
+                func.lower(UserEntity.email).like(pattern, escape="\\"),
+                func.lower(UserEntity.name).like(pattern, escape="\\"),
+            )
+        )
+
+    if active_only:
+        stmt = stmt.where(UserEntity.is_active.is_(True))
+
+    if role:
+        stmt = stmt.where(has_role(role))
+
+    return stmt
+
+
+async def find_page(
+    db: AsyncSession,
+    *,
+    sort: UserSortField = UserSortField.EMAIL,
+    descending: bool = False,
+    after: str | None = None,
+    search: str = "",
+    active_only: bool = False,
+    role: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> tuple[list[UserEntity], str | None]:
+    """Find one page of users using keyset pagination.
+
+    Args:
+        db: The database session.
+        sort: The column to sort by, ``id`` is always used as tie breaker.
+        descending: Whether to sort in descending order.
+        after: The cursor of the last row of the previous page, or None for the
+            first page.
+        search: Case-insensitive email/name prefix filter.
+        active_only: Only return active users.
+        role: Only return users with this role.
+        limit: The page size, capped at ``MAX_PAGE_SIZE``.
+
+    Returns:
+        Tuple of (users, next_cursor), where next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sort_expr = _sort_expression(sort)
+    stmt = filtered_users(search=search, active_only=active_only, role=role)
+
+    if after:
+        key = tuple_(sort_expr, UserEntity.id)
+        position = tuple_(*decode_cursor(after, sort))
+        stmt = stmt.where(key < position if descending else key > position)
+
+    if descending:
+        stmt = stmt.order_by(sort_expr.desc(), UserEntity.id.desc())
+    else:
+        stmt = stmt.order_by(sort_expr, UserEntity.id)
+
+    # fetch one extra row to find out whether there is a next page
+    result = await db.execute(stmt.limit(limit + 1))
+    users = list(result.scalars().all())
+
+    if len(users) <= limit:
+        return users, None
+
+    users = users[:limit]
+    return users, encode_cursor(users[-1], sort)
+
+
+async def count_by_role(db: AsyncSession, roles: Sequence[str]) -> dict[str, int]:
+    """Count the users of each of ``roles`` in a single grouped query.
+
+    Every role is joined with ``roles @> ARRAY[role]``, one index lookup per
+    role instead of unnesting the roles of every user. Roles without users are
+    counted as 0.
+    """
+    if not roles:
+        return {}
+
+    role_names = values(column("name", String), name="role_names").data(
+        [(role,) for role in roles]
+    )
+    stmt = (
+        select(role_names.c.name, func.count(UserEntity.id))
+        .select_from(role_names)
+        .outerjoin(UserEntity, has_role(role_names.c.name))
+        .group_by(role_names.c.name)
+    )
+    result = await db.execute(stmt)
+    return dict(result.tuples().all())
@@ -0,0 +1,473 @@
+"""Bulk import and export of users and their roles as CSV or JSON lines.
+
+Both directions stream through psycopg ``COPY`` in batches, so the memory used
+does not depend on the size of the file:
+
+- Import reads ``batch_size`` rows, validates them, hashes the plain text
+  passwords with the ``password_hashing`` method in a process pool and copies
+  the batch into a temporary staging table, from which it is upserted into
+  ``auth_users`` by email. While one batch is copied the next one is already
+  hashed. Every batch is committed on its own, so a large import neither holds
+  one long transaction nor loses the finished batches when a later one fails;
+  importing the file again continues where it stopped (``--on-conflict``).
+  With ``strict`` the whole file is validated first and nothing is imported
+  if a row is invalid.
+- Export copies ``auth_users`` straight from ``COPY ... TO STDOUT`` into the
+  file.
+
+Columns (the CSV header, the keys of a JSON line): ``email`` (required),
+``name``, ``is_active``, ``is_admin``, ``is_verified``,
+``needs_password_reset``, ``roles`` (``;`` separated in CSV, a list in JSON)
+and either ``password`` (plain text, hashed on import) or ``password_hash``
+(an existing hash, e.g. from an export with hashes).
+"""
+
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from enum import StrEnum
+from itertools import batched, repeat
+from pathlib import Path
+from typing import Any, Final, TextIO
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.registry import service_registry
+from appkit_commons.security import generate_password_hash
+
+from app.configuration import PasswordHashingConfig
+from app.roles import ALL_ROLES
+
+logger = logging.getLogger(__name__)
+
+ROLE_SEPARATOR: Final = ";"
+HASH_METHODS: Final = ("scrypt:", "pbkdf2:")
+MAX_REPORTED_ERRORS: Final = 100
+# (name in the file, column of auth_users), without the roles
+EXPORT_COLUMNS: Final = (
+    ("email", "email"),
+    ("name", "name"),
+    ("is_active", "is_active"),
+    ("is_admin", "is_admin"),
+    ("is_verified", "is_verified"),
+    ("needs_password_reset", "needs_password_reset"),
+)
+_TRUE: Final = frozenset({"1", "true", "t", "yes", "y"})
+_FALSE: Final = frozenset({"0", "false", "f", "no", "n"})
+
+_STAGING_TABLE: Final = """
+CREATE TEMPORARY TABLE user_import (
+    line integer NOT NULL,
+    email varchar(200) NOT NULL,
+    name varchar(200),
+    password varchar(200),
+    is_active boolean NOT NULL,
+    is_admin boolean NOT NULL,
+    is_verified boolean NOT NULL,
+    needs_password_reset boolean NOT NULL,
+    roles varchar[] NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+_COPY_STAGING: Final = (
+    "COPY user_import (line, email, name, password, is_active, is_admin,"
+    " is_verified, needs_password_reset, roles) FROM STDIN"
+)
+_STAGING_TYPES: Final = (
+    "int4",
+    "varchar",
+    "varchar",
+    "varchar",
+    "bool",
+    "bool",
+    "bool",
+    "bool",
+    "varchar[]",
+)
+# the last line wins when an email occurs twice in a batch, ON CONFLICT cannot
+# update the same row twice in one statement
+_UPSERT: Final = """
+WITH upserted AS (
+    INSERT INTO auth_users AS existing (
+        email, name, _password, is_active, is_admin, is_verified,
+        needs_password_reset, roles
+    )
+    SELECT DISTINCT ON (email)
+        email, name, password, is_active, is_admin, is_verified,
+        needs_password_reset, roles
+    FROM user_import
+    ORDER BY email, line DESC
+    ON CONFLICT (email) DO {conflict}
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted),
+    count(*) FILTER (WHERE NOT inserted)
+FROM upserted
+"""
+_UPDATE_EXISTING: Final = """UPDATE SET
+        name = COALESCE(EXCLUDED.name, existing.name),
+        _password = COALESCE(EXCLUDED._password, existing._password),
+        is_active = EXCLUDED.is_active,
+        is_admin = EXCLUDED.is_admin,
+        is_verified = EXCLUDED.is_verified,
+        needs_password_reset = EXCLUDED.needs_password_reset,
+        roles = EXCLUDED.roles,
+        updated = now()"""
+
+
+class FileFormat(StrEnum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+    @classmethod
+    def of(cls, path: Path, default: "FileFormat | None" = None) -> "FileFormat":
+        if default is not None:
+            return default
+        if path.suffix.lower() in {".jsonl", ".ndjson", ".json"}:
+            return cls.JSONL
+        return cls.CSV
+
+
+class OnConflict(StrEnum):
+    """What to do with a row whose email already exists."""
+
+    SKIP = "skip"
+    UPDATE = "update"
+
+
+class InvalidRowError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class UserRow:
+    line: int
+    email: str
+    name: str | None
+    password: str | None  # plain text, hashed before the copy
+    password_hash: str | None
+    is_active: bool
+    is_admin: bool
+    is_verified: bool
+    needs_password_reset: bool
+    roles: list[str]
+
+
+@dataclass
+class ImportReport:
+    """Result of an import; only the first errors are kept with their line."""
+
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    errors: list[str] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    def error(self, line: int, message: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+
+def _boolean(value: Any, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    msg = f"invalid boolean {value!r}"
+    raise InvalidRowError(msg)
+
+
+def _text(value: Any) -> str | None:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def parse_row(
+    line: int, record: dict[str, Any], known_roles: frozenset[str]
+) -> UserRow:
+    """Validate one record of the file, raising :class:`InvalidRowError`."""
+    email = _text(record.get("email"))
+    if not email or "@" not in email:
+        msg = f"invalid email {record.get('email')!r}"
+        raise InvalidRowError(msg)
+
+    roles = record.get("roles") or []
+    if isinstance(roles, str):
+        roles = roles.split(ROLE_SEPARATOR)
+    elif not isinstance(roles, list):
+        msg = f"invalid roles {roles!r}"
+        raise InvalidRowError(msg)
+    roles = sorted({str(role).strip() for role in roles} - {""})
+    if unknown := [role for role in roles if role not in known_roles]:
+        msg = f"unknown roles {', '.join(unknown)}"
+        raise InvalidRowError(msg)
+
+    password = _text(record.get("password"))
+    password_hash = _text(record.get("password_hash"))
+    if password and password_hash:
+        msg = "either password or password_hash, not both"
+        raise InvalidRowError(msg)
+    if password_hash and not password_hash.startswith(HASH_METHODS):
+        msg = "password_hash is not a scrypt or pbkdf2 hash"
+        raise InvalidRowError(msg)
+
+    return UserRow(
+        line=line,
+        email=email,
+        name=_text(record.get("name")),
+        password=password,
+        password_hash=password_hash,
+        is_active=_boolean(record.get("is_active"), default=True),
+        is_admin=_boolean(record.get("is_admin"), default=False),
+        is_verified=_boolean(record.get("is_verified"), default=True),
+        needs_password_reset=_boolean(
+            record.get("needs_password_reset"), default=False
+        ),
+        roles=roles,
+    )
+
+
+def read_records(
+    file: TextIO, file_format: FileFormat
+) -> Iterator[tuple[int, dict[str, Any] | None]]:
+    """Yield ``(line, record)``, ``record`` is None for an unparsable line."""
+    if file_format == FileFormat.CSV:
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            record = None
+        yield line, record if isinstance(record, dict) else None
+
+
+def validated_rows(
+    records: Iterable[tuple[int, dict[str, Any] | None]], report: ImportReport
+) -> Iterator[UserRow]:
+    known_roles = frozenset(role.name for role in ALL_ROLES)
+    for line, record in records:
+        report.rows += 1
+        if record is None:
+            report.error(line, "not a JSON object")
+            continue
+        try:
+            yield parse_row(line, record, known_roles)
+        except InvalidRowError as e:
+            report.error(line, str(e))
+
+
+def conninfo(db_config: DatabaseConfig | None = None) -> str:
+    """libpq connection string of the application database."""
+    db_config = db_config or service_registry().get(DatabaseConfig)
+    url = make_url(db_config.url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+def _hash_passwords(executor: Executor, rows: list[UserRow]) -> Iterator[str]:
+    """Start hashing the plain text passwords of ``rows``, in row order."""
+    config = service_registry().get(PasswordHashingConfig)
+    passwords = [row.password for row in rows if row.password]
+    # the results are collected lazily, the work is submitted right away
+    chunksize = max(1, len(passwords) // ((os.cpu_count() or 1) * 4))
+    return executor.map(
+        generate_password_hash,
+        passwords,
+        repeat(config.method),
+        repeat(config.salt_length),
+        chunksize=chunksize,
+    )
+
+
+def _copy_batch(
+    cursor: psycopg.Cursor,
+    rows: list[UserRow],
+    hashes: Iterator[str],
+    on_conflict: OnConflict,
+) -> tuple[int, int]:
+    with cursor.copy(_COPY_STAGING) as copy:
+        copy.set_types(list(_STAGING_TYPES))
+        for row in rows:
+            password = next(hashes) if row.password else row.password_hash
+            copy.write_row(
+                (
+                    row.line,
+                    row.email,
+                    row.name,
+                    password,
+                    row.is_active,
+                    row.is_admin,
+                    row.is_verified,
+                    row.needs_password_reset,
+                    row.roles,
+                )
+            )
+
+    conflict = _UPDATE_EXISTING if on_conflict == OnConflict.UPDATE else "NOTHING"
+    cursor.execute(_UPSERT.format(conflict=conflict))
+    inserted, updated = cursor.fetchone()
+    return inserted, updated
+
+
+def _validate(path: Path, file_format: FileFormat) -> ImportReport:
+    report = ImportReport()
+    with path.open(newline="", encoding="utf-8-sig") as file:
+        for _ in validated_rows(read_records(file, file_format), report):
+            pass
+    return report
+
+
+def _import(
+    path: Path,
+    file_format: FileFormat,
+    on_conflict: OnConflict,
+    batch_size: int,
+    workers: int | None,
+) -> ImportReport:
+    report = ImportReport()
+    with (
+        path.open(newline="", encoding="utf-8-sig") as file,
+        # not forked: the workers must not inherit the connection
+        ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        ) as executor,
+        psycopg.connect(conninfo()) as connection,
+        connection.cursor() as cursor,
+    ):
+
+        def copy(batch: list[UserRow], hashes: Iterator[str]) -> None:
+            inserted, updated = _copy_batch(cursor, batch, hashes, on_conflict)
+            connection.commit()
+            report.inserted += inserted
+            report.updated += updated
+
+        cursor.execute(_STAGING_TABLE)
+        rows = validated_rows(read_records(file, file_format), report)
+        pending = None
+        for batch in map(list, batched(rows, batch_size)):
+            hashing = (batch, _hash_passwords(executor, batch))
+            if pending is not None:
+                copy(*pending)
+            pending = hashing
+        if pending is not None:
+            copy(*pending)
+
+    report.skipped = report.rows - report.invalid - report.inserted - report.updated
+    return report
+
+
+def import_users(
+    path: Path,
+    *,
+    file_format: FileFormat | None = None,
+    on_conflict: OnConflict = OnConflict.SKIP,
+    batch_size: int = 1000,
+    workers: int | None = None,
+    dry_run: bool = False,
+    strict: bool = False,
+) -> ImportReport:
+    """Import the users of ``path``, see the module docstring for the columns.
+
+    Invalid rows are reported and skipped, with ``strict`` nothing is imported
+    if there is one. With ``dry_run`` the file is only validated, nothing is
+    hashed or written.
+    """
+    started = time.perf_counter()
+    file_format = FileFormat.of(path, file_format)
+
+    if dry_run or strict:
+        report = _validate(path, file_format)
+        imported = not dry_run and not report.invalid
+    else:
+        imported = True
+    if imported:
+        report = _import(path, file_format, on_conflict, batch_size, workers)
+
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        "%s %d rows from %s: %d inserted, %d updated, %d skipped, "
+        "%d invalid in %.0f ms",
+        "Imported" if imported else "Validated",
+        report.rows,
+        path,
+        report.inserted,
+        report.updated,
+        report.skipped,
+        report.invalid,
+        report.duration_ms,
+    )
+    return report
+
+
+def export_users(
+    path: Path,
+    *,
+    file_format: FileFormat | None = None,
+    with_password_hash: bool = False,
+) -> int:
+    """Export all users to ``path``, ordered by id, return the number of rows.
+
+    The export can be imported again; password hashes are only written with
+    ``with_password_hash``.
+    """
+    file_format = FileFormat.of(path, file_format)
+    columns = list(EXPORT_COLUMNS)
+    if with_password_hash:
+        columns.append(("password_hash", "_password"))
+    count = 0
+
+    with (
+        psycopg.connect(conninfo()) as connection,
+        connection.cursor() as cursor,
+        path.open("w", newline="", encoding="utf-8") as file,
+    ):
+        if file_format == FileFormat.CSV:
+            select = ", ".join(f"{column} AS {name}" for name, column in columns)
+            query = (
+                f"COPY (SELECT {select}, "  # noqa: S608
+                f"array_to_string(roles, '{ROLE_SEPARATOR}') AS roles "
+                "FROM auth_users ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)"
+            )
+            with cursor.copy(query) as copy:
+                for data in copy:
+                    file.write(bytes(data).decode())
+            count = max(cursor.rowcount, 0)
+        else:
+            pairs = ", ".join(
+                f"'{name}', {column}" for name, column in [*columns, ("roles", "roles")]
+            )
+            query = (
+                f"COPY (SELECT json_build_object({pairs})::text "  # noqa: S608
+                "FROM auth_users ORDER BY id) TO STDOUT"
+            )
+            with cursor.copy(query) as copy:
+                copy.set_types(["text"])
+                for (line,) in copy.rows():
+                    file.write(line + "\n")
+                    count += 1
+
+    logger.info("Exported %d users to %s", count, path)
+    return count
@@ -0,0 +1,39 @@
+"""Number of backend worker processes of this server.
+
+``reflex run --env prod`` starts the backend with gunicorn (or granian), one
+worker per server unless Reflex finds Redis. Without Redis several workers are
+started with the environment of the server process: ``WEB_CONCURRENCY=4`` or
+``GUNICORN_CMD_ARGS="--workers 4"`` for gunicorn, ``GRANIAN_WORKERS=4`` for
+granian. ``reflex.workers`` of the configuration does not start any workers.
+"""
+
+import os
+import shlex
+
+
+def _gunicorn_workers(cmd_args: str) -> int | None:
+    workers = None
+    args = shlex.split(cmd_args)
+    for index, arg in enumerate(args):
+        if arg in ("-w", "--workers") and index + 1 < len(args):
+            workers = args[index + 1]
+        elif arg.startswith("--workers="):
+            workers = arg.partition("=")[2]
+        elif arg.startswith("-w") and len(arg) > 2:  # noqa: PLR2004
+            workers = arg[2:]
+    return int(workers) if workers else None
+
+
+def backend_workers() -> int:
+    """Worker processes started for the backend, as gunicorn or granian see it."""
+    try:
+        if granian := os.environ.get("GRANIAN_WORKERS"):
+            return int(granian)
+        # the command line arguments of gunicorn win over WEB_CONCURRENCY
+        if (
+            workers := _gunicorn_workers(os.environ.get("GUNICORN_CMD_ARGS", ""))
+        ) is not None:
+            return workers
+        return int(os.environ.get("WEB_CONCURRENCY", "1"))
+    except ValueError:
+        return 1
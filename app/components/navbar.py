@@ -4,11 +4,14 @@ import reflex as rx
 
 from appkit_commons.registry import service_registry
 
+from app.assets import asset_url
 from app.components.navbar_component import (
     admin_sidebar_item,
     border_radius,
     navbar,
+    sidebar_item,
 )
+from app.components.sidebar import SIDEBAR, SidebarSection
 from app.configuration import AppConfig
 
 _config = service_registry().get(AppConfig)
@@ -22,7 +25,7 @@ VERSION: Final[str] = (
 def navbar_header() -> rx.Component:
     return rx.hstack(
         rx.image(
-            "/img/logo.svg",
+            asset_url("img/logo.svg"),
             class_name="h-[54px]",
             margin_top="1.2em",
             margin_left="0px",
@@ -50,11 +53,7 @@ def navbar_admin_items() -> rx.Component:
             padding="0.35em",
             margin_top="1em",
         ),
-        admin_sidebar_item(
-            label="Benutzer",
-            icon="users",
-            url="/admin/users",
-        ),
+        *[admin_sidebar_item(item) for item in SIDEBAR.section(SidebarSection.ADMIN)],
         width="95%",
         spacing="1",
     )
@@ -63,11 +62,7 @@ def navbar_admin_items() -> rx.Component:
 def navbar_items() -> rx.Component:
     return rx.vstack(
         # rx.text("Demos", size="2", weight="bold", style=sub_heading_styles),
-        # sidebar_item(
-        #     label="Assistent",
-        #     icon="bot-message-square",
-        #     url="/assistant",
-        # ),
+        *[sidebar_item(item) for item in SIDEBAR.section(SidebarSection.MAIN)],
         rx.spacer(min_height="1em"),
         spacing="1",
         width="95%",
@@ -75,10 +70,16 @@ def navbar_items() -> rx.Component:
     )
 
 
-def app_navbar() -> rx.Component:
+@rx.memo
+def app_navbar_memo() -> rx.Component:
     return navbar(
         navbar_header=navbar_header(),
         navbar_items=navbar_items(),
         navbar_admin_items=navbar_admin_items(),
         version=VERSION,
     )
+
+
+def app_navbar() -> rx.Component:
+    """The navbar of all pages, compiled once into the shared memo components."""
+    return app_navbar_memo()
@@ -1,12 +1,22 @@
+import json
 import logging
+from typing import Any, Final
 
 import reflex as rx
 
 import appkit_mantine as mn
-from appkit_ui.global_states import LoadingState
-from appkit_user.authentication.components.components import requires_admin
 from appkit_user.authentication.states import LoginState
 
+from app.assets import asset_url
+from app.components.sidebar import (
+    SIDEBAR,
+    NavbarState,
+    SidebarItem,
+    SidebarRegistry,
+    SidebarSection,
+)
+from app.states.client_states import NAV_LOADING
+
 logger = logging.getLogger(__name__)
 
 accent_bg_color = rx.color("accent", 3)
@@ -24,6 +34,35 @@ box_shadow_right_dark = "inset -5px -5px 15px -5px rgba(0.9, 0.9, 0.9, 0.1)"
 
 sidebar_width = "375px"
 
+# keeps the scroll position of a scroll area in localStorage, like the stateful
+# scroll area of appkit_mantine does once its backend handler set it up
+_PERSIST_SCROLL_SCRIPT: Final = """(() => {{
+  const wrapper = document.getElementById({wrapper_id});
+  if (!wrapper || wrapper.dataset.mnkScrollInit === '1') return;
+  wrapper.dataset.mnkScrollInit = '1';
+  wrapper.dataset.mnkScrollPersistKey = {key};
+  const viewport =
+    wrapper.querySelector('[data-radix-scroll-area-viewport]') ||
+    wrapper.querySelector('.mantine-ScrollArea-viewport') ||
+    document.getElementById({viewport_id});
+  if (!viewport) return;
+  viewport.style.overscrollBehavior = 'contain';
+  const save = () => {{
+    try {{ localStorage.setItem({key}, String(viewport.scrollTop)); }} catch (_e) {{}}
+  }};
+  viewport.addEventListener('scroll', save, {{ passive: true }});
+  window.addEventListener('beforeunload', save);
+}})()"""
+_SAVED_SCROLL_POSITION: Final = """(() => {{
+  try {{
+    if (typeof window === 'undefined') return {{ x: 0, y: 0 }};
+    const y = Number.parseInt(window.localStorage.getItem({key}) ?? '0', 10);
+    return {{ x: 0, y: Number.isFinite(y) ? y : 0 }};
+  }} catch (_e) {{
+    return {{ x: 0, y: 0 }};
+  }}
+}})()"""
+
 
 sub_heading_styles = {
     "text_transform": "uppercase",
@@ -36,160 +75,123 @@ sub_heading_styles = {
 }
 
 
-def admin_sidebar_item(
-    label: str, icon: str, url: str, svg: str | None = None
-) -> rx.Component:
-    active = (rx.State.router.page.path == url.lower()) | (
-        (rx.State.router.page.path == "/") & label == "Overview"
-    )
+# one style for all nav items, the active one is highlighted by active_item_style
+nav_item_style = {
+    "color": text_color,
+    "background_color": "transparent",
+    "opacity": "0.95",
+    "_hover": {
+        "background_color": gray_bg_color,
+        "opacity": "1",
+    },
+}
 
-    return rx.link(
-        rx.hstack(
-            rx.box(width="16px"),
-            rx.cond(
-                svg,
-                rx.image(svg, height="16px", width="16px", fill="var(--gray-9)"),
-                rx.icon(icon, size=15, color="var(--gray-9)"),
-            ),
-            rx.text(label, size="2", weight="regular"),
-            color=rx.cond(
-                active,
-                accent_text_color,
-                text_color,
+active_item_style = {
+    "color": accent_text_color,
+    "background_color": accent_bg_color,
+    "opacity": "1",
+}
+
+
+def active_item_rules(registry: SidebarRegistry) -> dict[str, dict]:
+    """Highlight rules keyed by the ``data-active`` value of the navbar.
+
+    The navbar carries the key of the active item, so switching pages changes a
+    single attribute instead of re-evaluating a condition per item.
+    """
+    return {
+        f"&[data-active='{item.key}'] [data-item='{item.key}']": active_item_style
+        for item in registry.items
+    }
+
+
+def _item_attrs(item: SidebarItem) -> dict[str, str]:
+    return {"data-item": item.key}
+
+
+def _start_loading(url: str) -> rx.Var:
+    """Run the loading bar, unless the link leads to the page already shown.
+
+    The bar stops when the navbar of the next page mounts, following a link to
+    the current page mounts nothing.
+    """
+    path = json.dumps(url.rstrip("/") or "/")
+    current = "(window.location.pathname.replace(/\\/+$/, '') || '/')"
+    return NAV_LOADING.set_value(rx.Var(f"({current} !== {path})").to(bool))
+
+
+def visible(item: SidebarItem, component: rx.Component) -> rx.Component:
+    """Render ``component`` only if the user may see ``item``."""
+    if item.role is None:
+        return component
+    return rx.cond(NavbarState.visible_items.contains(item.key), component)
+
+
+def admin_sidebar_item(item: SidebarItem) -> rx.Component:
+    return visible(
+        item,
+        rx.link(
+            rx.hstack(
+                rx.box(width="16px"),
+                rx.image(item.svg, height="16px", width="16px", fill="var(--gray-9)")
+                if item.svg
+                else rx.icon(item.icon, size=15, color="var(--gray-9)"),
+                rx.text(item.label, size="2", weight="regular"),
+                style=nav_item_style,
+                custom_attrs=_item_attrs(item),
+                align="center",
+                border_radius=border_radius,
+                width="100%",
+                padding="3px",
             ),
-            background_color=rx.cond(active, accent_bg_color, "transparent"),
-            style={
-                "_hover": {
-                    "background_color": rx.cond(
-                        active,
-                        accent_bg_color,
-                        gray_bg_color,
-                    ),
-                    "color": rx.cond(
-                        active,
-                        accent_text_color,
-                        text_color,
-                    ),
-                    "opacity": "1",
-                },
-                "opacity": rx.cond(
-                    active,
-                    "1",
-                    "0.95",
-                ),
-            },
-            align="center",
-            border_radius=border_radius,
+            on_click=_start_loading(item.url),
+            underline="none",
+            href=item.url,
             width="100%",
-            padding="3px",
         ),
-        on_click=[
-            LoadingState.set_is_loading(True),
-        ],
-        underline="none",
-        href=url,
-        width="100%",
     )
 
 
-def sidebar_item(label: str, icon: str, url: str) -> rx.Component:
-    active = (rx.State.router.page.path == url.lower()) | (
-        (rx.State.router.page.path == "/") & label == "Overview"
-    )
-
-    return rx.link(
-        rx.hstack(
-            rx.cond(icon == "", rx.spacer(), rx.icon(icon, size=17)),
-            rx.text(label, size="3", weight="regular"),
-            color=rx.cond(
-                active,
-                accent_text_color,
-                text_color,
+def sidebar_item(item: SidebarItem) -> rx.Component:
+    return visible(
+        item,
+        rx.link(
+            rx.hstack(
+                rx.icon(item.icon, size=17) if item.icon else rx.spacer(),
+                rx.text(item.label, size="3", weight="regular"),
+                style=nav_item_style,
+                custom_attrs=_item_attrs(item),
+                align="center",
+                border_radius=border_radius,
+                width="100%",
+                spacing="2",
+                padding="0.35em",
             ),
-            background_color=rx.cond(active, accent_bg_color, "transparent"),
-            style={
-                "_hover": {
-                    "background_color": rx.cond(
-                        active,
-                        accent_bg_color,
-                        gray_bg_color,
-                    ),
-                    "color": rx.cond(
-                        active,
-                        accent_text_color,
-                        text_color,
-                    ),
-                    "opacity": "1",
-                },
-                "opacity": rx.cond(
-                    active,
-                    "1",
-                    "0.95",
-                ),
-            },
-            align="center",
-            border_radius=border_radius,
+            on_click=_start_loading(item.url),
+            underline="none",
+            href=item.url,
             width="100%",
-            spacing="2",
-            padding="0.35em",
         ),
-        on_click=[
-            LoadingState.set_is_loading(True),
-        ],
-        underline="none",
-        href=url,
-        width="100%",
     )
 
 
-def sidebar_icon_button(
-    label: str,
-    icon: str,
-    url: str,
-) -> rx.Component:
-    active = (rx.State.router.page.path == url.lower()) | (
-        (rx.State.router.page.path == "/") & label == "Overview"
-    )
-
-    return rx.link(
-        rx.tooltip(
-            rx.hstack(
-                rx.icon(icon, size=17),
-                color=rx.cond(
-                    active,
-                    accent_text_color,
-                    text_color,
+def sidebar_icon_button(item: SidebarItem) -> rx.Component:
+    return visible(
+        item,
+        rx.link(
+            rx.tooltip(
+                rx.hstack(
+                    rx.icon(item.icon, size=17),
+                    style=nav_item_style,
+                    custom_attrs=_item_attrs(item),
+                    padding="0.35em",
                 ),
-                background_color=rx.cond(active, accent_bg_color, "transparent"),
-                style={
-                    "_hover": {
-                        "background_color": rx.cond(
-                            active,
-                            accent_bg_color,
-                            gray_bg_color,
-                        ),
-                        "color": rx.cond(
-                            active,
-                            accent_text_color,
-                            text_color,
-                        ),
-                        "opacity": "1",
-                    },
-                    "opacity": rx.cond(
-                        active,
-                        "1",
-                        "0.95",
-                    ),
-                },
-                padding="0.35em",
+                content=item.label,
             ),
-            content=label,
+            on_click=_start_loading(item.url),
+            underline="none",
+            href=item.url,
         ),
-        on_click=[
-            LoadingState.set_is_loading(True),
-        ],
-        underline="none",
-        href=url,
     )
 
 
@@ -222,8 +224,10 @@ def logout_button() -> rx.Component:
 def navbar_default_header() -> rx.Component:
     return rx.hstack(
         rx.color_mode_cond(
-            rx.image("/img/logo.svg", height="56px", margin_top="1.25em"),
-            rx.image("/img/logo_dark.svg", height="56px", margin_top="1.25em"),
+            rx.image(asset_url("img/logo.svg"), height="56px", margin_top="1.25em"),
+            rx.image(
+                asset_url("img/logo_dark.svg"), height="56px", margin_top="1.25em"
+            ),
         ),
         rx.spacer(),
         align="center",
@@ -236,7 +240,10 @@ def navbar_default_header() -> rx.Component:
 def navbar_default_footer(version: str) -> rx.Component:
     return rx.vstack(
         rx.hstack(
-            sidebar_icon_button(label="Profil", icon="user", url="/profile"),
+            *[
+                sidebar_icon_button(item)
+                for item in SIDEBAR.section(SidebarSection.FOOTER)
+            ],
             rx.color_mode.button(style={"opacity": "0.8", "scale": "0.95"}),
             rx.spacer(),
             logout_button(),
@@ -259,6 +266,50 @@ def navbar_default_footer(version: str) -> rx.Component:
     )
 
 
+def persistent_scroll_area(
+    *children: rx.Component, persist_key: str, **props: Any
+) -> rx.Component:
+    """``mn.scroll_area.stateful`` without controls, set up in the browser.
+
+    The stateful scroll area asks its backend handler ``setup_controls`` on every
+    mount for the script keeping the scroll position in ``localStorage``, one
+    round trip per page. Here the script is built at compile time and run on
+    mount by ``call_script``. ``type``, ``scrollbars`` and ``scrollbar_size`` go
+    to the scroll area, the other props to its wrapper.
+    """
+    viewport_id = f"{persist_key}-viewport"
+    wrapper_id = f"{viewport_id}-wrapper"
+    key = json.dumps(persist_key)
+    scroll_props = {
+        key: props.pop(key)
+        for key in ("type", "scrollbars", "scrollbar_size")
+        if key in props
+    }
+    return rx.box(
+        mn.scroll_area(
+            *children,
+            height="100%",
+            offset_scrollbars=True,
+            start_scroll_position=rx.Var(_SAVED_SCROLL_POSITION.format(key=key)).to(
+                dict
+            ),
+            viewport_props={"id": viewport_id, "style": {"overscrollBehavior": "auto"}},
+            **scroll_props,
+        ),
+        id=wrapper_id,
+        style={"position": "relative", "width": "100%"},
+        on_mount=rx.call_script(
+            _PERSIST_SCROLL_SCRIPT.format(
+                key=key,
+                viewport_id=json.dumps(viewport_id),
+                wrapper_id=json.dumps(wrapper_id),
+            )
+        ),
+        data_mnk_scroll_persist_key=persist_key,
+        **props,
+    )
+
+
 def navbar(
     navbar_items: rx.Component,
     version: str,
@@ -278,24 +329,23 @@ def navbar(
             navbar_header,
             rx.box(
                 class_name=rx.cond(
-                    LoadingState.is_loading, "rainbow-gradient-bar", "default-bar"
+                    NAV_LOADING.value, "rainbow-gradient-bar", "default-bar"
                 ),
+                on_mount=NAV_LOADING.set_value(False),
             ),
-            mn.scroll_area.stateful(
+            persistent_scroll_area(
                 navbar_items,
-                requires_admin(
+                rx.cond(
+                    NavbarState.visible_sections.contains(SidebarSection.ADMIN),
                     navbar_admin_items,
                 ),
-                width="100%",
+                persist_key="navbar_scroll_area",
                 type="hover",
                 scrollbars="y",
                 scrollbar_size="6px",
-                show_controls=False,
-                persist_key="navbar_scroll_area",
                 # Allow the scroll area to grow and take available space
                 flex="1",
                 min_height="0",
-                height="100%",
             ),
             navbar_footer,
             justify="end",
@@ -313,6 +363,8 @@ def navbar(
         left="0px",
         flex="1",
         spacing="0",
+        custom_attrs={"data-active": NavbarState.active_item},
+        style=active_item_rules(SIDEBAR),
         bg=rx.color("gray", 2),
         border_right=border,
         box_shadow=rx.color_mode_cond(
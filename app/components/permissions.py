@@ -0,0 +1,17 @@
+import reflex as rx
+
+from app.states.permission_states import PermissionState
+
+
+def requires_permission(
+    *children: rx.Component,
+    mask: int,
+    fallback: rx.Component | None = None,
+) -> rx.Component:
+    """Render ``children`` if the user holds any bit of ``mask``.
+
+    ``requires_admin`` and ``requires_role`` of appkit_user as one bitwise test
+    of ``PermissionState.permissions``, e.g. ``mask=ADMIN`` or
+    ``mask=ROLES.mask("project_manager")``.
+    """
+    return rx.cond(PermissionState.allows(mask), rx.fragment(*children), fallback)
@@ -0,0 +1,115 @@
+"""Declarative registry of the sidebar navigation.
+
+The navbar is built from the items registered here. The active item is looked up
+in a route index and role-based visibility is resolved once per logged in user
+by testing the permission bitmap against the mask of each item, the rendered
+navbar only switches on the resulting state vars.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Final
+
+import reflex as rx
+
+from app.roles import ADMIN, ROLES, RoleRegistry, allows
+from app.states.permission_states import PermissionState
+
+# pseudo role of the items restricted to administrators (``User.is_admin``)
+ADMIN_ROLE: Final = "admin"
+
+
+class SidebarSection(StrEnum):
+    MAIN = "main"
+    ADMIN = "admin"
+    FOOTER = "footer"
+
+
+@dataclass(frozen=True, slots=True)
+class SidebarItem:
+    label: str
+    icon: str
+    url: str
+    role: str | None = None
+    section: SidebarSection = SidebarSection.MAIN
+    svg: str | None = None
+
+    @property
+    def key(self) -> str:
+        return self.url.lower()
+
+
+class SidebarRegistry:
+    def __init__(self, items: Sequence[SidebarItem], roles: RoleRegistry) -> None:
+        known_roles = {role.name for role in roles.roles} | {ADMIN_ROLE}
+        unknown = {item.role for item in items if item.role} - known_roles
+        if unknown:
+            msg = f"Sidebar items require unknown roles: {sorted(unknown)}"
+            raise ValueError(msg)
+
+        self.items: tuple[SidebarItem, ...] = tuple(items)
+        self.route_index: dict[str, SidebarItem] = {
+            item.key: item for item in self.items
+        }
+        # permission bits an item requires, items without a role are missing
+        self.masks: dict[str, int] = {
+            item.key: ADMIN if item.role == ADMIN_ROLE else roles.mask(item.role)
+            for item in self.items
+            if item.role
+        }
+
+    def section(self, section: SidebarSection) -> list[SidebarItem]:
+        return [item for item in self.items if item.section == section]
+
+    def active_item(self, path: str) -> str:
+        """Key of the item of the route ``path``, empty if it has none."""
+        item = self.route_index.get(path.rstrip("/").lower() or "/")
+        return item.key if item is not None else ""
+
+    def visible_items(self, permissions: int) -> list[SidebarItem]:
+        """The items a user with the permission bitmap ``permissions`` may see."""
+        return [
+            item
+            for item in self.items
+            if item.key not in self.masks or allows(permissions, self.masks[item.key])
+        ]
+
+
+SIDEBAR: Final = SidebarRegistry(
+    [
+        # SidebarItem(label="Assistent", icon="bot-message-square", url="/assistant"),
+        SidebarItem(
+            label="Benutzer",
+            icon="users",
+            url="/admin/users",
+            role=ADMIN_ROLE,
+            section=SidebarSection.ADMIN,
+        ),
+        SidebarItem(
+            label="Profil",
+            icon="user",
+            url="/profile",
+            section=SidebarSection.FOOTER,
+        ),
+    ],
+    roles=ROLES,
+)
+
+
+class NavbarState(PermissionState):
+    @rx.var
+    def active_item(self) -> str:
+        """Key of the sidebar item of the current page."""
+        return SIDEBAR.active_item(self.router.url.path)
+
+    @rx.var
+    def visible_items(self) -> list[str]:
+        """Keys of the items the user may see, recomputed only when ``user`` changes."""
+        return [item.key for item in SIDEBAR.visible_items(self.permissions)]
+
+    @rx.var
+    def visible_sections(self) -> list[str]:
+        return sorted(
+            {item.section for item in SIDEBAR.visible_items(self.permissions)}
+        )
@@ -0,0 +1,355 @@
+"""Paginated variant of the appkit_user users table.
+
+The dialogs and row actions are bound to ``UserListState`` so that changes reload
+only the current page instead of the full user list. The role checkboxes of the
+dialogs are rendered from the static ``ALL_ROLES`` catalog, it is not part of the
+state.
+"""
+
+import reflex as rx
+
+import appkit_mantine as mn
+from appkit_ui.components.dialogs import (
+    delete_dialog,
+    dialog_buttons,
+    dialog_header,
+)
+from appkit_ui.components.form_inputs import form_field, hidden_field
+from appkit_user.user_management.components.user import loading
+
+from app.backend.user_repository import UserSortField
+from app.roles import ALL_ROLES, Role
+from app.states.user_states import ALL_ROLES_FILTER, UserListState, UserRow
+
+
+def role_checkbox(role: Role, user: UserRow | None = None) -> rx.Component:
+    return rx.box(
+        rx.tooltip(
+            rx.checkbox(
+                role.label,
+                name=f"role_{role.name}",
+                default_checked=(
+                    user.roles.contains(role.name) if user is not None else False
+                ),
+            ),
+            content=role.description,
+        ),
+        class_name="w-[30%] max-w-[30%] flex-grow",
+    )
+
+
+def user_form_fields(user: UserRow | None = None) -> rx.Component:
+    """Fields of the add/update dialogs, like appkit_user's ``user_form_fields``."""
+    is_edit_mode = user is not None
+
+    fields = [
+        hidden_field(
+            name="user_id",
+            default_value=user.user_id.to_string() if is_edit_mode else "",
+        ),
+        form_field(
+            name="name",
+            icon="user",
+            label="Name",
+            type="text",
+            default_value=user.name if is_edit_mode else "",
+            required=True,
+        ),
+        form_field(
+            name="email",
+            icon="mail",
+            label="Email",
+            hint="Die E-Mail-Adresse des Benutzers, wird für die Anmeldung verwendet.",
+            type="email",
+            default_value=user.email if is_edit_mode else "",
+            required=True,
+            pattern=r"^[a-zA-Z0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}$",
+        ),
+        form_field(
+            name="password",
+            icon="lock",
+            label="Passwort" if is_edit_mode else "Initiales Passwort",
+            type="password",
+            hint="Leer lassen, um das aktuelle Passwort beizubehalten",
+            default_value="",
+            required=False,
+        ),
+    ]
+
+    if is_edit_mode:
+        fields += [
+            rx.hstack(
+                rx.switch(name="is_active", default_checked=user.is_active),
+                rx.text("Aktiv", size="2"),
+                margin_top="9px",
+            ),
+            rx.hstack(
+                rx.switch(name="is_verified", default_checked=user.is_verified),
+                rx.text("Verifiziert", size="2"),
+            ),
+            rx.hstack(
+                rx.switch(name="is_admin", default_checked=user.is_admin),
+                rx.text("Superuser", size="2"),
+            ),
+        ]
+
+    fields.append(
+        rx.vstack(
+            rx.text("Berechtigungen", size="2", weight="bold"),
+            rx.flex(
+                *[role_checkbox(role, user) for role in ALL_ROLES],
+                class_name="w-full flex-wrap gap-2 mt-2",
+            ),
+            spacing="0",
+            margin="6px 0",
+            width="100%",
+        )
+    )
+
+    return rx.flex(
+        *fields,
+        class_name="flex-col gap-3" if is_edit_mode else "flex-col gap-2",
+    )
+
+
+def add_user_button() -> rx.Component:
+    return rx.dialog.root(
+        rx.dialog.trigger(
+            rx.button(
+                rx.icon("plus", size=19),
+                rx.text("Benutzer hinzufügen", display=["none", "none", "block"]),
+            ),
+        ),
+        rx.dialog.content(
+            dialog_header(
+                icon="users",
+                title="Benutzer hinzufügen",
+                description="Bitte füllen Sie das Formular mit den Benutzerdaten aus.",
+            ),
+            rx.flex(
+                rx.form.root(
+                    user_form_fields(),
+                    dialog_buttons(
+                        submit_text="Benutzer speichern",
+                    ),
+                    on_submit=UserListState.create_user,
+                    reset_on_submit=False,
+                ),
+                class_name="w-full flex-col gap-4",
+            ),
+            class_name="dialog",
+        ),
+    )
+
+
+def update_user_button(user: UserRow) -> rx.Component:
+    return rx.dialog.root(
+        rx.dialog.trigger(
+            rx.icon_button(
+                rx.icon("square-pen", size=19),
+                on_click=lambda: UserListState.select_user(user.user_id),
+                variant="surface",
+            ),
+        ),
+        rx.dialog.content(
+            dialog_header(
+                icon="users",
+                title="Benutzer bearbeiten",
+                description="Aktualisieren Sie die Benutzerdaten",
+            ),
+            rx.flex(
+                rx.form.root(
+                    user_form_fields(user=user),
+                    dialog_buttons(
+                        submit_text="Benutzer aktualisieren",
+                    ),
+                    on_submit=UserListState.update_user,
+                    reset_on_submit=False,
+                ),
+                direction="column",
+                spacing="4",
+            ),
+            class_name="dialog",
+        ),
+    )
+
+
+def _status_icon(value: rx.Var[bool]) -> rx.Component:
+    return rx.cond(
+        value,
+        rx.icon("user-check", color="green", size=21),
+        rx.icon("user-x", color="crimson", size=21),
+    )
+
+
+def users_table_row(
+    user: UserRow, additional_components: list | None = None
+) -> rx.Component:
+    rendered_additional_components = [
+        component_func(user=user) for component_func in additional_components or []
+    ]
+
+    return mn.table.tr(
+        mn.table.td(
+            rx.cond(user.name, user.name, ""),
+            class_name="whitespace-nowrap",
+        ),
+        mn.table.td(
+            rx.cond(user.email, user.email, ""),
+            class_name="whitespace-nowrap",
+        ),
+        mn.table.td(_status_icon(user.is_active), class_name="text-center"),
+        mn.table.td(_status_icon(user.is_verified), class_name="text-center"),
+        mn.table.td(_status_icon(user.is_admin), class_name="text-center"),
+        mn.table.td(
+            rx.hstack(
+                *rendered_additional_components,
+                update_user_button(user=user),
+                delete_dialog(
+                    title="Löschen bestätigen",
+                    content=rx.cond(user.email, user.email, "Unbekannter Benutzer"),
+                    on_click=lambda: UserListState.delete_user(user.user_id),
+                    icon_button=True,
+                    variant="surface",
+                    color_scheme="crimson",
+                ),
+                class_name="whitespace-nowrap",
+            ),
+        ),
+        class_name="justify-center items-center",
+    )
+
+
+def sortable_header(label: str, sort_field: UserSortField, **kwargs) -> rx.Component:
+    is_sorted = UserListState.sort_field == sort_field.value
+    return mn.table.th(
+        rx.hstack(
+            rx.text(label),
+            rx.cond(
+                is_sorted,
+                rx.cond(
+                    UserListState.sort_descending,
+                    rx.icon("chevron-down", size=15),
+                    rx.icon("chevron-up", size=15),
+                ),
+            ),
+            align="center",
+            spacing="1",
+            class_name="cursor-pointer select-none",
+        ),
+        on_click=UserListState.set_sort(sort_field.value),
+        **kwargs,
+    )
+
+
+def role_filter() -> rx.Component:
+    return rx.select.root(
+        rx.select.trigger(placeholder="Alle Rollen", width="16em"),
+        rx.select.content(
+            rx.select.item("Alle Rollen", value=ALL_ROLES_FILTER),
+            *[
+                rx.select.item(
+                    f"{role.label} ({UserListState.role_counts[role.name]})",
+                    value=role.name,
+                )
+                for role in ALL_ROLES
+            ],
+        ),
+        value=rx.cond(UserListState.role, UserListState.role, ALL_ROLES_FILTER),
+        on_change=UserListState.set_role,
+    )
+
+
+def users_toolbar() -> rx.Component:
+    return rx.flex(
+        add_user_button(),
+        rx.debounce_input(
+            rx.input(
+                rx.input.slot(rx.icon("search", size=16)),
+                placeholder="Name oder E-Mail suchen...",
+                value=UserListState.search,
+                on_change=UserListState.set_search,
+                width="18em",
+            ),
+            debounce_timeout=300,
+        ),
+        rx.hstack(
+            rx.switch(
+                checked=UserListState.active_only,
+                on_change=UserListState.set_active_only,
+            ),
+            rx.text("Nur aktive", size="2"),
+            align="center",
+        ),
+        role_filter(),
+        rx.spacer(),
+        class_name="w-full items-center gap-4",
+    )
+
+
+def users_pagination() -> rx.Component:
+    return rx.hstack(
+        rx.spacer(),
+        rx.icon_button(
+            rx.icon("chevron-left", size=17),
+            variant="surface",
+            disabled=~UserListState.has_previous_page | UserListState.is_loading,
+            on_click=UserListState.previous_page,
+        ),
+        rx.text(f"Seite {UserListState.page}", size="2"),
+        rx.icon_button(
+            rx.icon("chevron-right", size=17),
+            variant="surface",
+            disabled=~UserListState.has_next_page | UserListState.is_loading,
+            on_click=UserListState.next_page,
+        ),
+        align="center",
+        width="100%",
+    )
+
+
+def users_table(additional_components: list | None = None) -> rx.Component:
+    """Create the paginated users table.
+
+    Args:
+        additional_components: Optional list of component functions that will be
+                              rendered to the left of the edit button for each user.
+                              Each function will be called with (user=user)
+    """
+
+    def render_user_row(user: UserRow) -> rx.Component:
+        return users_table_row(
+            user=user,
+            additional_components=additional_components,
+        )
+
+    return rx.fragment(
+        users_toolbar(),
+        mn.table(
+            mn.table.thead(
+                mn.table.tr(
+                    sortable_header("Name", UserSortField.NAME),
+                    sortable_header("Email", UserSortField.EMAIL, width="auto"),
+                    mn.table.th("Aktiv", width="90px"),
+                    mn.table.th("Verifiziert", width="90px"),
+                    mn.table.th("Admin", width="90px"),
+                    mn.table.th("", width="110px"),
+                ),
+            ),
+            rx.cond(
+                UserListState.is_loading,
+                mn.table.tbody(loading()),
+                mn.table.tbody(
+                    rx.foreach(
+                        UserListState.users,
+                        render_user_row,
+                    )
+                ),
+            ),
+            highlight_on_hover=True,
+            sticky_header=True,
+            class_name="w-full",
+            on_mount=UserListState.first_page,
+        ),
+        users_pagination(),
+    )
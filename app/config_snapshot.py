@@ -0,0 +1,190 @@
+"""Compiled configuration snapshot for fast worker and Alembic starts.
+
+Loading the configuration parses every ``configuration/*.yaml`` file and resolves
+every ``secret:`` reference, possibly against Azure Key Vault. With a snapshot
+the first process stores the validated configuration and all later processes
+(gunicorn workers, Alembic runs) load it instead.
+
+The snapshot is opt-in: set ``CONFIG_SNAPSHOT`` to the snapshot file and
+``CONFIG_SNAPSHOT_KEY`` to a Fernet key (``Fernet.generate_key()``). The file is
+Fernet-encrypted, so the resolved secrets are never stored in plain text and any
+modification of the file is detected. It is rebuilt automatically when the
+fingerprint of its inputs changes: the YAML files of the active profiles, the
+``PROFILES``, ``SECRET_PROVIDER`` and ``AZURE_KEY_VAULT_URL`` settings, the env
+files, and all environment variables that can override settings or hold local
+secrets.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from enum import Enum
+from pathlib import Path
+from typing import Any, Final
+
+from cryptography.fernet import Fernet, InvalidToken
+from pydantic import BaseModel, SecretStr, ValidationError
+
+from appkit_commons import CONFIGURATION_PATH
+from appkit_commons.configuration.configuration import (
+    ApplicationConfig,
+    Configuration,
+)
+from appkit_commons.registry import service_registry
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SNAPSHOT_ENV: Final = "CONFIG_SNAPSHOT"
+CONFIG_SNAPSHOT_KEY_ENV: Final = "CONFIG_SNAPSHOT_KEY"  # noqa: S105
+SNAPSHOT_VERSION: Final = 1
+
+# top level fields of Configuration, env vars starting with them override settings
+_ENV_OVERRIDE_PREFIXES: Final = ("app", "reflex", "server", "profile")
+_SECRET_REFERENCE: Final = re.compile(r"secret:([\w.-]+)", re.IGNORECASE)
+
+
+def _snapshot_settings() -> tuple[Path, Fernet] | None:
+    path = os.getenv(CONFIG_SNAPSHOT_ENV)
+    key = os.getenv(CONFIG_SNAPSHOT_KEY_ENV)
+    if not path:
+        return None
+    if not key:
+        logger.warning(
+            "%s is set without %s, configuration snapshot disabled",
+            CONFIG_SNAPSHOT_ENV,
+            CONFIG_SNAPSHOT_KEY_ENV,
+        )
+        return None
+    return Path(path), Fernet(key.encode())
+
+
+def _profiles() -> list[str]:
+    return [profile.strip() for profile in os.getenv("PROFILES", "").split(",")]
+
+
+def fingerprint(env_file: str) -> str:
+    """Hash every input the configuration is built from."""
+    digest = hashlib.sha256()
+
+    def add(label: str, value: str | bytes | None) -> None:
+        data = value.encode() if isinstance(value, str) else value or b""
+        digest.update(f"{label}:{len(data)}:".encode())
+        digest.update(data)
+
+    add("version", str(SNAPSHOT_VERSION))
+    add("profiles", os.getenv("PROFILES", ""))
+    add("secret_provider", os.getenv("SECRET_PROVIDER", ""))
+    add("key_vault", os.getenv("AZURE_KEY_VAULT_URL", ""))
+
+    yaml_files = [
+        CONFIGURATION_PATH / "config.yaml",
+        *(CONFIGURATION_PATH / f"config.{profile}.yaml" for profile in _profiles()),
+    ]
+    yaml_texts = []
+    for path in [*yaml_files, Path(".env"), Path(env_file)]:
+        content = path.read_bytes() if path.is_file() else None
+        add(str(path), content)
+        if content and path.suffix == ".yaml":
+            yaml_texts.append(content.decode("utf-8", errors="replace"))
+
+    secret_keys = {
+        key
+        for text in yaml_texts
+        for reference in _SECRET_REFERENCE.findall(text)
+        for key in (
+            reference,
+            reference.upper(),
+            reference.replace("-", "_").upper(),
+            reference.replace("-", "_").lower(),
+        )
+    }
+    for name in sorted(os.environ):
+        if name in secret_keys or name.lower().startswith(_ENV_OVERRIDE_PREFIXES):
+            add(f"env:{name}", os.environ[name])
+
+    return digest.hexdigest()
+
+
+def _plain(value: Any) -> Any:
+    """Convert a dumped configuration to JSON, revealing secret values."""
+    if isinstance(value, SecretStr):
+        return value.get_secret_value()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, BaseModel):
+        return _plain(value.model_dump(by_alias=True))
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, list | tuple | set):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _register[T: ApplicationConfig](configuration: Configuration[T]) -> None:
+    """Register the configuration like ``ServiceRegistry.configure`` does."""
+    registry = service_registry()
+    registry.register_as(Configuration, configuration)
+    registry._register_config_recursively(configuration)  # noqa: SLF001
+
+
+def load_snapshot[T: ApplicationConfig](
+    config_class: type[T], env_file: str
+) -> Configuration[T] | None:
+    """Load and register the configuration from a valid, up-to-date snapshot."""
+    settings = _snapshot_settings()
+    if settings is None:
+        return None
+    path, fernet = settings
+
+    if not path.is_file():
+        return None
+
+    try:
+        payload = json.loads(fernet.decrypt(path.read_bytes()))
+    except (InvalidToken, ValueError):
+        logger.warning("Configuration snapshot %s is invalid, ignoring it", path)
+        return None
+
+    if payload.get("fingerprint") != fingerprint(env_file):
+        logger.info("Configuration snapshot %s is outdated", path)
+        return None
+
+    try:
+        # model_validate does not run the settings sources (env, yaml, secrets)
+        configuration = Configuration[config_class].model_validate(payload["data"])
+    except ValidationError:
+        logger.warning("Configuration snapshot %s does not validate", path)
+        return None
+
+    _register(configuration)
+    logger.info("Configuration loaded from snapshot %s", path)
+    return configuration
+
+
+def save_snapshot[T: ApplicationConfig](
+    configuration: Configuration[T], env_file: str
+) -> None:
+    """Store the configuration as encrypted snapshot, if snapshots are enabled."""
+    settings = _snapshot_settings()
+    if settings is None:
+        return
+    path, fernet = settings
+
+    payload = {
+        "fingerprint": fingerprint(env_file),
+        "data": _plain(configuration),
+    }
+    token = fernet.encrypt(json.dumps(payload).encode())
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # atomic replace, concurrently starting workers never read a partial file
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as file:
+        file.write(token)
+    Path(file.name).chmod(0o600)
+    Path(file.name).replace(path)
+    logger.info("Configuration snapshot written to %s", path)
@@ -1,24 +1,250 @@
 import logging
 from functools import lru_cache
+from typing import Literal
 
+from pydantic import Field, SecretStr, field_validator
+from pydantic_settings import SettingsConfigDict
+
+from appkit_commons.configuration.base import BaseConfig
 from appkit_commons.configuration.configuration import (
     ApplicationConfig,
     Configuration,
 )
 from appkit_commons.registry import service_registry
+from appkit_commons.security import DEFAULT_PBKDF2_ITERATIONS
 from appkit_user.configuration import AuthenticationConfiguration
 
+from app.config_snapshot import load_snapshot, save_snapshot
+
 logger = logging.getLogger(__name__)
 
+ENV_FILE = "/.env"
+
+
+class SessionReaperConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_session_reaper_")
+
+    enabled: bool = True
+    interval: int = 300  # seconds between two runs
+    batch_size: int = 1000  # rows deleted per transaction
+    max_batches: int = 50  # per table and run, bounds the work of a single run
+
+
+class SessionCacheConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_session_cache_")
+
+    enabled: bool = True
+    max_entries: int = 10_000
+    ttl: int = 300  # seconds, capped by authentication.auth_token_refresh_delta
+
+
+class InvalidationConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_invalidation_")
+
+    enabled: bool = True
+    # use LISTEN/NOTIFY even with a single worker, e.g. to test against Postgres
+    force: bool = False
+    channel: str = "projectkit_invalidation"
+
+
+class StateManagerConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_state_manager_")
+
+    enabled: bool = True  # with several workers and without redis
+    # use the Postgres state manager even with a single worker
+    force: bool = False
+    pool_size: int = 10  # connections per worker to load and write states
+    lock_timeout: int = 10_000  # milliseconds to wait for the state of a client
+    write_back_delay: float = 0.05  # seconds, events within are written at once
+    max_hold: float = 1.0  # seconds a worker holds a client before writing
+    compress_min_size: int = 1024  # bytes, smaller states are stored as is
+    compression_level: int = 1  # zlib
+    purge_interval: int = 300  # seconds between two purges of expired states
+    purge_batch_size: int = 1000  # rows deleted per transaction
+
+
+class LastSeenConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_last_seen_")
+
+    enabled: bool = True
+    flush_interval: float = 5.0  # seconds between two checks of the buffer
+    max_staleness: float = 60.0  # seconds a timestamp waits at most to be written
+    max_pending: int = 1000  # users, a full buffer is written at once
+    batch_size: int = 500  # users per UPDATE statement
+
+
+class DatabasePoolConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_database_pool_")
+
+    pool_size: int | None = None  # connections kept open, default database.pool_size
+    max_overflow: int | None = None  # beyond pool_size, default database.max_overflow
+    pool_timeout: float = 30.0  # seconds to wait for a free connection
+    pool_recycle: int = 1800  # seconds, -1 to disable
+    pool_pre_ping: bool = True
+    pool_use_lifo: bool = True  # lets surplus idle connections time out
+    statement_timeout: int = 0  # milliseconds, 0 to disable
+    prepare_threshold: int | None = 5  # executions before psycopg prepares, None off
+    prepared_statement_cache_size: int = 100  # prepared statements per connection
+
+
+class PasswordHashingConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_password_hashing_")
+
+    enabled: bool = True  # off: hash inline in the event loop, like appkit_user
+    method: str = "scrypt:32768:8:1"  # of new hashes, e.g. scrypt or pbkdf2:sha256
+    salt_length: int = 16
+    rehash_on_login: bool = True  # replace hashes of another method on login
+    workers: int = 2  # processes per worker, scrypt:32768:8:1 needs 32 MB per hash
+    max_pending: int = 32  # hashes running or queued per worker
+    queue_timeout: float = 5.0  # seconds to wait when max_pending is reached
+
+    @field_validator("method")
+    @classmethod
+    def _full_method(cls, method: str) -> str:
+        """The method with all parameters, as it is stored in front of a hash."""
+        name, *args = method.split(":")
+        if name == "scrypt" and not args:
+            return "scrypt:32768:8:1"
+        if name == "scrypt" and len(args) == 3 and all(map(str.isdigit, args)):  # noqa: PLR2004
+            return method
+        if name == "pbkdf2" and len(args) <= 1:
+            return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+        if name == "pbkdf2" and len(args) == 2 and args[1].isdigit():  # noqa: PLR2004
+            return method
+        msg = f"invalid password hash method {method!r}"
+        raise ValueError(msg)
+
+
+class OAuthTokenConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_oauth_tokens_")
+
+    cache_ttl: int = 60  # seconds a decrypted token is kept, 0 to disable
+    cache_max_entries: int = 10_000
+    lazy_load: bool = True  # load the encrypted token columns only when read
+    # keys replaced by database.encryption_key, still accepted for decryption
+    previous_keys: list[SecretStr] = Field(default_factory=list)
+    rotate: bool = True  # re-encrypt tokens of previous keys in the background
+    rotation_interval: int = 3600  # seconds between two runs
+    rotation_batch_size: int = 500  # accounts re-encrypted per transaction
+    rotation_pause: float = 0.1  # seconds between two batches
+
+
+class MigrationConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_migration_")
+
+    online: bool = True  # off: all migrations in one transaction, without timeouts
+    advisory_lock_id: int = 4_711_2026  # held while migrating, shared by containers
+    lock_wait: int = 600  # seconds to wait for the migration of another container
+    lock_timeout: int = 3000  # milliseconds a migration waits for a table lock
+    statement_timeout: int = 60_000  # milliseconds, 0 to disable
+    index_statement_timeout: int = 0  # milliseconds, of concurrent index builds
+    retries: int = 5  # of a migration that timed out waiting for a lock
+    retry_delay: float = 2.0  # seconds, doubled with every retry
+    backfill_batch_size: int = 5000  # rows updated per transaction
+    backfill_pause: float = 0.1  # seconds between two batches
+
+
+def _default_cache_control() -> dict[str, str]:
+    immutable = "public, max-age=31536000, immutable"
+    return {
+        "/assets/": immutable,  # hashed bundles of the exported frontend
+        "/dist/": immutable,  # hashed static assets (build-assets)
+        "/fonts/": immutable,
+        "/_upload/": "private, no-cache",
+        "/ping": "no-store",
+        "/_health": "no-store",
+        "/metrics": "no-store",
+    }
+
+
+class MiddlewareConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_middleware_")
+
+    trust_forwarded_proto: bool = True  # behind a TLS terminating proxy
+    https_redirect: bool = False  # redirect plain http requests with 308
+    hsts_max_age: int = 31_536_000  # seconds, 0 disables the HSTS header
+    hsts_include_subdomains: bool = True
+    hsts_preload: bool = False
+
+    compression: bool = True
+    compression_min_size: int = 1024  # bytes, smaller responses are sent as is
+    compression_exclude: list[str] = Field(default_factory=lambda: ["/_event"])
+    gzip_level: int = 6
+    brotli_quality: int = 4  # only used with the brotli package installed
+
+    etag: bool = True
+    etag_max_size: int = 1_048_576  # bytes, larger responses get no computed ETag
+
+    # path prefix -> Cache-Control of successful responses, longest prefix wins
+    cache_control: dict[str, str] = Field(default_factory=_default_cache_control)
+
+
+class TracingConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_tracing_")
+
+    enabled: bool = False
+    exporter: Literal["file", "otlp"] = "file"
+    file: str = "traces/spans.{pid}.jsonl"  # {pid} is replaced by the process id
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    service_name: str = "projectkit"
+    sample_rate: float = 1.0  # fraction of the traces exported
+
+    events: bool = True  # websocket event handling
+    state: bool = True  # state (de)serialization and deltas
+    middleware: bool = True  # http requests and the edge middleware layers
+    queries: bool = True  # sqlalchemy statements
+
+    slow_event_threshold: float = 500.0  # milliseconds, 0 disables the slow event log
+    max_statement_length: int = 300
+    batch_size: int = 256  # spans per export
+    flush_interval: float = 2.0  # seconds between two exports
+
+
+class MetricsConfig(BaseConfig):
+    model_config = SettingsConfigDict(env_prefix="app_metrics_")
+
+    enabled: bool = True
+    path: str = "/metrics"
+    namespace: str = "projectkit"  # prefix of the metric names
+    # clients allowed without token, the address of a proxy in front counts
+    allowed_networks: list[str] = Field(
+        default_factory=lambda: ["127.0.0.1/32", "::1/128"]
+    )
+    # scrapers from other addresses send "Authorization: Bearer <token>"
+    bearer_token: SecretStr | None = None
+    # shared by the workers of a server, default: a temp dir per server process
+    multiprocess_dir: str | None = None
+    flush_interval: float = 5.0  # seconds between two snapshots of a worker
+
 
 class AppConfig(ApplicationConfig):
     authentication: AuthenticationConfiguration
+    session_reaper: SessionReaperConfig = Field(default_factory=SessionReaperConfig)
+    session_cache: SessionCacheConfig = Field(default_factory=SessionCacheConfig)
+    invalidation: InvalidationConfig = Field(default_factory=InvalidationConfig)
+    state_manager: StateManagerConfig = Field(default_factory=StateManagerConfig)
+    last_seen: LastSeenConfig = Field(default_factory=LastSeenConfig)
+    database_pool: DatabasePoolConfig = Field(default_factory=DatabasePoolConfig)
+    middleware: MiddlewareConfig = Field(default_factory=MiddlewareConfig)
+    tracing: TracingConfig = Field(default_factory=TracingConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    password_hashing: PasswordHashingConfig = Field(
+        default_factory=PasswordHashingConfig
+    )
+    oauth_tokens: OAuthTokenConfig = Field(default_factory=OAuthTokenConfig)
+    migration: MigrationConfig = Field(default_factory=MigrationConfig)
 
 
 @lru_cache(maxsize=1)
 def configure() -> Configuration[AppConfig]:
     logger.debug("--- Configuring application settings ---")
-    return service_registry().configure(
+    configuration = load_snapshot(AppConfig, env_file=ENV_FILE)
+    if configuration is not None:
+        return configuration
+
+    configuration = service_registry().configure(
         AppConfig,
-        env_file="/.env",
+        env_file=ENV_FILE,
     )
+    save_snapshot(configuration, env_file=ENV_FILE)
+    return configuration
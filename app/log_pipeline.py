@@ -0,0 +1,215 @@
+"""Non-blocking logging pipeline, configured in ``configuration/logging.async.yaml``.
+
+- :class:`AsyncQueueHandler` only puts the records on a bounded queue, a
+  ``QueueListener`` thread formats and writes them. The event loop never waits
+  on log I/O, when the queue is full records are dropped and counted.
+- :class:`JsonFormatter` writes one JSON object per line, without ANSI colors.
+- :class:`RateLimitFilter` samples and rate limits the records per logger
+  before they are queued. Warnings and errors always pass.
+
+Select the pipeline with ``app.logging: logging.async.yaml``. Only the standard
+library may be imported here, the module is loaded by ``logging.config``.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Final
+
+# attributes of every LogRecord, everything else was passed with ``extra``
+_RECORD_ATTRIBUTES: Final = frozenset(
+    {
+        *logging.LogRecord("", 0, "", 0, "", (), None).__dict__,
+        "message",
+        "asctime",
+        "taskName",
+    }
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single line JSON objects.
+
+    ``fields`` are static fields added to every record (service name,
+    environment). Values passed with ``extra`` are added as well.
+    """
+
+    def __init__(
+        self,
+        fields: Mapping[str, Any] | None = None,
+        ensure_ascii: bool = False,
+    ) -> None:
+        super().__init__()
+        self.fields = dict(fields or {})
+        self.ensure_ascii = ensure_ascii
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+            **self.fields,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        entry.update(
+            (key, value)
+            for key, value in record.__dict__.items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_")
+        )
+        return json.dumps(entry, default=str, ensure_ascii=self.ensure_ascii)
+
+
+@dataclass(slots=True)
+class _Bucket:
+    rate: float
+    burst: float
+    sample: float
+    tokens: float
+    updated: float
+    suppressed: int = 0
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket rate limit and sampling per logger.
+
+    ``rate`` records per second with bursts up to ``burst`` records pass per
+    logger, ``sample`` is the fraction of records kept before the rate limit.
+    ``loggers`` overrides these per logger name prefix, e.g.
+    ``{"uvicorn.access": {"sample": 0.1}}``. Records of ``pass_level`` and above
+    are never dropped. The number of dropped records is added to the next
+    record passing for the logger as ``suppressed``.
+    """
+
+    def __init__(
+        self,
+        rate: float = 100.0,
+        burst: float = 500.0,
+        sample: float = 1.0,
+        pass_level: int | str = logging.WARNING,
+        loggers: Mapping[str, Mapping[str, float]] | None = None,
+    ) -> None:
+        super().__init__()
+        self.default = {"rate": rate, "burst": burst, "sample": sample}
+        self.pass_level = logging._checkLevel(pass_level)  # noqa: SLF001
+        # longest prefix first, the first matching prefix wins
+        self.overrides = sorted(
+            (loggers or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self._buckets: dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name: str, now: float) -> _Bucket:
+        limits = self.default
+        for prefix, override in self.overrides:
+            if name == prefix or name.startswith(prefix + "."):
+                limits = {**self.default, **override}
+                break
+        bucket = _Bucket(
+            rate=float(limits["rate"]),
+            burst=float(limits["burst"]),
+            sample=float(limits["sample"]),
+            tokens=float(limits["burst"]),
+            updated=now,
+        )
+        self._buckets[name] = bucket
+        return bucket
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.pass_level:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name) or self._bucket(record.name, now)
+            if bucket.sample < 1.0 and random.random() >= bucket.sample:  # noqa: S311
+                bucket.suppressed += 1
+                return False
+
+            bucket.tokens = min(
+                bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate
+            )
+            bucket.updated = now
+            if bucket.tokens < 1.0:
+                bucket.suppressed += 1
+                return False
+
+            bucket.tokens -= 1.0
+            if bucket.suppressed:
+                record.suppressed = bucket.suppressed
+                bucket.suppressed = 0
+        return True
+
+
+def bounded_queue(maxsize: int = 10_000) -> queue.Queue:
+    """Queue of the :class:`AsyncQueueHandler`, usable as ``queue`` factory."""
+    return queue.Queue(maxsize=maxsize)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler starting its listener and never blocking the caller.
+
+    Configure it with ``logging.config`` like the plain ``QueueHandler``
+    (``handlers``, ``queue``, ``respect_handler_level``). The listener is started
+    when ``logging.config`` attaches it and stopped, after draining the queue,
+    when the handler is closed, at the latest by ``logging.shutdown`` at exit.
+    """
+
+    def __init__(self, record_queue: queue.Queue) -> None:
+        # set before QueueHandler.__init__ assigns ``listener``
+        self._listener: logging.handlers.QueueListener | None = None
+        self.dropped = 0
+        super().__init__(record_queue)
+
+    @property
+    def listener(self) -> logging.handlers.QueueListener | None:
+        return self._listener
+
+    @listener.setter
+    def listener(self, listener: logging.handlers.QueueListener | None) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+        self._listener = listener
+        if listener is not None:
+            listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the arguments, but leave the formatting to the listener.
+
+        ``QueueHandler.prepare`` formats the record in the calling thread and
+        folds the traceback into the message. Only the parts that cannot cross
+        threads are resolved here.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        self.listener = None
+        super().close()
@@ -0,0 +1,425 @@
+"""Pure ASGI middleware stack in front of the reflex backend.
+
+The stack is configured by the ``app.middleware`` section and installed with
+:func:`edge_middleware` as ``api_transformer``. From the outside in:
+
+- :class:`HTTPSMiddleware` trusts ``X-Forwarded-Proto`` of the proxy, optionally
+  redirects plain HTTP and adds the HSTS header.
+- :class:`CacheControlMiddleware` sets ``Cache-Control`` by path prefix.
+- :class:`CompressionMiddleware` compresses responses with brotli or gzip.
+- :class:`ETagMiddleware` answers conditional GETs with ``304``, it sits inside
+  the compression to see the uncompressed body and its ``Content-Length``.
+
+All of them only look at ``http`` scopes, websocket connections pass through
+untouched. Response bodies are streamed, only :class:`ETagMiddleware` and
+:class:`CompressionMiddleware` hold back a bounded prefix of a response (up to
+``etag_max_size`` and ``compression_min_size`` bytes).
+"""
+
+import hashlib
+import zlib
+from collections.abc import Iterable
+from typing import Final
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.backend.tracing import trace_asgi
+from app.configuration import MiddlewareConfig
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES: Final = (
+    b"text/",
+    b"application/json",
+    b"application/javascript",
+    b"application/xml",
+    b"image/svg+xml",
+)
+
+RawHeaders = list[tuple[bytes, bytes]]
+
+
+# the middleware works on the raw header lists, building starlette's Headers
+# objects for every message costs more than the rest of the stack
+
+
+def _header(headers: RawHeaders, name: bytes) -> bytes | None:
+    """Value of the lower case header ``name``."""
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: RawHeaders, *names: bytes) -> RawHeaders:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _with_header(message: Message, name: bytes, value: bytes) -> Message:
+    """Copy of the response start ``message`` with the header replaced."""
+    headers = _without(message.get("headers", []), name)
+    headers.append((name, value))
+    return {**message, "headers": headers}
+
+
+def _path_matches(path: str, prefixes: Iterable[str]) -> bool:
+    return any(path.startswith(prefix) for prefix in prefixes)
+
+
+class HTTPSMiddleware:
+    def __init__(self, app: ASGIApp, config: MiddlewareConfig) -> None:
+        self.app = app
+        self.trust_forwarded_proto = config.trust_forwarded_proto
+        self.redirect = config.https_redirect
+        self.hsts: bytes | None = None
+        if config.hsts_max_age > 0:
+            hsts = f"max-age={config.hsts_max_age}"
+            if config.hsts_include_subdomains:
+                hsts += "; includeSubDomains"
+            if config.hsts_preload:
+                hsts += "; preload"
+            self.hsts = hsts.encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        if (
+            self.trust_forwarded_proto
+            and _header(scope["headers"], b"x-forwarded-proto") == b"https"
+        ):
+            scope["scheme"] = "https" if scope["type"] == "http" else "wss"
+
+        secure = scope["scheme"] in ("https", "wss")
+        if scope["type"] == "websocket":
+            await self.app(scope, receive, send)
+            return
+
+        if not secure and self.redirect:
+            await self._redirect(scope, send)
+            return
+
+        if not secure or self.hsts is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_hsts(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = _with_header(message, b"strict-transport-security", self.hsts)
+            await send(message)
+
+        await self.app(scope, receive, send_with_hsts)
+
+    @staticmethod
+    async def _redirect(scope: Scope, send: Send) -> None:
+        host = (_header(scope["headers"], b"host") or b"").decode("latin-1")
+        query = scope.get("query_string", b"")
+        url = f"https://{host}{scope.get('root_path', '')}{scope['path']}"
+        if query:
+            url += "?" + query.decode("latin-1")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 308,
+                "headers": [(b"location", url.encode()), (b"content-length", b"0")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+
+class CacheControlMiddleware:
+    """Set ``Cache-Control`` of successful responses by longest path prefix."""
+
+    def __init__(self, app: ASGIApp, rules: dict[str, str]) -> None:
+        self.app = app
+        self.rules = sorted(
+            ((prefix, value.encode()) for prefix, value in rules.items()),
+            key=lambda rule: -len(rule[0]),
+        )
+
+    def _lookup(self, path: str) -> bytes | None:
+        for prefix, value in self.rules:
+            if path.startswith(prefix):
+                return value
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        value = self._lookup(scope["path"]) if scope["type"] == "http" else None
+        if value is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_control(message: Message) -> None:
+            if message["type"] == "http.response.start" and (
+                200 <= message["status"] < 300 or message["status"] == 304  # noqa: PLR2004
+            ):
+                message = _with_header(message, b"cache-control", value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_control)
+
+
+def _etag_matches(etag: bytes, if_none_match: bytes) -> bool:
+    if if_none_match.strip() == b"*":
+        return True
+    # weak comparison, RFC 9110 13.1.2
+    candidates = {tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")}
+    return etag.removeprefix(b"W/") in candidates
+
+
+def _not_modified(start: Message) -> Message:
+    headers = _without(
+        start.get("headers", []),
+        b"content-length",
+        b"content-type",
+        b"content-encoding",
+    )
+    return {"type": "http.response.start", "status": 304, "headers": headers}
+
+
+class ETagMiddleware:
+    """Conditional GET for ``GET``/``HEAD`` requests.
+
+    Responses that already carry an ``ETag`` (static and uploaded files) are
+    compared directly. For other ``200`` responses with a ``Content-Length`` of
+    at most ``max_size`` bytes a weak ``ETag`` is computed from the body, larger
+    or streamed responses pass through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        responder = _ETagResponder(
+            send,
+            if_none_match=_header(scope["headers"], b"if-none-match"),
+            max_size=self.max_size if scope["method"] == "GET" else -1,
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class _ETagResponder:
+    def __init__(self, send: Send, if_none_match: bytes | None, max_size: int) -> None:
+        self._send = send
+        self.if_none_match = if_none_match
+        self.max_size = max_size
+        self.start: Message | None = None
+        self.chunks: list[bytes] = []
+        self.mode = "pass"
+
+    def _matches(self, etag: bytes) -> bool:
+        return self.if_none_match is not None and _etag_matches(
+            etag, self.if_none_match
+        )
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            await self._start(message)
+        elif self.mode == "pass":
+            await self._send(message)
+        elif self.mode == "buffer":
+            self.chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._send_buffered(b"".join(self.chunks))
+        elif not message.get("more_body", False):
+            # not modified, the body is dropped
+            await self._send({"type": "http.response.body", "body": b""})
+
+    async def _start(self, message: Message) -> None:
+        if message["status"] != 200:  # noqa: PLR2004
+            await self._send(message)
+            return
+
+        headers = message.get("headers", [])
+        if etag := _header(headers, b"etag"):
+            if self._matches(etag):
+                self.mode = "not_modified"
+                message = _not_modified(message)
+            await self._send(message)
+            return
+
+        length = _header(headers, b"content-length")
+        if length is not None and int(length) <= self.max_size:
+            self.mode = "buffer"
+            self.start = message
+        else:
+            await self._send(message)
+
+    async def _send_buffered(self, body: bytes) -> None:
+        etag = b'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest().encode()
+        start = self.start
+        if self._matches(etag):
+            start, body = _not_modified(start), b""
+        await self._send(_with_header(start, b"etag", etag))
+        await self._send({"type": "http.response.body", "body": body})
+
+
+class _Compressor:
+    def __init__(self, encoding: bytes, config: MiddlewareConfig) -> None:
+        self.encoding = encoding
+        if encoding == b"br":
+            self._brotli = brotli.Compressor(quality=config.brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(config.gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, *, final: bool) -> bytes:
+        if self.encoding == b"br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Streaming brotli/gzip compression of HTTP responses.
+
+    Responses smaller than ``compression_min_size``, already encoded responses,
+    ranges, server-sent events and non-text content types are sent unchanged.
+    Each body chunk is compressed and flushed on its own, so streamed responses
+    are never held back beyond the size threshold.
+    """
+
+    def __init__(self, app: ASGIApp, config: MiddlewareConfig) -> None:
+        self.app = app
+        self.config = config
+        self.encodings = (b"br", b"gzip") if brotli is not None else (b"gzip",)
+
+    def _encoding(self, scope: Scope) -> bytes | None:
+        accepted = _header(scope["headers"], b"accept-encoding")
+        if not accepted:
+            return None
+        tokens = {token.split(b";")[0].strip() for token in accepted.split(b",")}
+        return next(
+            (encoding for encoding in self.encodings if encoding in tokens), None
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if (
+            scope["type"] == "http"
+            and scope["method"] != "HEAD"
+            and not _path_matches(scope["path"], self.config.compression_exclude)
+        ):
+            encoding = self._encoding(scope)
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding, self.config)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: bytes, config: MiddlewareConfig) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.config = config
+        self.start: Message | None = None
+        self.pending: list[bytes] = []
+        self.pending_size = 0
+        self.compressor: _Compressor | None = None
+        self.mode = "pass"
+
+    def _compressible(self, message: Message) -> bool:
+        status = message["status"]
+        if not 200 <= status < 300 or status == 206:  # noqa: PLR2004
+            return False
+
+        headers = message.get("headers", [])
+        content_type = _header(headers, b"content-type") or b""
+        length = _header(headers, b"content-length")
+        return (
+            content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith(b"text/event-stream")
+            and _header(headers, b"content-encoding") is None
+            and _header(headers, b"content-range") is None
+            and (length is None or int(length) >= self.config.compression_min_size)
+        )
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if self._compressible(message):
+                self.mode = "undecided"
+                self.start = message
+            else:
+                await self._send(message)
+            return
+
+        if self.mode == "pass":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.mode == "undecided":
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if self.pending_size < self.config.compression_min_size and more_body:
+                return
+            body = b"".join(self.pending)
+            self.pending = []
+            if self.pending_size < self.config.compression_min_size:
+                # complete response below the threshold
+                self.mode = "pass"
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._start_compression()
+
+        await self._send(
+            {
+                "type": "http.response.body",
+                "body": self.compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            }
+        )
+
+    async def _start_compression(self) -> None:
+        self.mode = "compress"
+        self.compressor = _Compressor(self.encoding, self.config)
+
+        old_headers = self.start.get("headers", [])
+        vary = _header(old_headers, b"vary")
+        headers = _without(old_headers, b"content-length", b"content-encoding", b"vary")
+        headers.append((b"content-encoding", self.encoding))
+        headers.append(
+            (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")
+        )
+        etag = _header(headers, b"etag")
+        if etag is not None and not etag.startswith(b"W/"):
+            # the representation changed, a strong validator no longer applies
+            headers = _without(headers, b"etag")
+            headers.append((b"etag", b"W/" + etag))
+        await self._send({**self.start, "headers": headers})
+
+
+def edge_middleware(asgi_app: ASGIApp, config: MiddlewareConfig) -> ASGIApp:
+    """Wrap ``asgi_app`` in the configured middleware stack.
+
+    With middleware tracing enabled every layer gets its own span.
+    """
+    asgi_app = trace_asgi(asgi_app, "asgi.app")
+    if config.etag:
+        asgi_app = trace_asgi(
+            ETagMiddleware(asgi_app, max_size=config.etag_max_size), "middleware.etag"
+        )
+    if config.compression:
+        asgi_app = trace_asgi(
+            CompressionMiddleware(asgi_app, config), "middleware.compression"
+        )
+    if config.cache_control:
+        asgi_app = trace_asgi(
+            CacheControlMiddleware(asgi_app, config.cache_control),
+            "middleware.cache_control",
+        )
+    return trace_asgi(HTTPSMiddleware(asgi_app, config), "http.request", request=True)
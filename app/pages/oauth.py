@@ -0,0 +1,42 @@
+"""OAuth callback pages, registered only for the configured providers.
+
+Replaces the import of ``appkit_user.authentication.pages``, which registers the
+callback pages of all providers at import time.
+"""
+
+from collections.abc import Callable
+
+import reflex as rx
+
+from appkit_user.authentication.components import oauth_login_splash
+from appkit_user.authentication.states import LoginState
+from appkit_user.configuration import AuthenticationConfiguration, OAuthProvider
+
+CALLBACK_PAGES: dict[OAuthProvider, tuple[str, str]] = {
+    OAuthProvider.GITHUB: ("/oauth/github/callback", "Anmeldung mit Github"),
+    OAuthProvider.AZURE: ("/oauth/azure/callback", "Anmeldung mit Azure"),
+}
+
+
+def oauth_callback_page(provider: OAuthProvider) -> Callable[[], rx.Component]:
+    def page() -> rx.Component:
+        return rx.theme(
+            rx.center(
+                oauth_login_splash(provider),
+                class_name="splash-container",
+            ),
+            has_background=True,
+        )
+
+    page.__name__ = f"{provider.value}_oauth_callback_page"
+    return page
+
+
+def register_oauth_callback_pages(config: AuthenticationConfiguration) -> None:
+    for provider in {oauth.provider for oauth in config.oauth_providers}:
+        route, title = CALLBACK_PAGES[provider]
+        rx.page(
+            route=route,
+            title=title,
+            on_load=LoginState.handle_oauth_callback(provider),
+        )(oauth_callback_page(provider))
@@ -1,13 +1,12 @@
 import reflex as rx
 
 from appkit_ui.components.header import header
-from appkit_user.authentication.components.components import requires_admin
 from appkit_user.authentication.templates import authenticated
-from appkit_user.user_management.components.user import users_table
-from appkit_user.user_management.states.user_states import UserState
 
 from app.components.navbar import app_navbar
-from app.roles import ALL_ROLES
+from app.components.permissions import requires_permission
+from app.components.users import users_table
+from app.roles import ADMIN
 
 
 @authenticated(
@@ -15,12 +14,11 @@ from app.roles import ALL_ROLES
     title="Benutzerverwaltung",
     navbar=app_navbar(),
     admin_only=True,
-    on_load=[UserState.set_available_roles(ALL_ROLES)],
 )
 def users_page() -> rx.Component:
     additional_components = []
 
-    return requires_admin(
+    return requires_permission(
         rx.vstack(
             header("Benutzer"),
             users_table(additional_components=additional_components),
@@ -28,4 +26,5 @@ def users_page() -> rx.Component:
             max_width="1200px",
             spacing="6",
         ),
+        mask=ADMIN,
     )
@@ -1,13 +1,89 @@
-from appkit_user.authentication.backend.models import Role
+"""Roles of the application and their permission bits.
 
-PROJECT_MANAGER_ROLE = Role(
-    id=1,
+A user's roles are stored by name in ``auth_users.roles``. For authorization
+checks they are folded into an integer bitmap once per user (see
+``PermissionState.permissions``): every role owns a fixed bit, ``is_admin``
+owns bit 0, and a check is a single ``bitmap & mask`` on the server as well as
+in the compiled frontend.
+
+Bits are part of the persisted client states, a role keeps its bit for good:
+new roles take a free bit, the bit of a removed role is not reused.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Final
+
+# bit of ``User.is_admin``
+ADMIN: Final = 1 << 0
+# bitmaps are JavaScript numbers in the frontend, bitwise operators use 32 bits
+MAX_BIT: Final = 30
+
+
+@dataclass(frozen=True, slots=True)
+class Role:
+    """A role of the application, ``name`` is stored in ``auth_users.roles``.
+
+    The catalog is static: the admin pages render it into the compiled frontend
+    instead of keeping it in the state of every session.
+    """
+
+    name: str
+    label: str
+    bit: int
+    description: str = ""
+
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
+
+class RoleRegistry:
+    """Bit positions of the roles, and the bitmaps of users."""
+
+    def __init__(self, roles: Iterable[Role]) -> None:
+        self.roles: tuple[Role, ...] = tuple(roles)
+        self._masks: dict[str, int] = {}
+        bits: dict[int, str] = {}
+        for role in self.roles:
+            if not 0 < role.bit <= MAX_BIT:
+                msg = f"Bit {role.bit} of role {role.name} is not in 1..{MAX_BIT}"
+                raise ValueError(msg)
+            if role.name in self._masks or role.bit in bits:
+                other = bits.get(role.bit, role.name)
+                msg = f"Roles {other} and {role.name} share a name or a bit"
+                raise ValueError(msg)
+            bits[role.bit] = role.name
+            self._masks[role.name] = role.mask
+
+    def mask(self, *names: str) -> int:
+        """Bitmap of the roles ``names``, raises ``KeyError`` for unknown ones."""
+        mask = 0
+        for name in names:
+            mask |= self._masks[name]
+        return mask
+
+    def bitmap(self, roles: Iterable[str], is_admin: bool = False) -> int:
+        """Bitmap of a user, names of unknown roles are ignored."""
+        bitmap = ADMIN if is_admin else 0
+        for name in roles:
+            bitmap |= self._masks.get(name, 0)
+        return bitmap
+
+
+def allows(bitmap: int, mask: int) -> bool:
+    """Whether ``bitmap`` holds any of the bits of ``mask``."""
+    return bitmap & mask != 0
+
+
+PROJECT_MANAGER_ROLE: Final = Role(
     name="project_manager",
     label="Projektmanager",
+    bit=1,
     description="Berechtigung für den Projektmanager",
 )
 
 
-ALL_ROLES: list[Role] = [
-    PROJECT_MANAGER_ROLE,
-]
+ALL_ROLES: Final[tuple[Role, ...]] = (PROJECT_MANAGER_ROLE,)
+
+ROLES: Final = RoleRegistry(ALL_ROLES)
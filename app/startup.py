@@ -0,0 +1,166 @@
+"""Startup profiling of the app bootstrap.
+
+Set ``STARTUP_PROFILE`` to a file path (``{pid}`` is replaced by the process id)
+to get a JSON report of the wall time of each bootstrap phase and the import
+time of each module imported after the ``app`` package. Without the variable
+the profiler does nothing. Only the standard library may be imported here, the
+module is imported before anything else of the app.
+
+The variable is read when this module is imported, before ``load_dotenv``
+runs, so it has to be set in the environment of the process, e.g.
+``STARTUP_PROFILE=build/startup-{pid}.json reflex run``; a ``.env`` entry is
+ignored. Missing directories of the path are created.
+"""
+
+import importlib.abc
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from importlib.machinery import ModuleSpec
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Final
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE_ENV: Final = "STARTUP_PROFILE"
+
+
+class _TimedLoader:
+    """Loader proxy measuring the execution time of a module."""
+
+    def __init__(self, loader: Any, profiler: "StartupProfiler") -> None:
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec: ModuleSpec) -> ModuleType | None:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self._profiler.enter_import(module.__name__)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.exit_import(module.__name__)
+            # hide the proxy from everything inspecting the module later on
+            module.__loader__ = self._loader
+            if module.__spec__ is not None:
+                module.__spec__.loader = self._loader
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self, profiler: "StartupProfiler") -> None:
+        self._profiler = profiler
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Sequence[str] | None,
+        target: ModuleType | None = None,
+    ) -> ModuleSpec | None:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self._profiler)
+        return spec
+
+
+class StartupProfiler:
+    def __init__(self, report_path: str | None) -> None:
+        self.report_path = report_path
+        self.started = time.perf_counter()
+        self.phases: list[dict[str, Any]] = []
+        # module -> (self ms, cumulative ms)
+        self.imports: dict[str, tuple[float, float]] = {}
+        self._stack: list[list[Any]] = []
+        self._finder: _ImportTimer | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.report_path is not None
+
+    def start(self) -> None:
+        if self.enabled and self._finder is None:
+            self._finder = _ImportTimer(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def enter_import(self, name: str) -> None:
+        # [name, started, time spent in nested imports]
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit_import(self, name: str) -> None:
+        entry_name, started, children = self._stack.pop()
+        if entry_name != name:  # pragma: no cover - defensive
+            return
+        cumulative = (time.perf_counter() - started) * 1000
+        self.imports[name] = (cumulative - children, cumulative)
+        if self._stack:
+            self._stack[-1][2] += cumulative
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure the wall time of a bootstrap phase."""
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                {
+                    "phase": name,
+                    "start_ms": round((started - self.started) * 1000, 3),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+    def report(self) -> dict[str, Any]:
+        imports = sorted(self.imports.items(), key=lambda item: -item[1][1])
+        return {
+            "pid": os.getpid(),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "phases": self.phases,
+            "imports": [
+                {
+                    "module": name,
+                    "self_ms": round(self_ms, 3),
+                    "cumulative_ms": round(cumulative_ms, 3),
+                }
+                for name, (self_ms, cumulative_ms) in imports
+            ],
+        }
+
+    def finish(self) -> None:
+        """Stop timing imports and write the report, if requested."""
+        if not self.enabled:
+            return
+
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+        path = Path(self.report_path.format(pid=os.getpid()))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+        logger.info("Startup profile written to %s", path)
+
+
+# read before load_dotenv, the imports of the app are timed from here on
+profiler = StartupProfiler(os.getenv(STARTUP_PROFILE_ENV) or None)
+profiler.start()
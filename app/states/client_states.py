@@ -0,0 +1,24 @@
+"""Client-only UI state.
+
+Flags that only animate the interface live in the browser: a
+``ClientStateVar`` is a React ``useState`` shared through the ``refs`` of the
+page. Setting one is a local function call, without a websocket event, an
+event handler or a state delta. Backend state is for data the server needs.
+
+The scroll position of the navbar is client-only as well: the stateful scroll
+area keeps it in ``localStorage`` under its ``persist_key``.
+"""
+
+from typing import Final
+
+from reflex.experimental.client_state import ClientStateVar
+
+
+def client_flag(name: str, default: bool = False) -> ClientStateVar:
+    """A boolean UI flag kept in the browser, ``name`` must be unique."""
+    return ClientStateVar.create(name, default=default)
+
+
+# set by a click on a navbar link to another page, reset when the navbar of the
+# next page mounts
+NAV_LOADING: Final = client_flag("nav_loading")
@@ -0,0 +1,105 @@
+import inspect
+import logging
+from collections.abc import Callable
+from functools import wraps
+from typing import Any
+
+import reflex as rx
+from reflex.vars.base import var_operation, var_operation_return
+from reflex.vars.number import NumberVar
+
+from appkit_user.authentication.states import UserSession
+
+from app.roles import ROLES, allows
+
+logger = logging.getLogger(__name__)
+
+
+@var_operation
+def _allows_operation(bitmap: NumberVar, mask: NumberVar) -> Any:
+    return var_operation_return(
+        js_expression=f"(({bitmap} & {mask}) !== 0)", var_type=bool
+    )
+
+
+class PermissionState(UserSession):
+    @rx.var
+    def permissions(self) -> int:
+        """Role bitmap of the user, recomputed only when ``user`` changes.
+
+        ``user`` is refreshed from the session record, which is invalidated when
+        an administrator changes the user, so role changes arrive here too.
+        """
+        if self.user is None:
+            return 0
+        return ROLES.bitmap(self.user.roles, is_admin=bool(self.user.is_admin))
+
+    @classmethod
+    def allows(cls, mask: int) -> rx.Var[bool]:
+        """Frontend test of the user's bitmap against ``mask``."""
+        return _allows_operation(cls.permissions, mask)
+
+
+async def has_permission(state: rx.State, mask: int) -> bool:
+    """Backend test of the user's bitmap against ``mask``."""
+    permission_state = await state.get_state(PermissionState)
+    return allows(permission_state.permissions, mask)
+
+
+def _denied(state: rx.State, handler: Callable) -> rx.event.EventSpec:
+    logger.warning(
+        "Event %s.%s denied for %s",
+        type(state).__name__,
+        handler.__name__,
+        state.router.session.client_token,
+    )
+    return rx.toast.error("Keine Berechtigung.", position="top-right")
+
+
+def permission_required(mask: int) -> Callable[[Callable], Callable]:
+    """Run the decorated event handler only if the user holds any bit of ``mask``.
+
+    The backend counterpart of ``requires_permission``: a hidden component does
+    not keep a client from sending its events.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        if inspect.isasyncgenfunction(handler):
+
+            @wraps(handler)
+            async def guarded_generator(
+                self: rx.State, *args: Any, **kwargs: Any
+            ) -> Any:
+                if not await has_permission(self, mask):
+                    yield _denied(self, handler)
+                    return
+                async for update in handler(self, *args, **kwargs):
+                    yield update
+
+            return guarded_generator
+
+        @wraps(handler)
+        async def guarded(self: rx.State, *args: Any, **kwargs: Any) -> Any:
+            if not await has_permission(self, mask):
+                return _denied(self, handler)
+            result = handler(self, *args, **kwargs)
+            return await result if inspect.isawaitable(result) else result
+
+        return guarded
+
+    return decorator
+
+
+def guard_event_handlers(state_cls: type[rx.State], mask: int) -> None:
+    """Require ``mask`` for the event handlers ``state_cls`` defines itself.
+
+    For the states of other packages, e.g. appkit_user's ``UserState``: the
+    guarded overrides of a subclass leave the inherited handlers reachable
+    under the name of the parent state. ``setvar`` is left alone, it only sets
+    the vars of the sender's own state.
+    """
+    for name, handler in list(state_cls.event_handlers.items()):
+        if name == "setvar" or hasattr(handler.fn, "__wrapped__"):
+            continue
+        # replaces the handler registered for the event name as well
+        state_cls._add_event_handler(name, permission_required(mask)(handler.fn))  # noqa: SLF001
@@ -0,0 +1,212 @@
+import inspect
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+
+import reflex as rx
+from reflex.components.sonner.toast import Toaster
+
+from appkit_commons.database.session import get_asyncdb_session
+from appkit_user.authentication.backend import user_repository as appkit_repository
+from appkit_user.authentication.backend.entities import UserEntity
+from appkit_user.user_management.states.user_states import UserState
+
+from app.backend import user_repository
+from app.backend.user_repository import DEFAULT_PAGE_SIZE, UserSortField
+from app.roles import ADMIN, ALL_ROLES
+from app.states.permission_states import guard_event_handlers, permission_required
+
+# events can be addressed to appkit_user's state directly, not only to ours
+guard_event_handlers(UserState, ADMIN)
+
+ALL_ROLES_FILTER = "all"  # select items cannot have an empty value
+
+
+@dataclass(frozen=True, slots=True)
+class UserRow:
+    """The fields of a user the admin table and its dialogs show.
+
+    Kept in the state instead of appkit_user's pydantic ``User``, the state is
+    pickled after every event and a page holds ``DEFAULT_PAGE_SIZE`` of them.
+    """
+
+    user_id: int = 0
+    name: str = ""
+    email: str = ""
+    is_active: bool = True
+    is_verified: bool = False
+    is_admin: bool = False
+    roles: tuple[str, ...] = ()
+
+    @classmethod
+    def from_entity(cls, user: UserEntity) -> "UserRow":
+        return cls(
+            user_id=user.id,
+            name=user.name or "",
+            email=user.email or "",
+            is_active=bool(user.is_active),
+            is_verified=bool(user.is_verified),
+            is_admin=bool(user.is_admin),
+            roles=tuple(user.roles or ()),
+        )
+
+
+class UserListState(UserState):
+    """Keyset-paginated user listing for the admin user management.
+
+    Only the current page is kept in ``users``; the cursors needed to move
+    between pages are backend-only vars and never sent to the client. All event
+    handlers, including those of appkit_user's ``UserState``, require ``ADMIN``;
+    the overrides call the unguarded handlers of ``UserState``.
+    """
+
+    users: list[UserRow] = []
+    selected_user: UserRow | None = None
+    sort_field: str = UserSortField.EMAIL.value
+    sort_descending: bool = False
+    search: str = ""
+    active_only: bool = False
+    role: str = ""  # only users with this role, "" for all
+    role_counts: dict[str, int] = {role.name: 0 for role in ALL_ROLES}
+    page: int = 1
+    has_next_page: bool = False
+
+    _cursor: str | None = None
+    _next_cursor: str | None = None
+    _previous_cursors: list[str | None] = []
+
+    @rx.var
+    def has_previous_page(self) -> bool:
+        return self.page > 1
+
+    def _reset_cursors(self) -> None:
+        self._cursor = None
+        self._next_cursor = None
+        self._previous_cursors = []
+        self.page = 1
+
+    async def _fetch_page(self) -> None:
+        async with get_asyncdb_session() as session:
+            user_entities, next_cursor = await user_repository.find_page(
+                session,
+                sort=UserSortField(self.sort_field),
+                descending=self.sort_descending,
+                after=self._cursor,
+                search=self.search,
+                active_only=self.active_only,
+                role=self.role or None,
+                limit=DEFAULT_PAGE_SIZE,
+            )
+            self.users = [UserRow.from_entity(user) for user in user_entities]
+            if self.page == 1:
+                # users can only move between roles on the admin pages
+                self.role_counts = await user_repository.count_by_role(
+                    session, [role.name for role in ALL_ROLES]
+                )
+
+        self._next_cursor = next_cursor
+        self.has_next_page = next_cursor is not None
+
+    @permission_required(ADMIN)
+    async def load_users(self) -> None:
+        """(Re-)load the current page, e.g. after a user was changed."""
+        self.is_loading = True
+        try:
+            await self._fetch_page()
+        finally:
+            self.is_loading = False
+
+    @permission_required(ADMIN)
+    async def select_user(self, user_id: int) -> None:
+        async with get_asyncdb_session() as session:
+            user_entity = await appkit_repository.get_by_user_id(session, user_id)
+            self.selected_user = (
+                UserRow.from_entity(user_entity) if user_entity else None
+            )
+
+    @permission_required(ADMIN)
+    async def create_user(self, form_data: dict) -> Toaster:
+        return await inspect.unwrap(UserState.create_user.fn)(self, form_data)
+
+    @permission_required(ADMIN)
+    async def update_user(self, form_data: dict) -> Toaster:
+        return await inspect.unwrap(UserState.update_user.fn)(self, form_data)
+
+    @permission_required(ADMIN)
+    async def delete_user(self, user_id: int) -> Toaster:
+        return await inspect.unwrap(UserState.delete_user.fn)(self, user_id)
+
+    async def _reload(self) -> AsyncGenerator:
+        self.is_loading = True
+        yield
+        try:
+            await self._fetch_page()
+        finally:
+            self.is_loading = False
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def first_page(self) -> AsyncGenerator:
+        self._reset_cursors()
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def next_page(self) -> AsyncGenerator:
+        if self._next_cursor is None:
+            return
+
+        self._previous_cursors.append(self._cursor)
+        self._cursor = self._next_cursor
+        self.page += 1
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def previous_page(self) -> AsyncGenerator:
+        if not self._previous_cursors:
+            return
+
+        self._cursor = self._previous_cursors.pop()
+        self.page -= 1
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def set_search(self, search: str) -> AsyncGenerator:
+        self.search = search
+        self._reset_cursors()
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def set_sort(self, sort_field: str) -> AsyncGenerator:
+        """Sort by ``sort_field``, toggling the direction if it is already used."""
+        if sort_field == self.sort_field:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_field = UserSortField(sort_field).value
+            self.sort_descending = False
+
+        self._reset_cursors()
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def set_active_only(self, active_only: bool) -> AsyncGenerator:
+        self.active_only = active_only
+        self._reset_cursors()
+        async for update in self._reload():
+            yield update
+
+    @rx.event
+    @permission_required(ADMIN)
+    async def set_role(self, role: str) -> AsyncGenerator:
+        self.role = "" if role == ALL_ROLES_FILTER else role
+        self._reset_cursors()
+        async for update in self._reload():
+            yield update
@@ -0,0 +1 @@
+/root/.pyenv/versions/3.13.0/lib/python3.13/site-packages/appkit_mantine/rich_select.jsx
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""Minimal client of the reflex event websocket for the benchmarks.
+
+Speaks just enough Socket.IO (Engine.IO v4 over the websocket transport) to
+connect to the ``/_event`` namespace with a session token, send events the way
+the frontend does and collect the state updates. The ``python-socketio`` async
+client would need ``aiohttp``, ``simple_websocket`` is already installed with
+reflex.
+"""
+
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from typing import Any, Final
+from urllib.parse import urlsplit, urlunsplit
+
+from reflex_base.constants.base import Reflex
+from simple_websocket import AioClient, ConnectionClosed
+
+EVENT_NAMESPACE: Final = "/_event"
+SOCKET_EVENT: Final = "event"
+
+# engine.io packet types
+_OPEN: Final = "0"
+_PING: Final = "2"
+_PONG: Final = "3"
+_MESSAGE: Final = "4"
+# socket.io packet types, sent inside an engine.io message
+_CONNECT: Final = "0"
+_EVENT: Final = "2"
+_CONNECT_ERROR: Final = "4"
+
+Update = dict[str, Any]
+
+
+class EventSocketError(Exception):
+    pass
+
+
+class EventSocket:
+    """One browser tab: a session token, its websocket and the merged state."""
+
+    def __init__(self, backend_url: str, token: str) -> None:
+        parts = urlsplit(backend_url)
+        scheme = "wss" if parts.scheme == "https" else "ws"
+        self.url = urlunsplit(
+            (
+                scheme,
+                parts.netloc,
+                f"{EVENT_NAMESPACE}/",
+                f"EIO=4&transport=websocket&token={token}",
+                "",
+            )
+        )
+        self.token = token
+        self.state: dict[str, dict[str, Any]] = {}
+        self._ws: AioClient | None = None
+        self._updates: asyncio.Queue[Update] = asyncio.Queue()
+        self._connected = asyncio.Event()
+        self._reader: asyncio.Task | None = None
+
+    async def connect(self, max_wait: float = 10.0) -> None:
+        self._ws = await AioClient.connect(self.url, subprotocols=[Reflex.VERSION])
+        self._reader = asyncio.create_task(self._read())
+        await self._ws.send(f"{_MESSAGE}{_CONNECT}{EVENT_NAMESPACE},")
+        await asyncio.wait_for(self._connected.wait(), max_wait)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _read(self) -> None:
+        prefix = f"{EVENT_NAMESPACE},"
+        while True:
+            try:
+                packet = await self._ws.receive()
+            except ConnectionClosed:
+                return
+            if not isinstance(packet, str) or not packet:
+                continue
+            kind, body = packet[0], packet[1:]
+            if kind == _PING:
+                await self._ws.send(_PONG)
+            elif kind == _OPEN:
+                continue
+            elif kind == _MESSAGE and body[1:].startswith(prefix):
+                self._handle(body[0], body[1 + len(prefix) :])
+
+    def _handle(self, kind: str, data: str) -> None:
+        if kind == _CONNECT:
+            self._connected.set()
+        elif kind == _CONNECT_ERROR:
+            msg = f"Connecting to {EVENT_NAMESPACE} failed: {data}"
+            raise EventSocketError(msg)
+        elif kind == _EVENT:
+            name, *args = json.loads(data)
+            if name == SOCKET_EVENT and args:
+                update = json.loads(args[0]) if isinstance(args[0], str) else args[0]
+                self._updates.put_nowait(update)
+
+    async def emit(self, name: str, payload: dict[str, Any], path: str) -> None:
+        event = {
+            "name": name,
+            "payload": payload,
+            "router_data": {"pathname": path, "asPath": path, "query": {}},
+        }
+        await self._ws.send(
+            f"{_MESSAGE}{_EVENT}{EVENT_NAMESPACE}," + json.dumps([SOCKET_EVENT, event])
+        )
+
+    def _apply(self, update: Update) -> None:
+        for state, delta in (update.get("delta") or {}).items():
+            self.state.setdefault(state, {}).update(delta)
+
+    async def call(
+        self,
+        name: str,
+        path: str,
+        until: Callable[[Update], bool],
+        payload: dict[str, Any] | None = None,
+        max_wait: float = 30.0,
+    ) -> float:
+        """Send an event and wait for the update ``until`` accepts, in ms."""
+        while not self._updates.empty():
+            self._apply(self._updates.get_nowait())
+
+        started = time.perf_counter()
+        await self.emit(name, payload or {}, path)
+        deadline = started + max_wait
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                msg = f"{name} on {path} did not finish within {max_wait}s"
+                raise EventSocketError(msg)
+            update = await asyncio.wait_for(self._updates.get(), remaining)
+            self._apply(update)
+            if until(update):
+                return (time.perf_counter() - started) * 1000
@@ -0,0 +1,350 @@
+"""Load test of the login -> admin flow against a running backend.
+
+Every virtual user opens the login page over HTTP, connects the event
+websocket with its own session token and then, per iteration, logs in,
+refreshes its session on ``/profile``, opens ``/admin/users`` and logs out.
+The latencies are reported per step (p50, p95, p99 in ms), the throughput in
+completed flows per second. ``task bench`` starts the backend on the compose
+database and runs::
+
+    python -m benchmarks.flows seed --users 5000
+    python -m benchmarks.flows run --users 20 --iterations 10 --compare
+
+``--update-baseline`` stores the results in ``benchmarks/baselines/flows.json``,
+``--compare`` exits with 1 when a metric regressed beyond ``--tolerance`` or a
+flow failed. The baseline depends on the machine and is not committed: run
+``task bench:baseline`` once on the commit to compare against, then ``task
+bench`` on the changes.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Final
+
+import httpx
+
+from benchmarks.client import EventSocket, EventSocketError, Update
+from benchmarks.stats import load_baseline, regressions, save_baseline, summary
+
+BASELINE: Final = Path(__file__).parent / "baselines" / "flows.json"
+EMAIL_DOMAIN: Final = "example.com"
+STEPS: Final = (
+    "login_page",
+    "connect",
+    "hydrate_login",
+    "login",
+    "session_refresh",
+    "admin_users",
+    "logout",
+)
+
+
+def admin_email(index: int) -> str:
+    return f"bench-admin-{index}@{EMAIL_DOMAIN}"
+
+
+def user_email(index: int) -> str:
+    return f"bench-user-{index}@{EMAIL_DOMAIN}"
+
+
+def _delta_values(update: Update, prefix: str) -> list[Any]:
+    # var names in a delta may carry a suffix, e.g. ``is_hydrated_rx_state_``
+    return [
+        value
+        for delta in (update.get("delta") or {}).values()
+        for key, value in delta.items()
+        if key.startswith(prefix)
+    ]
+
+
+def hydrated(update: Update) -> bool:
+    return True in _delta_values(update, "is_hydrated")
+
+
+def redirected(update: Update) -> bool:
+    return any(
+        event.get("name", "").endswith("_redirect")
+        for event in update.get("events") or []
+    )
+
+
+def login_finished(update: Update) -> bool:
+    return redirected(update) or any(_delta_values(update, "error_message"))
+
+
+def users_loaded(update: Update) -> bool:
+    return bool(_delta_values(update, "users"))
+
+
+def load_app() -> None:
+    """Configure the app, the appkit modules look up the registry on import."""
+    import app  # noqa: F401, PLC0415
+
+
+def event_names() -> dict[str, str]:
+    """Full names of the events the frontend sends, as ``state.handler``."""
+    from reflex.state import State  # noqa: PLC0415
+    from reflex_base.utils.format import format_event_handler  # noqa: PLC0415
+
+    from appkit_user.authentication.states import LoginState  # noqa: PLC0415
+
+    from app.states.user_states import UserListState  # noqa: PLC0415
+
+    return {
+        "hydrate": format_event_handler(State.event_handlers["hydrate_and_load"]),
+        "login": format_event_handler(LoginState.event_handlers["login_with_password"]),
+        "logout": format_event_handler(LoginState.event_handlers["logout"]),
+        "first_page": format_event_handler(UserListState.event_handlers["first_page"]),
+    }
+
+
+class VirtualUser:
+    def __init__(
+        self,
+        url: str,
+        email: str,
+        password: str,
+        events: dict[str, str],
+        timings: dict[str, list[float]],
+    ) -> None:
+        self.url = url
+        self.email = email
+        self.password = password
+        self.events = events
+        self.timings = timings
+        self.errors = 0
+        self.socket = EventSocket(url, str(uuid.uuid4()))
+
+    async def timed(self, step: str, call: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        await call()
+        self.timings[step].append((time.perf_counter() - started) * 1000)
+
+    async def hydrate(self, path: str) -> float:
+        return await self.socket.call(self.events["hydrate"], path, until=hydrated)
+
+    async def start(self, http: httpx.AsyncClient) -> None:
+        async def login_page() -> None:
+            response = await http.get(f"{self.url}/login")
+            response.raise_for_status()
+
+        await self.timed("login_page", login_page)
+        await self.timed("connect", self.socket.connect)
+        await self.timed("hydrate_login", lambda: self.hydrate("/login"))
+
+    async def login(self) -> None:
+        await self.socket.call(
+            self.events["login"],
+            "/login",
+            until=login_finished,
+            payload={"form_data": {"username": self.email, "password": self.password}},
+        )
+        errors = [
+            value
+            for delta in self.socket.state.values()
+            for key, value in delta.items()
+            if key.startswith("error_message") and value
+        ]
+        if errors:
+            msg = f"Login of {self.email} failed: {errors[0]}"
+            raise EventSocketError(msg)
+
+    async def admin_users(self) -> None:
+        await self.hydrate("/admin/users")
+        await self.socket.call(
+            self.events["first_page"], "/admin/users", until=users_loaded
+        )
+
+    async def logout(self) -> None:
+        await self.socket.call(self.events["logout"], "/admin/users", until=redirected)
+        await self.hydrate("/login")
+
+    async def iteration(self, record: bool) -> None:
+        timings = self.timings if record else defaultdict(list)
+        steps = (
+            ("login", self.login),
+            ("session_refresh", lambda: self.hydrate("/profile")),
+            ("admin_users", self.admin_users),
+            ("logout", self.logout),
+        )
+        started = time.perf_counter()
+        try:
+            for step, call in steps:
+                begin = time.perf_counter()
+                await call()
+                timings[step].append((time.perf_counter() - begin) * 1000)
+        except (EventSocketError, TimeoutError) as e:
+            self.errors += 1
+            print(f"{self.email}: {e}", file=sys.stderr)  # noqa: T201
+            return
+        timings["flow"].append((time.perf_counter() - started) * 1000)
+
+
+async def wait_until_ready(url: str, max_wait: float) -> None:
+    deadline = time.monotonic() + max_wait
+    async with httpx.AsyncClient() as http:
+        while True:
+            try:
+                if (await http.get(f"{url}/ping")).is_success:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                msg = f"{url} did not become ready within {max_wait}s"
+                raise TimeoutError(msg)
+            await asyncio.sleep(1)
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    if args.wait:
+        await wait_until_ready(args.url, args.wait)
+
+    load_app()
+    events = event_names()
+    timings: dict[str, list[float]] = defaultdict(list)
+    async with httpx.AsyncClient(timeout=30) as http:
+        users = [
+            VirtualUser(args.url, admin_email(index), args.password, events, timings)
+            for index in range(args.users)
+        ]
+        await asyncio.gather(*(user.start(http) for user in users))
+
+        async def drive(user: VirtualUser, iterations: int, record: bool) -> None:
+            for _ in range(iterations):
+                await user.iteration(record=record)
+
+        await asyncio.gather(*(drive(user, args.warmup, False) for user in users))
+        # failed warm up iterations are no errors of the measured run
+        for user in users:
+            user.errors = 0
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(user, args.iterations, True) for user in users))
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*(user.socket.close() for user in users))
+
+    results = {step: summary(timings[step]) for step in (*STEPS, "flow")}
+    # only completed flows count, failed ones end early
+    results["flow"]["throughput"] = round(len(timings["flow"]) / elapsed, 2)
+    results["flow"]["errors"] = sum(user.errors for user in users)
+    return results
+
+
+async def seed(args: argparse.Namespace) -> None:
+    load_app()
+    from sqlalchemy.dialects.postgresql import insert  # noqa: PLC0415
+
+    from appkit_commons.database.session import (  # noqa: PLC0415
+        get_asyncdb_session,
+    )
+    from appkit_commons.security import generate_password_hash  # noqa: PLC0415
+    from appkit_user.authentication.backend.entities import (  # noqa: PLC0415
+        UserEntity,
+    )
+
+    from app.roles import ALL_ROLES  # noqa: PLC0415
+
+    # one hash for everybody, hashing thousands of passwords would dominate
+    password = generate_password_hash(args.password)
+    role_names = [role.name for role in ALL_ROLES]
+    rows = [
+        {
+            "email": admin_email(index),
+            "name": f"Bench Admin {index}",
+            "_password": password,
+            "is_verified": True,
+            "is_admin": True,
+            "is_active": True,
+            "roles": role_names,
+        }
+        for index in range(args.admins)
+    ] + [
+        {
+            "email": user_email(index),
+            "name": f"Bench User {index}",
+            "_password": password,
+            "is_verified": True,
+            "is_admin": False,
+            "is_active": index % 10 != 0,
+            "roles": role_names[: index % (len(role_names) + 1)],
+        }
+        for index in range(args.users)
+    ]
+
+    async with get_asyncdb_session() as session:
+        for start in range(0, len(rows), 1000):
+            await session.execute(
+                insert(UserEntity)
+                .values(rows[start : start + 1000])
+                .on_conflict_do_nothing(index_elements=["email"])
+            )
+        await session.commit()
+    print(f"Seeded {args.admins} admins and {args.users} users")  # noqa: T201
+
+
+def report(args: argparse.Namespace, results: dict[str, dict[str, float]]) -> int:
+    print(json.dumps(results, indent=2))  # noqa: T201
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        if results["flow"]["errors"]:
+            print("Flows failed, the baseline is not updated", file=sys.stderr)  # noqa: T201
+            return 1
+        save_baseline(baseline_path, results)
+        print(f"Baseline written to {baseline_path}")  # noqa: T201
+        return 0
+    if not args.compare:
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(  # noqa: T201
+            f"No baseline at {baseline_path}, run 'task bench:baseline' first",
+            file=sys.stderr,
+        )
+        return 2
+    found = regressions(results, baseline, args.tolerance)
+    for regression in found:
+        print(f"Regression: {regression}", file=sys.stderr)  # noqa: T201
+    return 1 if found else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="insert the benchmark users")
+    seed_parser.add_argument("--users", type=int, default=5000)
+    seed_parser.add_argument("--admins", type=int, default=50)
+    seed_parser.add_argument("--password", default="bench-password")
+
+    run_parser = commands.add_parser("run", help="run the login -> admin flow")
+    run_parser.add_argument("--url", default="http://localhost:3030")
+    run_parser.add_argument(
+        "--users", type=int, default=20, help="concurrent virtual users"
+    )
+    run_parser.add_argument("--iterations", type=int, default=10)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--password", default="bench-password")
+    run_parser.add_argument(
+        "--wait", type=float, default=0, help="seconds to wait for /ping"
+    )
+    run_parser.add_argument("--baseline", default=str(BASELINE))
+    run_parser.add_argument("--compare", action="store_true")
+    run_parser.add_argument("--update-baseline", action="store_true")
+    run_parser.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed(args))
+        return
+    sys.exit(report(args, asyncio.run(run(args))))
+
+
+if __name__ == "__main__":
+    main()
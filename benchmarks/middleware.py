@@ -0,0 +1,122 @@
+"""Per-request overhead of the edge middleware stack.
+
+Drives the ASGI callables directly, without a server or sockets, so that the
+numbers only contain the work of the middleware::
+
+    python -m benchmarks.middleware --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Callable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from benchmarks.stats import summary
+
+from app.configuration import MiddlewareConfig
+from app.middleware import edge_middleware
+
+SMALL_BODY = b'{"status": "ok"}'
+LARGE_BODY = json.dumps(
+    [{"id": index, "email": f"user{index}@example.com"} for index in range(200)]
+).encode()
+
+
+def endpoint(body: bytes, etag: bytes | None = None) -> ASGIApp:
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if etag is not None:
+        headers.append((b"etag", etag))
+
+    async def app(_scope: Scope, _receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def http_scope(path: str, headers: list[tuple[bytes, bytes]]) -> Scope:
+    return {
+        "type": "http",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"x-forwarded-proto", b"https"),
+            *headers,
+        ],
+    }
+
+
+async def _receive() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(_message: Message) -> None:
+    return None
+
+
+async def measure(
+    app: ASGIApp, scope: Callable[[], Scope], requests: int
+) -> list[float]:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await app(scope(), _receive, _send)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+SCENARIOS = {
+    # name: (endpoint, path, request headers)
+    "small json": (endpoint(SMALL_BODY), "/api/status", []),
+    "large json gzip": (
+        endpoint(LARGE_BODY),
+        "/api/users",
+        [(b"accept-encoding", b"gzip")],
+    ),
+    "static 304": (
+        endpoint(LARGE_BODY, etag=b'"abc"'),
+        "/dist/app.js",
+        [(b"if-none-match", b'"abc"')],
+    ),
+}
+
+
+async def run(requests: int) -> dict[str, dict[str, dict[str, float]]]:
+    results = {}
+    config = MiddlewareConfig()
+    for name, (app, path, headers) in SCENARIOS.items():
+        stack = edge_middleware(app, config)
+
+        def scope(path: str = path, headers: list = headers) -> Scope:
+            return http_scope(path, headers)
+
+        await measure(stack, scope, min(requests, 1000))  # warm up
+        bare = summary(await measure(app, scope, requests))
+        wrapped = summary(await measure(stack, scope, requests))
+        results[name] = {
+            "bare_us": bare,
+            "stack_us": wrapped,
+            "overhead_us": {key: round(wrapped[key] - bare[key], 2) for key in bare},
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
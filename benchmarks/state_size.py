@@ -0,0 +1,124 @@
+"""Serialized size of the admin user table's state, per session.
+
+Fills the state of one session with a page of users the way the admin page
+did before (appkit_user's pydantic ``User`` models in ``UserState.users`` and
+the role catalog in ``UserState.available_roles``) and the way
+``UserListState`` does now (``UserRow`` DTOs, the catalog is static), then
+reports the bytes the state manager stores (pickled substates) and the bytes
+of the vars sent to the browser (JSON)::
+
+    python -m benchmarks.state_size --users 50
+
+Exits with 1 if the state did not shrink.
+"""
+
+import argparse
+import json
+import sys
+from datetime import UTC, datetime
+from typing import Any
+
+
+def load_app() -> None:
+    """Configure the app, the appkit modules look up the registry on import."""
+    import app  # noqa: F401, PLC0415
+
+
+def sample_users(count: int) -> list[Any]:
+    from appkit_user.authentication.backend.entities import (  # noqa: PLC0415
+        UserEntity,
+    )
+
+    from app.roles import ALL_ROLES  # noqa: PLC0415
+
+    role_names = [role.name for role in ALL_ROLES]
+    return [
+        UserEntity(
+            id=index + 1,
+            email=f"user-{index}@example.com",
+            name=f"Benutzer {index}",
+            avatar_url="",
+            is_verified=True,
+            is_admin=index % 20 == 0,
+            is_active=index % 10 != 0,
+            needs_password_reset=False,
+            roles=role_names[: index % (len(role_names) + 1)],
+            last_login=datetime(2026, 10, 18, tzinfo=UTC),
+        )
+        for index in range(count)
+    ]
+
+
+def measure(fill: Any) -> dict[str, int]:
+    """Sizes of the user table states after ``fill(user_state, list_state)``.
+
+    ``fill`` returns the vars it set, they are sent to the browser on hydrate.
+    """
+    from reflex.state import State  # noqa: PLC0415
+    from reflex_base.utils.format import json_dumps  # noqa: PLC0415
+
+    from appkit_user.user_management.states.user_states import (  # noqa: PLC0415
+        UserState,
+    )
+
+    from app.states.user_states import UserListState  # noqa: PLC0415
+
+    root = State(_reflex_internal_init=True)
+    user_state = root.get_substate(UserState.get_full_name().split("."))
+    list_state = root.get_substate(UserListState.get_full_name().split("."))
+    client_vars = fill(user_state, list_state)
+    return {
+        "pickled": len(user_state._serialize()) + len(list_state._serialize()),  # noqa: SLF001
+        "json": len(json_dumps(client_vars)),
+    }
+
+
+def run(count: int) -> dict[str, dict[str, int]]:
+    load_app()
+    from appkit_user.authentication.backend.models import User  # noqa: PLC0415
+
+    from app.roles import ALL_ROLES  # noqa: PLC0415
+    from app.states.user_states import UserRow  # noqa: PLC0415
+
+    users = sample_users(count)
+
+    def before(user_state: Any, _list_state: Any) -> dict[str, Any]:
+        user_state.users = [User(**user.to_dict()) for user in users]
+        user_state.selected_user = user_state.users[0]
+        # set_available_roles(ALL_ROLES) on every load, the event payload is JSON
+        user_state.available_roles = [
+            {"name": role.name, "label": role.label, "description": role.description}
+            for role in ALL_ROLES
+        ]
+        return {
+            "users": user_state.users,
+            "selected_user": user_state.selected_user,
+            "available_roles": user_state.available_roles,
+        }
+
+    def after(_user_state: Any, list_state: Any) -> dict[str, Any]:
+        list_state.users = [UserRow.from_entity(user) for user in users]
+        list_state.selected_user = list_state.users[0]
+        return {"users": list_state.users, "selected_user": list_state.selected_user}
+
+    return {"before": measure(before), "after": measure(after)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="users on the page")
+    args = parser.parse_args()
+
+    results = run(args.users)
+    for key in ("pickled", "json"):
+        results.setdefault("ratio", {})[key] = round(
+            results["after"][key] / results["before"][key], 3
+        )
+    print(json.dumps(results, indent=2))  # noqa: T201
+    if results["after"]["pickled"] >= results["before"]["pickled"]:
+        print("The serialized state did not shrink", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Percentiles and stored baselines shared by the benchmarks.
+
+A baseline is a JSON file of ``{metric: value}`` per scenario. Latency metrics
+(``p50``, ``p95``, ``p99``) regress when they grow, ``throughput`` regresses
+when it shrinks, both beyond the relative ``tolerance``. ``errors`` regress as
+soon as there are more than in the baseline. A metric of the baseline missing
+from the results, e.g. the latencies of a step that never completed, is a
+regression as well.
+"""
+
+import json
+import statistics
+from pathlib import Path
+from typing import Final
+
+HIGHER_IS_BETTER: Final = frozenset({"throughput"})
+# counts compared without tolerance
+EXACT: Final = frozenset({"errors"})
+
+Results = dict[str, dict[str, float]]
+
+
+def summary(timings: list[float]) -> dict[str, float]:
+    """p50, p95 and p99 of ``timings``, in their unit, none without timings."""
+    if not timings:
+        return {}
+    if len(timings) < 2:  # noqa: PLR2004
+        value = round(timings[0], 2)
+        return {"p50": value, "p95": value, "p99": value}
+    percentiles = statistics.quantiles(timings, n=100)
+    return {
+        "p50": round(percentiles[49], 2),
+        "p95": round(percentiles[94], 2),
+        "p99": round(percentiles[98], 2),
+    }
+
+
+def load_baseline(path: Path) -> Results | None:
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(path: Path, results: Results) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+    )
+
+
+def regressions(results: Results, baseline: Results, tolerance: float) -> list[str]:
+    """Describe every metric of ``results`` worse than its baseline."""
+    found = []
+    for scenario, metrics in baseline.items():
+        current = results.get(scenario)
+        if current is None:
+            found.append(f"{scenario}: missing")
+            continue
+        for metric, expected in metrics.items():
+            value = current.get(metric)
+            if value is None:
+                found.append(f"{scenario} {metric}: missing")
+                continue
+            if metric in EXACT:
+                regressed = value > expected
+            elif not expected:
+                continue
+            elif metric in HIGHER_IS_BETTER:
+                regressed = value < expected * (1 - tolerance)
+            else:
+                regressed = value > expected * (1 + tolerance)
+            if regressed:
+                found.append(f"{scenario} {metric}: {value} (baseline {expected})")
+    return found
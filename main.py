@@ -1,5 +1,159 @@
-def main():
-    print("Hello from project-kit!")
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+
+def reap_sessions(_args: argparse.Namespace) -> None:
+    from app.backend.session_reaper import reap  # noqa: PLC0415
+
+    asyncio.run(reap())
+
+
+def rotate_oauth_tokens(_args: argparse.Namespace) -> None:
+    from app.backend.oauth_tokens import (  # noqa: PLC0415
+        rotate_oauth_tokens as rotate,
+    )
+
+    run = asyncio.run(rotate())
+    if run.failed:
+        sys.exit(1)
+
+
+def build_assets(args: argparse.Namespace) -> None:
+    from app.asset_pipeline import build_assets  # noqa: PLC0415
+
+    build_assets(fonts=args.fonts)
+
+
+def trace_collector(args: argparse.Namespace) -> None:
+    from app.backend.tracing import serve_collector  # noqa: PLC0415
+
+    serve_collector(args.host, args.port, Path(args.output))
+
+
+def import_users(args: argparse.Namespace) -> None:
+    from app.backend.user_transfer import (  # noqa: PLC0415
+        FileFormat,
+        OnConflict,
+        import_users,
+    )
+
+    report = import_users(
+        Path(args.file),
+        file_format=FileFormat(args.format) if args.format else None,
+        on_conflict=OnConflict(args.on_conflict),
+        batch_size=args.batch_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        strict=args.strict,
+    )
+    for error in report.errors:
+        print(error, file=sys.stderr)  # noqa: T201
+    print(  # noqa: T201
+        f"{report.rows} rows: {report.inserted} inserted, {report.updated} updated, "
+        f"{report.skipped} skipped, {report.invalid} invalid "
+        f"in {report.duration_ms / 1000:.1f}s"
+    )
+    if report.invalid and args.strict:
+        sys.exit(1)
+
+
+def export_users(args: argparse.Namespace) -> None:
+    from app.backend.user_transfer import FileFormat, export_users  # noqa: PLC0415
+
+    count = export_users(
+        Path(args.file),
+        file_format=FileFormat(args.format) if args.format else None,
+        with_password_hash=args.with_password_hash,
+    )
+    print(f"{count} users exported to {args.file}")  # noqa: T201
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="project-kit")
+    commands = parser.add_subparsers(title="commands", required=True)
+
+    reap_parser = commands.add_parser(
+        "reap-sessions",
+        help="delete expired sessions and oauth states once",
+    )
+    reap_parser.set_defaults(func=reap_sessions)
+
+    rotate_parser = commands.add_parser(
+        "rotate-oauth-tokens",
+        help="re-encrypt the oauth tokens of previous keys with the current key",
+    )
+    rotate_parser.set_defaults(func=rotate_oauth_tokens)
+
+    assets_parser = commands.add_parser(
+        "build-assets",
+        help="optimize, hash and compress the static assets",
+    )
+    assets_parser.add_argument(
+        "--fonts",
+        action="store_true",
+        help="also download and subset the fonts (needs network access)",
+    )
+    assets_parser.set_defaults(func=build_assets)
+
+    collector_parser = commands.add_parser(
+        "trace-collector",
+        help="receive OTLP/HTTP JSON traces locally and write them as JSON lines",
+    )
+    collector_parser.add_argument("--host", default="127.0.0.1")
+    collector_parser.add_argument("--port", type=int, default=4318)
+    collector_parser.add_argument("--output", default="traces/collector.jsonl")
+    collector_parser.set_defaults(func=trace_collector)
+
+    import_parser = commands.add_parser(
+        "import-users",
+        help="bulk import users and their roles from a CSV or JSON lines file",
+    )
+    import_parser.add_argument("file")
+    import_parser.add_argument(
+        "--format",
+        choices=["csv", "jsonl"],
+        help="file format, defaults to the file extension",
+    )
+    import_parser.add_argument(
+        "--on-conflict",
+        choices=["skip", "update"],
+        default="skip",
+        help="what to do with users whose email already exists",
+    )
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.add_argument(
+        "--workers",
+        type=int,
+        help="processes hashing the passwords, defaults to the number of CPUs",
+    )
+    import_parser.add_argument(
+        "--dry-run", action="store_true", help="only validate the file"
+    )
+    import_parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="validate the whole file first, import nothing and exit with 1 if a "
+        "row is invalid",
+    )
+    import_parser.set_defaults(func=import_users)
+
+    export_parser = commands.add_parser(
+        "export-users",
+        help="export all users and their roles to a CSV or JSON lines file",
+    )
+    export_parser.add_argument("file")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"])
+    export_parser.add_argument(
+        "--with-password-hash",
+        action="store_true",
+        help="include the password hashes, e.g. to move users between databases",
+    )
+    export_parser.set_defaults(func=export_users)
+
+    args = parser.parse_args()
+    args.func(args)
 
 
 if __name__ == "__main__":
@@ -8,8 +8,10 @@ from appkit_commons.database.configuration import DatabaseConfig
 from appkit_commons.registry import service_registry
 
 from app import configuration
+from app.startup import profiler
 
-init_logging(configuration)
+with profiler.phase("init_logging"):
+    init_logging(configuration)
 logger = logging.getLogger(__name__)
 
 database: DatabaseConfig | None = service_registry().get(DatabaseConfig)
@@ -21,9 +23,12 @@ config = rx.Config(
     backend_port=reflex.backend_port if reflex else 3030,
     gunicorn_workers=reflex.workers if reflex else 1,
     db_url=database.url,
+    # rx.asession shares the engine of app.backend.database
     async_db_url=database.url,
     telemetry_enabled=False,
     show_built_with_reflex=False,
+    # .br/.gz siblings of the exported frontend, served by reflex when accepted
+    frontend_compression_formats=["brotli", "gzip"],
     plugins=[
         # rx.plugins.SitemapPlugin(),
         rx.plugins.TailwindV4Plugin(),
@@ -0,0 +1,8 @@
+#!/bin/sh
+set -e
+
+# Containers starting at the same time migrate one after the other, the
+# migration takes an advisory lock on the database (alembic/env.py).
+uv run alembic upgrade head
+
+exec uv run reflex run --env prod
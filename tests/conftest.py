@@ -0,0 +1,2 @@
+# the service registry is configured when the app package is imported
+import app  # noqa: F401
@@ -0,0 +1,23 @@
+from app.asset_pipeline import minify_svg
+
+SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<!-- exported by an editor -->
+<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24">
+  <metadata><rdf:RDF/></metadata>
+  <path d="M 0 0
+           L 10   10 Z" fill="none"/>
+  <text x="1" y="20"><tspan>Project</tspan> <tspan>Kit  2</tspan></text>
+  <g aria-label="two  words">
+  </g>
+</svg>
+"""
+
+
+def test_minify_svg() -> None:
+    assert minify_svg(SVG) == (
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24">'
+        '<path d="M 0 0 L 10 10 Z" fill="none"/>'
+        '<text x="1" y="20"><tspan>Project</tspan> <tspan>Kit  2</tspan></text>'
+        '<g aria-label="two  words"></g>'
+        "</svg>\n"
+    )
@@ -0,0 +1,48 @@
+from benchmarks.stats import regressions, summary
+
+BASELINE = {
+    "login": {"p50": 10.0, "p95": 20.0, "p99": 30.0},
+    "flow": {"p50": 100.0, "p95": 200.0, "p99": 300.0, "throughput": 50.0, "errors": 0},
+}
+
+
+def _results(**flow: float) -> dict[str, dict[str, float]]:
+    return {
+        "login": dict(BASELINE["login"]),
+        "flow": {**BASELINE["flow"], **flow},
+    }
+
+
+def test_summary() -> None:
+    assert summary([]) == {}
+    assert summary([1.234]) == {"p50": 1.23, "p95": 1.23, "p99": 1.23}
+    assert summary([float(value) for value in range(1, 101)])["p50"] == 50.5
+
+
+def test_no_regressions_within_tolerance() -> None:
+    assert regressions(_results(p95=230.0, throughput=45.0), BASELINE, 0.2) == []
+
+
+def test_slower_and_less_throughput_regress() -> None:
+    found = regressions(_results(p95=250.0, throughput=35.0), BASELINE, 0.2)
+    assert found == [
+        "flow p95: 250.0 (baseline 200.0)",
+        "flow throughput: 35.0 (baseline 50.0)",
+    ]
+
+
+def test_any_error_regresses() -> None:
+    assert regressions(_results(errors=1), BASELINE, 0.2) == [
+        "flow errors: 1 (baseline 0)"
+    ]
+
+
+def test_step_without_timings_regresses() -> None:
+    results = _results()
+    results["login"] = summary([])
+
+    assert regressions(results, BASELINE, 0.2) == [
+        "login p50: missing",
+        "login p95: missing",
+        "login p99: missing",
+    ]
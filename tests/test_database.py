@@ -0,0 +1,30 @@
+import pytest
+from reflex import model as rx_model
+
+from appkit_commons.database import session as db_session
+from appkit_commons.database.configuration import DatabaseConfig
+from appkit_commons.registry import service_registry
+
+from app.backend import database
+
+
+@pytest.fixture
+def installed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(rx_model, "get_async_engine", rx_model.get_async_engine)
+    monkeypatch.setattr(
+        db_session, "get_async_session_manager", db_session.get_async_session_manager
+    )
+    database.install_database_pool()
+    yield
+    database.get_async_session_manager.cache_clear()
+
+
+@pytest.mark.usefixtures("installed")
+def test_reflex_sessions_share_the_instrumented_pool() -> None:
+    url = service_registry().get(DatabaseConfig).url
+
+    engine = rx_model.get_async_engine(None)
+
+    assert engine is rx_model.get_async_engine(url)
+    assert engine.pool is database._pool()  # noqa: SLF001
+    assert isinstance(engine.pool, database.InstrumentedAsyncPool)
@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import pytest
+
+from app.backend.invalidation import (
+    InvalidationEvent,
+    InvalidationKind,
+    PostgresInvalidationBus,
+)
+
+
+def _bus(received: list[InvalidationEvent]) -> PostgresInvalidationBus:
+    bus = PostgresInvalidationBus("postgresql://", "test_invalidation")
+    bus.subscribe(InvalidationKind.USER, received.append)
+    return bus
+
+
+def test_bus_ignores_only_its_own_events() -> None:
+    first_received: list[InvalidationEvent] = []
+    second_received: list[InvalidationEvent] = []
+    first, second = _bus(first_received), _bus(second_received)
+
+    event = InvalidationEvent(InvalidationKind.USER, "1", first.origin)
+    asyncio.run(first._receive(event.to_json()))  # noqa: SLF001
+    asyncio.run(second._receive(event.to_json()))  # noqa: SLF001
+
+    assert first.origin != second.origin
+    assert first_received == []
+    assert second_received == [event]
+
+
+def test_forked_worker_gets_its_own_origin(monkeypatch: pytest.MonkeyPatch) -> None:
+    parent_received: list[InvalidationEvent] = []
+    bus = _bus(parent_received)
+    parent_origin = bus.origin
+    event = InvalidationEvent(InvalidationKind.USER, "1", parent_origin)
+
+    # the bus of a worker forked after the app was preloaded
+    pid = os.getpid()
+    monkeypatch.setattr(os, "getpid", lambda: pid + 1)
+    assert bus.origin != parent_origin
+    assert bus.origin == bus.origin
+
+    asyncio.run(bus._receive(event.to_json()))  # noqa: SLF001
+    assert parent_received == [event]
+
+
+class BrokenConnection:
+    closed = False
+
+    async def execute(self, *_args: object) -> None:
+        raise OSError("connection reset")
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_failed_publish_closes_the_connection() -> None:
+    received: list[InvalidationEvent] = []
+    bus = _bus(received)
+    conn = BrokenConnection()
+    bus._publish_conn = conn  # noqa: SLF001
+
+    asyncio.run(bus.publish(InvalidationKind.USER, 1))
+
+    assert len(received) == 1
+    assert conn.closed
+    assert bus._publish_conn is None  # noqa: SLF001
@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator, Iterator
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, lazyload, load_only
+
+from appkit_user.authentication.backend.entities import UserEntity
+
+from app.backend import last_seen
+from app.backend.last_seen import LastSeenBuffer, _update_statement
+from app.configuration import LastSeenConfig
+
+EARLIER = datetime(2026, 10, 1, 8, 0, tzinfo=UTC)
+LATER = EARLIER + timedelta(hours=1)
+
+
+@pytest.fixture
+def buffer(monkeypatch: pytest.MonkeyPatch) -> LastSeenBuffer:
+    buffer = LastSeenBuffer(LastSeenConfig(batch_size=2))
+    monkeypatch.setattr(last_seen, "last_seen_buffer", lambda: buffer)
+    return buffer
+
+
+@pytest.fixture
+def session(buffer: LastSeenBuffer) -> Iterator[Session]:  # noqa: ARG001
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        # the columns loaded below, roles is a postgres ARRAY
+        connection.execute(
+            text(
+                "CREATE TABLE auth_users (id INTEGER PRIMARY KEY, name TEXT,"
+                " last_login TIMESTAMP, updated TIMESTAMP)"
+            )
+        )
+        connection.execute(text("INSERT INTO auth_users (id, name) VALUES (1, 'Ada')"))
+    statements: list[str] = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda _conn, _cursor, statement, *_args: statements.append(statement),
+    )
+    with Session(engine) as session:
+        event.listen(session, "before_flush", last_seen._buffer_last_login)  # noqa: SLF001
+        session.info["statements"] = statements
+        yield session
+
+
+def _user(session: Session) -> UserEntity:
+    user = session.scalars(
+        select(UserEntity).options(
+            load_only(UserEntity.id, UserEntity.name, UserEntity.last_login),
+            lazyload("*"),
+        )
+    ).one()
+    session.info["statements"].clear()
+    return user
+
+
+def _stored_last_login(session: Session) -> Any:
+    return session.execute(text("SELECT last_login FROM auth_users")).scalar()
+
+
+def test_login_is_buffered_instead_of_written(
+    session: Session, buffer: LastSeenBuffer
+) -> None:
+    user = _user(session)
+
+    user.last_login = LATER
+    session.commit()
+
+    assert session.info["statements"] == []
+    assert buffer._pending == {1: LATER}  # noqa: SLF001
+    assert buffer.stats.recorded == 1
+    assert _stored_last_login(session) is None
+
+
+def test_other_changes_are_written_without_the_login(
+    session: Session, buffer: LastSeenBuffer
+) -> None:
+    user = _user(session)
+
+    user.last_login = LATER
+    user.name = "Ada Lovelace"
+    session.commit()
+
+    (update,) = session.info["statements"]
+    assert update.startswith("UPDATE auth_users SET name=?")
+    # not the assigned timestamp, appkit_user's onupdate of every row update
+    assert "last_login=?" not in update
+    assert "last_login=CURRENT_TIMESTAMP" in update
+    assert buffer._pending == {1: LATER}  # noqa: SLF001
+
+
+def test_buffer_keeps_the_latest_login(buffer: LastSeenBuffer) -> None:
+    buffer.record(1, LATER)
+    buffer.record(1, EARLIER)
+    buffer.record(2, EARLIER)
+
+    assert buffer._pending == {1: LATER, 2: EARLIER}  # noqa: SLF001
+    assert len(buffer) == 2
+
+
+def test_update_never_moves_a_login_backwards() -> None:
+    sql = str(
+        _update_statement([(1, LATER)]).compile(dialect=postgresql.dialect())
+    ).replace("\n", " ")
+
+    assert sql.startswith("UPDATE auth_users SET last_login=seen.seen_at FROM (VALUES")
+    assert "AS seen (id, seen_at)" in sql
+    assert sql.endswith(
+        "WHERE auth_users.id = seen.id AND (auth_users.last_login IS NULL"
+        " OR auth_users.last_login < seen.seen_at)"
+    )
+    # the writes of the buffer leave auth_users.updated alone
+    assert "updated" not in sql
+
+
+class FakeSession:
+    def __init__(self, fail: bool = False, during: Any = None) -> None:
+        self.fail = fail
+        self.during = during
+        self.rows: list[list[tuple[int, datetime]]] = []
+        self.committed = False
+
+    async def execute(self, statement: Any) -> SimpleNamespace:
+        if self.during is not None:
+            self.during()
+        if self.fail:
+            raise OSError("connection reset")
+        params = statement.compile(dialect=postgresql.dialect()).params
+        rows = [
+            (params[f"param_{index}"], params[f"param_{index + 1}"])
+            for index in range(1, len(params) + 1, 2)
+        ]
+        self.rows.append(rows)
+        return SimpleNamespace(rowcount=len(rows))
+
+    async def commit(self) -> None:
+        self.committed = True
+
+
+def _database(monkeypatch: pytest.MonkeyPatch, db: FakeSession) -> None:
+    @contextlib.asynccontextmanager
+    async def get_asyncdb_session() -> AsyncIterator[FakeSession]:
+        yield db
+
+    monkeypatch.setattr(last_seen, "get_asyncdb_session", get_asyncdb_session)
+
+
+def test_flush_writes_batches_of_users(
+    monkeypatch: pytest.MonkeyPatch, buffer: LastSeenBuffer
+) -> None:
+    db = FakeSession()
+    _database(monkeypatch, db)
+    for user_id in (3, 1, 2):
+        buffer.record(user_id, LATER)
+
+    assert asyncio.run(buffer.flush()) == 3
+
+    assert [[user_id for user_id, _ in rows] for rows in db.rows] == [[1, 2], [3]]
+    assert db.committed
+    assert len(buffer) == 0
+    assert not buffer.due()
+    assert buffer.stats.rows_written == 3
+
+
+def test_failed_flush_puts_the_logins_back(
+    monkeypatch: pytest.MonkeyPatch, buffer: LastSeenBuffer
+) -> None:
+    buffer.record(1, EARLIER)
+    buffer.record(2, LATER)
+    # a newer login of user 1 and an older one of user 2 arrive while writing
+    db = FakeSession(
+        fail=True,
+        during=lambda: (buffer.record(1, LATER), buffer.record(2, EARLIER)),
+    )
+    _database(monkeypatch, db)
+
+    with pytest.raises(OSError, match="connection reset"):
+        asyncio.run(buffer.flush())
+
+    assert buffer._pending == {1: LATER, 2: LATER}  # noqa: SLF001
+    assert buffer.stats.failed_flushes == 1
+    assert buffer.stats.flushes == 0
+
+    db.fail, db.during = False, None
+    assert asyncio.run(buffer.flush()) == 2
+    assert db.rows == [[(1, LATER), (2, LATER)]]
+    assert len(buffer) == 0
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from pydantic import SecretStr
+
+from app.backend import monitoring
+from app.backend.monitoring import MetricsEndpoint
+from app.configuration import MetricsConfig
+
+
+async def _app(_scope: dict, _receive: object, _send: object) -> None:
+    raise AssertionError("not a request of the metrics endpoint")
+
+
+def _status(config: MetricsConfig, client: str, headers: list | None = None) -> int:
+    messages = []
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": config.path,
+        "headers": headers or [],
+        "client": (client, 50000),
+    }
+    asyncio.run(MetricsEndpoint(_app, config)(scope, None, send))
+    return messages[0]["status"]
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(monitoring, "aggregate", lambda _config: [])
+
+
+@pytest.mark.parametrize(
+    ("client", "status"), [("127.0.0.1", 200), ("::1", 200), ("203.0.113.7", 403)]
+)
+def test_only_allowed_networks_without_token(client: str, status: int) -> None:
+    assert _status(MetricsConfig(), client) == status
+
+
+@pytest.mark.parametrize(
+    ("authorization", "status"),
+    [(b"Bearer scrape", 200), (b"Bearer other", 403), (None, 403)],
+)
+def test_bearer_token(authorization: bytes | None, status: int) -> None:
+    config = MetricsConfig(allowed_networks=[], bearer_token=SecretStr("scrape"))
+    headers = [(b"authorization", authorization)] if authorization else []
+
+    assert _status(config, "203.0.113.7", headers) == status
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+from appkit_user.authentication.backend import user_repository
+from appkit_user.authentication.backend.entities import OAuthAccountEntity
+
+from app.backend import oauth_tokens
+
+
+class FakeAccount:
+    """An account whose token columns are deferred until refreshed."""
+
+    def __getattr__(self, name: str) -> str:
+        if name in oauth_tokens.TOKEN_COLUMNS:
+            raise AssertionError(f"lazy load of {name} outside a greenlet")
+        raise AttributeError(name)
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.refreshed: list[tuple[object, list[str]]] = []
+
+    async def refresh(self, instance: FakeAccount, attribute_names: list[str]) -> None:
+        self.refreshed.append((instance, attribute_names))
+        for name in attribute_names:
+            instance.__dict__[name] = f"stored {name}"
+
+
+@pytest.fixture
+def lazy_loading(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def update_existing_oauth_user(db, oauth_account, user_info, token):  # noqa: ARG001
+        # what appkit_user does with the tokens of a returning user
+        oauth_account.access_token = token.get(
+            "access_token", oauth_account.access_token
+        )
+        oauth_account.refresh_token = token.get("refresh_token")
+        return SimpleNamespace(account=oauth_account)
+
+    monkeypatch.setattr(
+        user_repository, "_update_existing_oauth_user", update_existing_oauth_user
+    )
+    oauth_tokens._install_lazy_loading()  # noqa: SLF001
+    yield
+    event.remove(Session, "do_orm_execute", oauth_tokens._defer_tokens)  # noqa: SLF001
+
+
+@pytest.mark.usefixtures("lazy_loading")
+@pytest.mark.parametrize(
+    "token",
+    [
+        {"access_token": "new access", "refresh_token": "new refresh"},
+        {"refresh_token": "new refresh"},
+    ],
+)
+def test_returning_user_refreshes_tokens(token: dict) -> None:
+    db = FakeSession()
+    account = FakeAccount()
+
+    result = asyncio.run(
+        user_repository._update_existing_oauth_user(db, account, {}, token)  # noqa: SLF001
+    )
+
+    assert db.refreshed == [(account, ["access_token", "refresh_token"])]
+    assert result.account.access_token == token.get(
+        "access_token", "stored access_token"
+    )
+    assert result.account.refresh_token == "new refresh"  # noqa: S105
+
+
+@pytest.fixture
+def session() -> Session:
+    engine = create_engine("sqlite://")
+    OAuthAccountEntity.__table__.create(engine)
+    statements: list[str] = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda _conn, _cursor, statement, *_args: statements.append(statement),
+    )
+    with Session(engine) as session:
+        event.listen(session, "do_orm_execute", oauth_tokens._defer_tokens)  # noqa: SLF001
+        session.info["statements"] = statements
+        yield session
+
+
+def test_accounts_are_selected_without_tokens(session: Session) -> None:
+    session.execute(select(OAuthAccountEntity)).all()
+
+    (sql,) = session.info["statements"]
+    assert "provider" in sql
+    assert "access_token" not in sql
+    assert "refresh_token" not in sql
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        select(OAuthAccountEntity.id),
+        select(func.count(OAuthAccountEntity.id)),
+        select(OAuthAccountEntity.id, OAuthAccountEntity.access_token),
+    ],
+)
+def test_column_selects_are_left_alone(session: Session, statement: Any) -> None:
+    session.execute(statement).all()
+
+    assert len(session.info["statements"]) == 1
@@ -0,0 +1,48 @@
+import pytest
+from pydantic import ValidationError
+
+from appkit_commons.security import generate_password_hash
+
+from app.backend.password_hashing import PasswordHasher
+from app.configuration import PasswordHashingConfig
+
+
+@pytest.mark.parametrize(
+    ("method", "full_method"),
+    [
+        ("scrypt", "scrypt:32768:8:1"),
+        ("scrypt:16384:8:1", "scrypt:16384:8:1"),
+        ("pbkdf2", "pbkdf2:sha256:1000000"),
+        ("pbkdf2:sha512", "pbkdf2:sha512:1000000"),
+        ("pbkdf2:sha256:600000", "pbkdf2:sha256:600000"),
+    ],
+)
+def test_method_is_stored_with_all_parameters(method: str, full_method: str) -> None:
+    assert PasswordHashingConfig(method=method).method == full_method
+
+
+@pytest.mark.parametrize("method", ["md5", "scrypt:16384", "pbkdf2:sha256:many"])
+def test_invalid_method(method: str) -> None:
+    with pytest.raises(ValidationError):
+        PasswordHashingConfig(method=method)
+
+
+@pytest.mark.parametrize(
+    ("method", "hash_method", "rehash"),
+    [
+        ("pbkdf2:sha256:1000", "pbkdf2:sha256:1000", False),
+        ("pbkdf2:sha256:1000", "pbkdf2:sha256:2000", True),
+        ("scrypt", "pbkdf2:sha256:1000", True),
+    ],
+)
+def test_needs_rehash(method: str, hash_method: str, rehash: bool) -> None:
+    hasher = PasswordHasher(PasswordHashingConfig(method=method))
+
+    assert hasher.needs_rehash(generate_password_hash("secret", hash_method)) is rehash
+
+
+def test_shorthand_method_does_not_rehash_its_own_hashes() -> None:
+    hasher = PasswordHasher(PasswordHashingConfig(method="scrypt"))
+    pwhash = generate_password_hash("secret", "scrypt")
+
+    assert not hasher.needs_rehash(pwhash)
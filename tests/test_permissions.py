@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from reflex.utils.format import format_event_handler
+from reflex_base.registry import RegistrationContext
+
+from appkit_user.authentication.backend import user_repository
+from appkit_user.user_management.states.user_states import UserState
+
+from app.roles import ADMIN, ROLES
+from app.states.permission_states import PermissionState, permission_required
+from app.states.user_states import UserListState
+
+
+class FakeState:
+    def __init__(self, permissions: int) -> None:
+        self.permission_state = SimpleNamespace(permissions=permissions)
+        self.router = SimpleNamespace(session=SimpleNamespace(client_token="client"))
+        self.calls: list[str] = []
+
+    async def get_state(self, state_cls: type) -> SimpleNamespace:
+        assert state_cls is PermissionState
+        return self.permission_state
+
+    @permission_required(ADMIN)
+    async def delete(self, user_id: int) -> str:
+        self.calls.append(f"delete {user_id}")
+        return "deleted"
+
+    @permission_required(ADMIN)
+    async def reload(self) -> object:
+        self.calls.append("reload")
+        yield "loading"
+        yield "loaded"
+
+
+async def _updates(state: FakeState) -> list:
+    return [update async for update in state.reload()]
+
+
+@pytest.mark.parametrize(
+    "permissions", [ADMIN, ROLES.bitmap(["project_manager"], is_admin=True)]
+)
+def test_permitted_handlers_run(permissions: int) -> None:
+    state = FakeState(permissions)
+
+    assert asyncio.run(state.delete(1)) == "deleted"
+    assert asyncio.run(_updates(state)) == ["loading", "loaded"]
+    assert state.calls == ["delete 1", "reload"]
+
+
+@pytest.mark.parametrize("permissions", [0, ROLES.mask("project_manager")])
+def test_denied_handlers_do_not_run(permissions: int) -> None:
+    state = FakeState(permissions)
+
+    assert asyncio.run(state.delete(1)) != "deleted"
+    assert len(asyncio.run(_updates(state))) == 1
+    assert state.calls == []
+
+
+@pytest.mark.parametrize(
+    "handler",
+    [
+        "load_users",
+        "select_user",
+        "create_user",
+        "update_user",
+        "delete_user",
+        "first_page",
+        "next_page",
+        "previous_page",
+        "set_search",
+        "set_sort",
+        "set_active_only",
+        "set_role",
+    ],
+)
+def test_user_management_requires_admin(handler: str) -> None:
+    fn = getattr(UserListState, handler).fn
+    assert fn.__qualname__.startswith("UserListState.")
+    assert hasattr(fn, "__wrapped__")
+
+
+@pytest.mark.parametrize(
+    "handler",
+    [
+        "set_available_roles",
+        "load_users",
+        "create_user",
+        "update_user",
+        "delete_user",
+        "select_user",
+        "user_has_role",
+    ],
+)
+def test_appkit_user_state_requires_admin(handler: str) -> None:
+    fn = getattr(UserState, handler).fn
+    assert fn.__qualname__.startswith("UserState.")
+    assert hasattr(fn, "__wrapped__")
+
+
+def test_event_to_appkit_user_state_is_denied(monkeypatch: pytest.MonkeyPatch) -> None:
+    deleted: list[int] = []
+
+    async def delete_user(_session: object, user_id: int) -> bool:
+        deleted.append(user_id)
+        return True
+
+    monkeypatch.setattr(user_repository, "delete_user", delete_user)
+    # the handler the event processor runs for "...user_state.delete_user"
+    event_name = format_event_handler(UserState.delete_user)
+    registered = RegistrationContext.get().event_handlers[event_name]
+    state = FakeState(ROLES.mask("project_manager"))
+
+    update = asyncio.run(registered.handler.fn(state, 1))
+
+    assert registered.states == (UserState,)
+    assert "Keine Berechtigung" in str(update)
+    assert deleted == []
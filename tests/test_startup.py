@@ -0,0 +1,15 @@
+import json
+from pathlib import Path
+
+from app.startup import StartupProfiler
+
+
+def test_report_is_written_to_a_new_directory(tmp_path: Path) -> None:
+    profiler = StartupProfiler(str(tmp_path / "profiles" / "startup-{pid}.json"))
+    with profiler.phase("bootstrap"):
+        pass
+
+    profiler.finish()
+
+    (report,) = (tmp_path / "profiles").iterdir()
+    assert json.loads(report.read_text())["phases"][0]["phase"] == "bootstrap"
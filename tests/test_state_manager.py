@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+
+import psycopg
+import pytest
+import reflex as rx
+from reflex.istate.manager.token import BaseStateToken
+from reflex_base.utils.exceptions import LockExpiredError
+
+from app.backend import state_manager
+from app.backend.state_manager import StateManagerPostgres, decode
+from app.configuration import StateManagerConfig
+
+
+class CounterState(rx.State):
+    count: int = 0
+
+
+class FakeDatabase:
+    """The rows of ``reflex_states`` and the advisory locks of all sessions."""
+
+    def __init__(self) -> None:
+        self.rows: dict[tuple[str, str], bytes] = {}
+        self.locks: dict[tuple, FakeConnection] = {}
+
+
+class FakeCursor:
+    def __init__(self, connection: "FakeConnection", rows: list | None = None) -> None:
+        self.connection = connection
+        self.rows = rows or []
+        self.rowcount = len(self.rows)
+
+    async def fetchone(self) -> tuple | None:
+        return self.rows[0] if self.rows else None
+
+    async def fetchall(self) -> list:
+        return self.rows
+
+    async def executemany(self, query: str, params: list) -> None:
+        for row in params:
+            await self.connection.execute(query, row)
+
+    async def __aenter__(self) -> "FakeCursor":
+        return self
+
+    async def __aexit__(self, *_exc: object) -> None:
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db: FakeDatabase) -> None:
+        self.db = db
+        self.closed = False
+
+    async def execute(self, query: str, params: tuple = ()) -> FakeCursor:
+        rows = []
+        if query == state_manager._TRY_LOCK:  # noqa: SLF001
+            holder = self.db.locks.setdefault(params, self)
+            rows = [(holder is self,)]
+        elif query == state_manager._UNLOCK:  # noqa: SLF001
+            rows = [(self.db.locks.pop(params, None) is self,)]
+        elif query == state_manager._SELECT_TREE:  # noqa: SLF001
+            rows = [
+                (name, data)
+                for (ident, name), data in self.db.rows.items()
+                if ident == params[0]
+            ]
+        elif query == state_manager._UPSERT:  # noqa: SLF001
+            ident, name, data, _expiration = params
+            self.db.rows[ident, name] = data
+        return FakeCursor(self, rows)
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    async def commit(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+        # the session-level locks end with the session
+        for key, holder in list(self.db.locks.items()):
+            if holder is self:
+                del self.db.locks[key]
+
+
+class FakePool:
+    conninfo = "postgresql://"
+
+    def __init__(self, db: FakeDatabase) -> None:
+        self.db = db
+        self.in_use = 0
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[FakeConnection]:
+        self.in_use += 1
+        try:
+            yield FakeConnection(self.db)
+        finally:
+            self.in_use -= 1
+
+
+@pytest.fixture
+def db(monkeypatch: pytest.MonkeyPatch) -> FakeDatabase:
+    db = FakeDatabase()
+
+    async def connect(*_args: object, **_kwargs: object) -> FakeConnection:
+        return FakeConnection(db)
+
+    monkeypatch.setattr(psycopg.AsyncConnection, "connect", connect)
+    return db
+
+
+def _manager(db: FakeDatabase, **config: object) -> StateManagerPostgres:
+    return StateManagerPostgres(
+        pool=FakePool(db),
+        config=StateManagerConfig(**{"lock_timeout": 20, **config}),
+        token_expiration=3600,
+    )
+
+
+def _token(ident: str = "client") -> BaseStateToken:
+    return BaseStateToken(ident=ident, cls=CounterState)
+
+
+async def _increment(manager: StateManagerPostgres) -> None:
+    async with manager.modify_state(_token()) as state:
+        state.substates[CounterState.get_name()].count += 1
+
+
+def _stored_count(db: FakeDatabase) -> int:
+    blob = db.rows[("client", CounterState.get_full_name())]
+    return rx.State._deserialize(data=decode(blob)).count  # noqa: SLF001
+
+
+def test_events_within_the_write_back_delay_are_written_once(
+    db: FakeDatabase,
+) -> None:
+    manager = _manager(db, write_back_delay=0.05, max_hold=1.0)
+
+    async def events() -> None:
+        await _increment(manager)
+        await _increment(manager)
+        # the lock is held, but no connection of the pool
+        assert db.locks
+        assert manager.pool.in_use == 0
+        assert manager.stats.flushes == 0
+        await asyncio.sleep(0.1)
+
+    asyncio.run(events())
+
+    assert manager.stats.events == 2
+    assert manager.stats.coalesced == 1
+    assert manager.stats.flushes == 1
+    assert _stored_count(db) == 2
+    assert not db.locks
+
+
+def test_state_is_written_after_max_hold(db: FakeDatabase) -> None:
+    manager = _manager(db, write_back_delay=0.05, max_hold=0.0)
+
+    asyncio.run(_increment(manager))
+
+    assert manager.stats.flushes == 1
+    assert _stored_count(db) == 1
+    assert not db.locks
+
+
+def test_other_worker_waits_for_the_lease(db: FakeDatabase) -> None:
+    first = _manager(db, write_back_delay=0.05, max_hold=1.0)
+    second = _manager(db, write_back_delay=0.0)
+
+    async def events() -> None:
+        await _increment(first)
+        with pytest.raises(LockExpiredError):
+            await _increment(second)
+        await asyncio.sleep(0.1)
+        await _increment(second)
+
+    asyncio.run(events())
+
+    assert second.stats.lock_timeouts == 1
+    assert _stored_count(db) == 2
+
+
+def test_state_of_a_lost_lock_is_not_written(db: FakeDatabase) -> None:
+    manager = _manager(db, write_back_delay=0.05, max_hold=1.0)
+
+    async def events() -> None:
+        await _increment(manager)
+        await manager._lock_connection.close()  # noqa: SLF001
+        await manager.close()
+
+    asyncio.run(events())
+
+    assert manager.stats.lost_locks == 1
+    assert not db.rows
@@ -0,0 +1,346 @@
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import reflex as rx
+from reflex.state import BaseState
+from reflex_base.event.processor import base_state_processor
+from reflex_base.event.processor.base_state_processor import BaseStateEventProcessor
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.backend import tracing
+from app.backend.tracing import (
+    BatchSpanProcessor,
+    OTLPSpanExporter,
+    Span,
+    Tracer,
+    collector_server,
+)
+from app.configuration import TracingConfig
+
+
+class RecordingProcessor:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def submit(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def named(self, name: str) -> list[Span]:
+        return [span for span in self.spans if span.name == name]
+
+
+class RecordingExporter:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.batches.append([span.name for span in spans])
+
+
+def _tracer(**config: object) -> Tracer:
+    return Tracer(TracingConfig(**config), RecordingProcessor())
+
+
+def _span(name: str, **attributes: object) -> Span:
+    return Span(
+        name=name,
+        trace_id="0" * 32,
+        span_id="1" * 16,
+        parent_id=None,
+        sampled=True,
+        start_ns=time.time_ns(),
+        started=time.perf_counter_ns(),
+        end_ns=time.time_ns() + 2_000_000,
+        attributes=attributes,
+    )
+
+
+def test_spans_nest_within_a_trace() -> None:
+    tracer = _tracer()
+
+    with tracer.span("parent") as parent:
+        with tracer.span("child") as child:
+            pass
+        with tracer.span("sibling") as sibling:
+            pass
+    with tracer.span("next trace") as other:
+        pass
+
+    assert parent.parent_id is None
+    assert child.parent_id == sibling.parent_id == parent.span_id
+    assert child.trace_id == sibling.trace_id == parent.trace_id
+    assert other.parent_id is None
+    assert other.trace_id != parent.trace_id
+    # submitted when finished, children first
+    assert [span.name for span in tracer.processor.spans] == [
+        "child",
+        "sibling",
+        "parent",
+        "next trace",
+    ]
+
+
+def test_failed_span_records_the_error() -> None:
+    tracer = _tracer()
+
+    with pytest.raises(KeyError), tracer.span("failing") as span:
+        raise KeyError("user")
+
+    assert span.error == "KeyError"
+    assert span.end_ns >= span.start_ns
+
+
+def test_children_follow_the_sampling_of_the_trace(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    tracer = _tracer(sample_rate=0.5)
+
+    monkeypatch.setattr(tracing.random, "random", lambda: 0.9)
+    with tracer.span("dropped"), tracer.span("dropped child") as child:
+        # a later draw must not change the decision of the trace
+        monkeypatch.setattr(tracing.random, "random", lambda: 0.1)
+        tracer.record_query("SELECT 1", time.perf_counter_ns())
+    assert not child.sampled
+
+    with tracer.span("sampled"), tracer.span("sampled child"):
+        tracer.record_query("SELECT 1", time.perf_counter_ns())
+
+    assert [span.name for span in tracer.processor.spans] == [
+        "db.query",
+        "sampled child",
+        "sampled",
+    ]
+
+
+@pytest.fixture
+def instrumented_events(monkeypatch: pytest.MonkeyPatch) -> Tracer:
+    tracer = _tracer(slow_event_threshold=0.001)
+
+    async def execute_event(
+        _self: BaseStateEventProcessor, *, entry: object, registered_handler: object
+    ) -> None:
+        # what reflex does between taking the state and running the handler
+        tracer.record_query("SELECT * FROM auth_users\n WHERE id = 1", 0)
+        await base_state_processor.process_event(
+            handler=registered_handler.handler,
+            payload=entry.event.payload,
+            state=None,
+            root_state=None,
+        )
+
+    async def process_event(**_kwargs: object) -> None:
+        for _ in range(2):
+            tracer.record_query("SELECT * FROM projects", time.perf_counter_ns())
+
+    monkeypatch.setattr(BaseStateEventProcessor, "_execute_event", execute_event)
+    monkeypatch.setattr(base_state_processor, "process_event", process_event)
+    tracing._instrument_events(tracer)  # noqa: SLF001
+    return tracer
+
+
+def _run_event() -> None:
+    def load_users() -> None:
+        pass
+
+    entry = SimpleNamespace(event=SimpleNamespace(name="user_list.load", payload={}))
+    handler = SimpleNamespace(handler=SimpleNamespace(fn=load_users))
+    asyncio.run(
+        BaseStateEventProcessor._execute_event(  # noqa: SLF001
+            None, entry=entry, registered_handler=handler
+        )
+    )
+
+
+def test_event_spans_contain_handler_and_queries(
+    instrumented_events: Tracer,
+) -> None:
+    _run_event()
+
+    processor = instrumented_events.processor
+    (event_span,) = processor.named("reflex.event")
+    (handler_span,) = processor.named("reflex.handler")
+    queries = processor.named("db.query")
+    assert event_span.attributes["reflex.event.name"] == "user_list.load"
+    assert handler_span.parent_id == event_span.span_id
+    assert [query.parent_id for query in queries] == [
+        event_span.span_id,
+        handler_span.span_id,
+        handler_span.span_id,
+    ]
+    assert queries[0].attributes["db.statement"] == (
+        "SELECT * FROM auth_users WHERE id = 1"
+    )
+
+
+def test_slow_event_logs_its_queries_by_total_time(
+    instrumented_events: Tracer, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING, logger="app.backend.tracing.slow"):
+        _run_event()
+
+    (record,) = caplog.records
+    message = record.getMessage()
+    assert message.startswith("Slow event user_list.load (")
+    assert "3 queries in" in message
+    # the query started at 0 took longest, the repeated one is counted twice
+    lines = message.splitlines()[1:]
+    assert lines[0].strip().startswith("1x")
+    assert lines[0].endswith("SELECT * FROM auth_users WHERE id = 1")
+    assert lines[1].strip().startswith("2x")
+    assert lines[1].endswith("SELECT * FROM projects")
+    assert record.trace_id == instrumented_events.processor.spans[-1].trace_id
+
+
+def test_fast_event_is_not_logged(caplog: pytest.LogCaptureFixture) -> None:
+    tracer = _tracer(slow_event_threshold=500.0)
+
+    with caplog.at_level(logging.WARNING, logger="app.backend.tracing.slow"):
+        tracer.log_slow_event(_span("reflex.event"))
+
+    assert caplog.records == []
+
+
+def test_reflex_hooks_keep_their_signatures() -> None:
+    execute_event = inspect.signature(
+        BaseStateEventProcessor._execute_event  # noqa: SLF001
+    ).parameters
+    assert list(execute_event) == ["self", "entry", "registered_handler"]
+    assert execute_event["entry"].kind is inspect.Parameter.KEYWORD_ONLY
+    assert "handler" in inspect.signature(base_state_processor.process_event).parameters
+    assert list(inspect.signature(BaseState._serialize).parameters) == ["self"]  # noqa: SLF001
+    assert list(inspect.signature(BaseState.get_delta).parameters) == ["self"]
+
+
+def test_state_serialization_is_traced(monkeypatch: pytest.MonkeyPatch) -> None:
+    for name in ("_serialize", "_deserialize", "get_delta"):
+        monkeypatch.setattr(BaseState, name, BaseState.__dict__[name])
+    tracer = _tracer()
+    tracing._instrument_state(tracer)  # noqa: SLF001
+
+    state = rx.State(_reflex_internal_init=True)
+    data = state._serialize()  # noqa: SLF001
+    restored = rx.State._deserialize(data=data)  # noqa: SLF001
+
+    assert isinstance(restored, rx.State)
+    (serialize,) = tracer.processor.named("reflex.state.serialize")
+    assert serialize.attributes == {
+        "state": rx.State.get_full_name(),
+        "size": len(data),
+    }
+    assert len(tracer.processor.named("reflex.state.deserialize")) == 1
+
+
+def test_queries_of_an_engine_are_traced(monkeypatch: pytest.MonkeyPatch) -> None:
+    engine = create_engine("sqlite://")
+    # listen on this engine only, not on all engines of the process
+    monkeypatch.setattr(tracing, "Engine", engine)
+    tracer = _tracer()
+    tracing._instrument_queries(tracer)  # noqa: SLF001
+
+    with tracer.span("request") as request, engine.connect() as connection:
+        connection.execute(text("SELECT   1"))
+        with pytest.raises(OperationalError, match="no such table"):
+            connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 2"))
+
+    queries = tracer.processor.named("db.query")
+    assert [query.attributes["db.statement"] for query in queries] == [
+        "SELECT 1",
+        "SELECT 2",
+    ]
+    assert {query.parent_id for query in queries} == {request.span_id}
+
+
+def test_batches_are_exported_when_full_or_due() -> None:
+    exporter = RecordingExporter()
+    processor = BatchSpanProcessor(exporter, batch_size=2, flush_interval=0.05)
+
+    for name in ("first", "second", "third"):
+        processor.submit(_span(name))
+    time.sleep(0.3)
+
+    assert exporter.batches == [["first", "second"], ["third"]]
+    processor.shutdown()
+
+
+def test_shutdown_exports_the_queued_spans() -> None:
+    exporter = RecordingExporter()
+    processor = BatchSpanProcessor(exporter, batch_size=100, flush_interval=30.0)
+
+    for name in ("first", "second"):
+        processor.submit(_span(name))
+    processor.shutdown()
+
+    assert exporter.batches == [["first", "second"]]
+    assert not processor._thread.is_alive()  # noqa: SLF001
+
+
+class BlockingExporter(RecordingExporter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.exporting = threading.Event()
+        self.release = threading.Event()
+
+    def export(self, spans: list[Span]) -> None:
+        self.exporting.set()
+        self.release.wait(5)
+        super().export(spans)
+
+
+def test_full_queue_drops_spans() -> None:
+    exporter = BlockingExporter()
+    processor = BatchSpanProcessor(
+        exporter, batch_size=1, flush_interval=30.0, max_queue_size=1
+    )
+
+    processor.submit(_span("first"))
+    assert exporter.exporting.wait(5)
+    # the exporter thread is busy, the queue takes one span
+    processor.submit(_span("second"))
+    processor.submit(_span("third"))
+    exporter.release.set()
+    processor.shutdown()
+
+    assert processor.dropped == 1
+    assert exporter.batches == [["first"], ["second"]]
+
+
+def test_otlp_payload_reaches_the_collector(tmp_path: Path) -> None:
+    output = tmp_path / "traces" / "collector.jsonl"
+    server = collector_server("127.0.0.1", 0, output)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    root = _span("reflex.event", **{"reflex.event.name": "load", "sampled": True})
+    child = _span("db.query", **{"db.statement": "SELECT 1", "rows": 3})
+    child.span_id, child.parent_id, child.error = "2" * 16, root.span_id, "OSError"
+    exporter = OTLPSpanExporter(
+        f"http://127.0.0.1:{server.server_port}/v1/traces", "projectkit"
+    )
+    try:
+        exporter.export([root, child])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    payload = exporter.payload([child])
+    (otlp_span,) = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert otlp_span["startTimeUnixNano"] == str(child.start_ns)
+    assert {"key": "rows", "value": {"intValue": "3"}} in otlp_span["attributes"]
+    received = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [span["name"] for span in received] == ["reflex.event", "db.query"]
+    assert received[0]["resource"]["service.name"] == "projectkit"
+    assert received[0]["parent_id"] is None
+    assert received[0]["attributes"] == {"reflex.event.name": "load", "sampled": True}
+    assert received[0]["status"] == 1
+    assert received[1]["parent_id"] == root.span_id
+    assert received[1]["attributes"] == {"db.statement": "SELECT 1", "rows": "3"}
+    assert received[1]["status"] == 2
+    assert received[1]["duration_ms"] == round(child.duration_ms, 3)
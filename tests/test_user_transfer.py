@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from app.backend.user_transfer import (
+    EXPORT_COLUMNS,
+    ROLE_SEPARATOR,
+    FileFormat,
+    InvalidRowError,
+    UserRow,
+    import_users,
+    parse_row,
+    read_records,
+)
+
+KNOWN_ROLES = frozenset({"project_manager", "reviewer"})
+
+USER = {
+    "email": "ada@example.com",
+    "name": "Ada",
+    "is_active": True,
+    "is_admin": False,
+    "is_verified": True,
+    "needs_password_reset": False,
+    "roles": ["project_manager", "reviewer"],
+    "password_hash": "scrypt:32768:8:1$salt$hash",
+}
+
+
+def test_parse_row_defaults() -> None:
+    row = parse_row(2, {"email": " bob@example.com ", "roles": ""}, KNOWN_ROLES)
+
+    assert row == UserRow(
+        line=2,
+        email="bob@example.com",
+        name=None,
+        password=None,
+        password_hash=None,
+        is_active=True,
+        is_admin=False,
+        is_verified=True,
+        needs_password_reset=False,
+        roles=[],
+    )
+
+
+def test_parse_row_values() -> None:
+    row = parse_row(
+        3,
+        {
+            "email": "bob@example.com",
+            "password": "secret",
+            "is_admin": "yes",
+            "is_active": "0",
+            "roles": "reviewer;project_manager;reviewer",
+        },
+        KNOWN_ROLES,
+    )
+
+    assert row.password == "secret"  # noqa: S105
+    assert row.is_admin
+    assert not row.is_active
+    assert row.roles == ["project_manager", "reviewer"]
+
+
+@pytest.mark.parametrize(
+    ("record", "message"),
+    [
+        ({"email": "not-an-email"}, "invalid email"),
+        ({"email": "a@example.com", "roles": "admin"}, "unknown roles admin"),
+        ({"email": "a@example.com", "roles": 1}, "invalid roles"),
+        ({"email": "a@example.com", "is_admin": "maybe"}, "invalid boolean"),
+        (
+            {"email": "a@example.com", "password": "x", "password_hash": "scrypt:x"},
+            "not both",
+        ),
+        ({"email": "a@example.com", "password_hash": "md5$x"}, "not a scrypt"),
+    ],
+)
+def test_parse_row_rejects(record: dict, message: str) -> None:
+    with pytest.raises(InvalidRowError, match=message):
+        parse_row(1, record, KNOWN_ROLES)
+
+
+def test_read_records_jsonl() -> None:
+    file = io.StringIO('{"email": "a@example.com"}\n\n[1, 2]\nnot json\n')
+
+    assert list(read_records(file, FileFormat.JSONL)) == [
+        (1, {"email": "a@example.com"}),
+        (3, None),
+        (4, None),
+    ]
+
+
+def test_read_records_csv_lines() -> None:
+    file = io.StringIO('email,name\na@example.com,"A\nB"\nb@example.com,B\n')
+
+    assert [line for line, _ in read_records(file, FileFormat.CSV)] == [3, 4]
+
+
+def _export_csv(user: dict) -> str:
+    # the rows of COPY ... TO STDOUT WITH (FORMAT csv, HEADER) of export_users
+    names = [name for name, _ in EXPORT_COLUMNS] + ["password_hash", "roles"]
+    values = {
+        **{key: str(value).lower() for key, value in user.items()},
+        "email": user["email"],
+        "name": user["name"],
+        "password_hash": user["password_hash"],
+        "roles": ROLE_SEPARATOR.join(user["roles"]),
+    }
+    file = io.StringIO()
+    writer = csv.DictWriter(file, names, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerow(values)
+    return file.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("file_format", "content"),
+    [
+        (FileFormat.CSV, _export_csv(USER)),
+        (FileFormat.JSONL, json.dumps(USER) + "\n"),
+    ],
+)
+def test_exported_users_import_unchanged(file_format: FileFormat, content: str) -> None:
+    [(line, record)] = read_records(io.StringIO(content), file_format)
+    row = parse_row(line, record, KNOWN_ROLES)
+
+    assert {
+        "email": row.email,
+        "name": row.name,
+        "is_active": row.is_active,
+        "is_admin": row.is_admin,
+        "is_verified": row.is_verified,
+        "needs_password_reset": row.needs_password_reset,
+        "roles": row.roles,
+        "password_hash": row.password_hash,
+    } == USER
+
+
+def test_strict_import_stops_before_writing(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        json.dumps({"email": "a@example.com"}) + "\n" + '{"email": "b"}\n',
+        encoding="utf-8",
+    )
+
+    def connect(*_args: object) -> None:
+        raise AssertionError("nothing is written")
+
+    monkeypatch.setattr("app.backend.user_transfer.psycopg.connect", connect)
+    report = import_users(path, strict=True)
+
+    assert report.rows == 2
+    assert report.invalid == 1
+    assert report.inserted == 0
+    assert report.errors == ["line 2: invalid email 'b'"]
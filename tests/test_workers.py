@@ -0,0 +1,26 @@
+import pytest
+
+from app.backend.workers import backend_workers
+
+
+@pytest.mark.parametrize(
+    ("environ", "workers"),
+    [
+        ({}, 1),
+        ({"WEB_CONCURRENCY": "4"}, 4),
+        ({"WEB_CONCURRENCY": "4", "GUNICORN_CMD_ARGS": "--workers 2"}, 2),
+        ({"GUNICORN_CMD_ARGS": "--timeout 60 -w3"}, 3),
+        ({"GUNICORN_CMD_ARGS": "--workers=5"}, 5),
+        ({"GRANIAN_WORKERS": "6", "WEB_CONCURRENCY": "4"}, 6),
+        ({"WEB_CONCURRENCY": "many"}, 1),
+    ],
+)
+def test_backend_workers(
+    monkeypatch: pytest.MonkeyPatch, environ: dict[str, str], workers: int
+) -> None:
+    for name in ("GRANIAN_WORKERS", "GUNICORN_CMD_ARGS", "WEB_CONCURRENCY"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+
+    assert backend_workers() == workers